@@ -37,7 +37,7 @@ from course.models import (
         FlowPageVisit, FlowPageVisitGrade,
         FlowRuleException,
         GradingOpportunity, GradeChange, InstantMessage,
-        Exam, ExamTicket)
+        Exam, ExamTicket, CourseRepositoryMaintenance)
 from django import forms
 from course.enrollment import (approve_enrollment, deny_enrollment)
 from course.constants import participation_role, exam_ticket_states
@@ -145,6 +145,35 @@ class CourseAdmin(admin.ModelAdmin):
 
 admin.site.register(Course, CourseAdmin)
 
+
+class CourseRepositoryMaintenanceAdmin(admin.ModelAdmin):
+    list_display = (
+            "course",
+            "time",
+            "action",
+            "loose_objects_before",
+            "loose_objects_after",
+            "packs_before",
+            "packs_after",
+            "lookup_time_before",
+            "lookup_time_after",
+            "error",
+            )
+    list_filter = ("course", "action")
+
+    date_hierarchy = "time"
+
+    # {{{ permissions
+
+    def get_queryset(self, request):
+        qs = super(CourseRepositoryMaintenanceAdmin, self).get_queryset(request)
+        return _filter_course_linked_obj_for_user(qs, request.user)
+
+    # }}}
+
+admin.site.register(CourseRepositoryMaintenance,
+        CourseRepositoryMaintenanceAdmin)
+
 # }}}
 
 
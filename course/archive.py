@@ -0,0 +1,268 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import division
+
+__copyright__ = "Copyright (C) 2017 Andreas Kloeckner"
+
+__license__ = """
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+"""
+
+import datetime
+import json
+import zlib
+
+from django.db import models, transaction
+from django.utils.dateparse import parse_datetime
+from django.utils.translation import ugettext as _
+
+from course.models import (
+        FlowSession, FlowPageData, FlowPageVisit, FlowPageVisitGrade,
+        FlowPageBulkFeedback, FlowSessionArchive)
+
+
+# The page visits, grades and bulk feedback of finished flow sessions in
+# courses that ended long ago are moved out of their (very large) tables
+# into one FlowSessionArchive row per session, as zlib-compressed,
+# newline-delimited JSON. Each line holds one record of the form
+#
+#     {"kind": "visit" | "grade" | "bulk_feedback", "fields": {...}}
+#
+# where "fields" maps the attribute names of the model's columns to their
+# values. Archived sessions are read-only. Their visits and grades are
+# rebuilt as unsaved model instances by get_archived_page_visits, which
+# course.flow uses in place of database queries.
+
+ARCHIVE_KINDS = {
+        "visit": FlowPageVisit,
+        "grade": FlowPageVisitGrade,
+        "bulk_feedback": FlowPageBulkFeedback,
+        }
+
+
+class ArchiveError(RuntimeError):
+    pass
+
+
+# {{{ (de)serialization
+
+def _json_default(obj):
+    if isinstance(obj, datetime.datetime):
+        # not DjangoJSONEncoder, which drops microseconds
+        return obj.isoformat()
+
+    raise TypeError("%r is not JSON serializable" % obj)
+
+
+def _dump_record(kind, instance):
+    fields = dict(
+            (field.attname, getattr(instance, field.attname))
+            for field in instance._meta.concrete_fields)
+
+    return json.dumps({"kind": kind, "fields": fields},
+            default=_json_default, sort_keys=True)
+
+
+def _load_record(kind, fields):
+    model = ARCHIVE_KINDS[kind]
+
+    values = {}
+    for field in model._meta.concrete_fields:
+        value = fields.get(field.attname)
+        if value is not None and isinstance(field, models.DateTimeField):
+            value = parse_datetime(value)
+        values[field.attname] = value
+
+    return model(**values)
+
+
+def _load_archive(archive):
+    """
+    :returns: a dictionary mapping each of :data:`ARCHIVE_KINDS` to a list of
+        unsaved model instances, in the order in which they were archived.
+    """
+
+    result = dict((kind, []) for kind in ARCHIVE_KINDS)
+
+    data = zlib.decompress(bytes(archive.data)).decode("utf-8")
+    for line in data.split("\n"):
+        if not line:
+            continue
+
+        record = json.loads(line)
+        result[record["kind"]].append(
+                _load_record(record["kind"], record["fields"]))
+
+    return result
+
+# }}}
+
+
+# {{{ archive/restore
+
+def archive_flow_session(flow_session):
+    if flow_session.in_progress:
+        raise ArchiveError(_("cannot archive a session that is in progress"))
+
+    from course.page_visits import flush_page_visits
+    flush_page_visits()
+
+    with transaction.atomic():
+        flow_session = (FlowSession.objects
+                .select_for_update()
+                .get(id=flow_session.id))
+        if flow_session.page_visits_archived:
+            raise ArchiveError(_("session is already archived"))
+
+        visits = list(FlowPageVisit.objects
+                .filter(flow_session=flow_session)
+                .order_by("visit_time", "id"))
+        grades = list(FlowPageVisitGrade.objects
+                .filter(visit__flow_session=flow_session)
+                .order_by("grade_time", "id"))
+        bulk_feedbacks = list(FlowPageBulkFeedback.objects
+                .filter(page_data__flow_session=flow_session)
+                .order_by("id"))
+
+        lines = (
+                [_dump_record("visit", visit) for visit in visits]
+                + [_dump_record("grade", grade) for grade in grades]
+                + [_dump_record("bulk_feedback", bulk_feedback)
+                    for bulk_feedback in bulk_feedbacks])
+
+        FlowSessionArchive.objects.create(
+                flow_session=flow_session,
+                visit_count=len(visits),
+                grade_count=len(grades),
+                data=zlib.compress("\n".join(lines).encode("utf-8"), 9))
+
+        FlowPageBulkFeedback.objects.filter(
+                id__in=[bf.id for bf in bulk_feedbacks]).delete()
+        FlowPageVisitGrade.objects.filter(
+                id__in=[grade.id for grade in grades]).delete()
+        FlowPageVisit.objects.filter(
+                id__in=[visit.id for visit in visits]).delete()
+
+        flow_session.page_visits_archived = True
+        flow_session.save(update_fields=["page_visits_archived"])
+
+    return len(visits), len(grades)
+
+
+def restore_flow_session(flow_session):
+    with transaction.atomic():
+        flow_session = (FlowSession.objects
+                .select_for_update()
+                .get(id=flow_session.id))
+        if not flow_session.page_visits_archived:
+            raise ArchiveError(_("session is not archived"))
+
+        archive = FlowSessionArchive.objects.get(flow_session=flow_session)
+        records = _load_archive(archive)
+
+        FlowPageVisit.objects.bulk_create(records["visit"])
+        FlowPageVisitGrade.objects.bulk_create(records["grade"])
+        FlowPageBulkFeedback.objects.bulk_create(records["bulk_feedback"])
+
+        archive.delete()
+
+        flow_session.page_visits_archived = False
+        flow_session.save(update_fields=["page_visits_archived"])
+
+    return len(records["visit"]), len(records["grade"])
+
+
+def get_archivable_flow_sessions(course):
+    return (FlowSession.objects
+            .filter(
+                course=course,
+                in_progress=False,
+                page_visits_archived=False)
+            .order_by("id"))
+
+# }}}
+
+
+# {{{ read access
+
+def get_archived_page_visits(flow_session):
+    """Return the archived visits of *flow_session* as a list of unsaved
+    :class:`course.models.FlowPageVisit` instances ordered by visit time.
+    The grades of each visit are available in order of grade time as
+    *archived_grades*, which
+    :meth:`course.models.FlowPageVisit.get_most_recent_grade` and
+    :func:`course.models.get_feedback_for_grade` understand.
+
+    The result is kept on *flow_session*.
+    """
+
+    try:
+        return flow_session._archived_page_visits
+    except AttributeError:
+        pass
+
+    try:
+        archive = FlowSessionArchive.objects.get(flow_session=flow_session)
+    except FlowSessionArchive.DoesNotExist:
+        records = dict((kind, []) for kind in ARCHIVE_KINDS)
+    else:
+        records = _load_archive(archive)
+
+    page_data_by_id = dict(
+            (page_data.id, page_data)
+            for page_data in FlowPageData.objects.filter(
+                flow_session=flow_session))
+
+    visits = records["visit"]
+    visits_by_id = {}
+    for visit in visits:
+        visit.flow_session = flow_session
+        visit.page_data = page_data_by_id[visit.page_data_id]
+        visit.archived_grades = []
+        visits_by_id[visit.id] = visit
+
+    bulk_feedback_by_grade_id = dict(
+            (bulk_feedback.grade_id, bulk_feedback.bulk_feedback)
+            for bulk_feedback in records["bulk_feedback"])
+
+    for grade in records["grade"]:
+        visit = visits_by_id[grade.visit_id]
+        grade.visit = visit
+        grade.archived_bulk_feedback = bulk_feedback_by_grade_id.get(grade.id)
+        visit.archived_grades.append(grade)
+
+    flow_session._archived_page_visits = visits
+    return visits
+
+
+def get_archived_graded_answer_visits(flow_session):
+    """The archived counterpart of
+    :func:`course.flow.get_flow_session_graded_answers_qset`, ordered by
+    visit time.
+    """
+
+    return [
+            visit
+            for visit in get_archived_page_visits(flow_session)
+            if (visit.answer is not None or visit.is_synthetic)
+            and visit.is_submitted_answer]
+
+# }}}
+
+# vim: foldmethod=marker
@@ -891,6 +891,13 @@ def get_role_and_participation(request, course):
             if hasattr(request.user, '_wrapped')
             else request.user)
 
+    from course.utils import memoize_in_request
+    return memoize_in_request(request,
+            ("role_and_participation", course.id, user.pk),
+            lambda: _get_role_and_participation(user, course))
+
+
+def _get_role_and_participation(user, course):
     if not user.is_authenticated():
         return participation_role.unenrolled, None
 
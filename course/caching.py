@@ -0,0 +1,417 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import division
+
+__copyright__ = "Copyright (C) 2017 Andreas Kloeckner"
+
+__license__ = """
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+"""
+
+import sys
+import threading
+from collections import OrderedDict
+
+import six
+from six.moves import cPickle as pickle
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+if sys.version_info >= (3,):
+    CACHE_KEY_ROOT = "py3"
+else:
+    CACHE_KEY_ROOT = "py2"
+
+
+# Derived course content (repository blobs, parsed YAML, rendered markup, ...)
+# is cached in two tiers: a per-process LRU holding up to
+# RELATE_LOCAL_CACHE_MAX_BYTES of pickled items, and the shared Django
+# 'default' cache, which receives items of up to
+# RELATE_SHARED_CACHE_MAX_ITEM_BYTES. Items are only put in the per-process
+# tier if they take up at most an eighth of it.
+#
+# Keys are hashed, so that they have a fixed length no matter how long the
+# repository paths involved are.
+
+# Maps kinds of content to the version of their key namespace. Bump the
+# version of a kind whenever the format of what is stored under it changes.
+CONTENT_KINDS = {
+        "blob": 1,
+        "raw_yaml": 1,
+        "yaml": 1,
+        "markup": 1,
+        "page_chunks": 1,
+        "page_fragment": 1,
+        "calendar": 1,
+        "course_catalog": 1,
+        "instant_flow_requests": 1,
+        }
+
+CACHE_MISS = object()
+
+STATS_FLUSH_INTERVAL = 60
+
+# seconds for which a cache generation is reused without asking the shared
+# cache
+GENERATION_RECHECK_INTERVAL = 5
+
+
+# {{{ keys
+
+def get_content_cache_key(kind, key_parts):
+    """
+    :arg key_parts: a sequence of byte strings, text strings and integers
+        identifying the item
+    """
+
+    import hashlib
+    key_hash = hashlib.sha1()
+    for part in key_parts:
+        if isinstance(part, six.text_type):
+            part = part.encode("utf-8")
+        elif not isinstance(part, six.binary_type):
+            part = str(part).encode("utf-8")
+
+        key_hash.update(part)
+        key_hash.update(b"\0")
+
+    return "relate-content:%s:%s:%d:%s" % (
+            CACHE_KEY_ROOT, kind, CONTENT_KINDS[kind], key_hash.hexdigest())
+
+# }}}
+
+
+# {{{ per-process tier
+
+class LocalContentCache(object):
+    """A thread-safe LRU mapping from keys to byte strings that holds at most
+    *max_bytes* bytes of values.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            try:
+                value = self.entries.pop(key)
+            except KeyError:
+                return None
+
+            self.entries[key] = value
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            old_value = self.entries.pop(key, None)
+            if old_value is not None:
+                self.total_bytes -= len(old_value)
+
+            self.entries[key] = value
+            self.total_bytes += len(value)
+
+            while self.total_bytes > self.max_bytes:
+                evicted_key, evicted_value = self.entries.popitem(last=False)
+                self.total_bytes -= len(evicted_value)
+
+
+_local_cache = None
+
+
+def _get_local_cache():
+    global _local_cache
+
+    max_bytes = getattr(settings, "RELATE_LOCAL_CACHE_MAX_BYTES", 0)
+    if _local_cache is None or _local_cache.max_bytes != max_bytes:
+        _local_cache = LocalContentCache(max_bytes)
+
+    return _local_cache
+
+
+def _get_shared_cache():
+    try:
+        import django.core.cache as cache
+    except ImproperlyConfigured:
+        return None
+
+    return cache.caches["default"]
+
+# }}}
+
+
+# {{{ statistics
+
+_stats_lock = threading.Lock()
+
+# maps (kind, outcome) to counts, where outcome is one of "local_hit",
+# "shared_hit" and "miss". These are counts not yet added to the shared
+# cache.
+_stats = {}
+_stats_last_flush = [None]
+
+
+def _get_stats_key(kind, outcome):
+    return "relate-content-stats:%s:%s:%s" % (CACHE_KEY_ROOT, kind, outcome)
+
+
+def _count(kind, outcome):
+    from time import time
+
+    with _stats_lock:
+        _stats[kind, outcome] = _stats.get((kind, outcome), 0) + 1
+
+        now_time = time()
+        if _stats_last_flush[0] is None:
+            _stats_last_flush[0] = now_time
+        if now_time - _stats_last_flush[0] < STATS_FLUSH_INTERVAL:
+            return
+
+        _stats_last_flush[0] = now_time
+        counts = list(six.iteritems(_stats))
+        _stats.clear()
+
+    flush_content_cache_stats(counts)
+
+
+def flush_content_cache_stats(counts=None):
+    """Add the statistics gathered in this process to the totals kept in
+    the shared cache.
+    """
+
+    if counts is None:
+        with _stats_lock:
+            counts = list(six.iteritems(_stats))
+            _stats.clear()
+
+    shared_cache = _get_shared_cache()
+    if shared_cache is None:
+        return
+
+    for (kind, outcome), count in counts:
+        key = _get_stats_key(kind, outcome)
+        shared_cache.add(key, 0, None)
+        try:
+            shared_cache.incr(key, count)
+        except ValueError:
+            # evicted in the meantime
+            pass
+
+
+def get_content_cache_stats(reset=False):
+    """
+    :returns: a dictionary mapping each kind of content to a dictionary
+        with keys ``local_hit``, ``shared_hit`` and ``miss``, with counts
+        summed over all processes (as of their last flush).
+    """
+
+    shared_cache = _get_shared_cache()
+    if shared_cache is None:
+        return {}
+
+    outcomes = ["local_hit", "shared_hit", "miss"]
+
+    keys = dict(
+            ((kind, outcome), _get_stats_key(kind, outcome))
+            for kind in CONTENT_KINDS
+            for outcome in outcomes)
+    values = shared_cache.get_many(list(keys.values()))
+    if reset:
+        shared_cache.delete_many(list(keys.values()))
+
+    return dict(
+            (kind, dict(
+                (outcome, values.get(keys[kind, outcome], 0))
+                for outcome in outcomes))
+            for kind in CONTENT_KINDS)
+
+# }}}
+
+
+# {{{ generations
+
+# maps generation names to (generation, time of check)
+_generations = {}
+
+
+def _get_generation_key(name):
+    return "relate-generation:%s" % name
+
+
+def _get_generation_cache():
+    """Return the shared cache if it is shared between processes, else
+    *None*.
+    """
+
+    shared_cache = _get_shared_cache()
+    if shared_cache is None:
+        return None
+
+    from django.core.cache.backends.locmem import LocMemCache
+    from django.core.cache.backends.dummy import DummyCache
+    if isinstance(shared_cache, (LocMemCache, DummyCache)):
+        # A generation bumped in one process would not be seen by the others.
+        return None
+
+    return shared_cache
+
+
+def _make_initial_generation():
+    # Not 0: a counter that was evicted from the shared cache must not start
+    # over at a generation that earlier content was cached under. Counters
+    # are bumped far less often than once per millisecond.
+    from time import time
+    return int(time() * 1000)
+
+
+def get_cache_generation(name):
+    """Return the current generation of *name*, a counter that is
+    incremented by :func:`bump_cache_generation` and meant to be included
+    in the key parts of content that depends on data outside the
+    repository. Processes other than the bumping one may see the old
+    generation for up to :data:`GENERATION_RECHECK_INTERVAL` seconds.
+
+    :returns: *None* if there is no cache shared between processes (e.g.
+        with the default, process-local 'default' cache), in which case
+        content depending on *name* must not be cached.
+    """
+
+    from time import time
+    now_time = time()
+
+    generation, check_time = _generations.get(name, (None, None))
+    if (generation is not None
+            and now_time - check_time < GENERATION_RECHECK_INTERVAL):
+        return generation
+
+    shared_cache = _get_generation_cache()
+    if shared_cache is None:
+        return None
+
+    key = _get_generation_key(name)
+    generation = shared_cache.get(key)
+    if generation is None:
+        shared_cache.add(key, _make_initial_generation(), None)
+
+        # someone else's add() may have won
+        generation = shared_cache.get(key)
+        if generation is None:
+            return None
+
+    _generations[name] = (generation, now_time)
+    return generation
+
+
+def bump_cache_generation(name):
+    shared_cache = _get_generation_cache()
+    if shared_cache is None:
+        return
+
+    key = _get_generation_key(name)
+    shared_cache.add(key, _make_initial_generation(), None)
+    try:
+        shared_cache.incr(key)
+    except ValueError:
+        # evicted in the meantime
+        shared_cache.add(key, _make_initial_generation(), None)
+
+    _generations.pop(name, None)
+
+
+def bump_cache_generation_on_commit(name):
+    """Bump the generation of *name* once the current transaction commits
+    (or right away outside of one). Bumping earlier would let requests
+    that still see the old rows cache them under the new generation.
+    """
+
+    from django.db import transaction
+    if not hasattr(transaction, "on_commit"):
+        # Django < 1.9
+        bump_cache_generation(name)
+        return
+
+    transaction.on_commit(lambda: bump_cache_generation(name))
+
+
+def get_course_events_generation_name(course_id):
+    return "events:%d" % course_id
+
+
+COURSES_GENERATION_NAME = "courses"
+
+
+def get_course_instant_flow_requests_generation_name(course_id):
+    return "instant_flow_requests:%d" % course_id
+
+# }}}
+
+
+# {{{ interface
+
+def get_cached_content(kind, key_parts):
+    """
+    :returns: the cached item or :data:`CACHE_MISS`.
+    """
+
+    key = get_content_cache_key(kind, key_parts)
+
+    local_cache = _get_local_cache()
+    pickled = local_cache.get(key)
+    if pickled is not None:
+        _count(kind, "local_hit")
+        return pickle.loads(pickled)
+
+    shared_cache = _get_shared_cache()
+    if shared_cache is not None:
+        # Byte strings are wrapped in a tuple to force pickling because
+        # memcache's python wrapper appears to auto-decode/encode string
+        # values, thus trying to decode our byte strings. Grr.
+        result = shared_cache.get(key)
+        if result is not None:
+            (pickled,) = result
+            if len(pickled) <= local_cache.max_bytes // 8:
+                local_cache.set(key, pickled)
+
+            _count(kind, "shared_hit")
+            return pickle.loads(pickled)
+
+    _count(kind, "miss")
+    return CACHE_MISS
+
+
+def set_cached_content(kind, key_parts, value):
+    key = get_content_cache_key(kind, key_parts)
+    pickled = pickle.dumps(value, protocol=2)
+
+    local_cache = _get_local_cache()
+    if len(pickled) <= local_cache.max_bytes // 8:
+        local_cache.set(key, pickled)
+
+    shared_cache = _get_shared_cache()
+    if (shared_cache is not None
+            and len(pickled) <= getattr(
+                settings, "RELATE_SHARED_CACHE_MAX_ITEM_BYTES", 0)):
+        shared_cache.set(key, (pickled,), None)
+
+# }}}
+
+# vim: foldmethod=marker
@@ -30,6 +30,8 @@ from six.moves import range
 from django.utils.translation import (
         ugettext_lazy as _, pgettext_lazy, string_concat)
 from django.contrib.auth.decorators import login_required
+from django import http
+import django.views.decorators.http as http_dec
 from course.utils import course_view, render_course_page
 from django.core.exceptions import PermissionDenied, ObjectDoesNotExist
 from django.db import transaction, IntegrityError
@@ -270,27 +272,46 @@ class EventInfo(object):
         self.description = description
 
 
-@course_view
-def view_calendar(pctx):
-    from course.content import markup_to_html
+class CalendarEvent(object):
+    """An :class:`course.models.Event` together with what the calendar shows
+    for it.
+
+    .. attribute:: json
+
+        The event in the form expected by FullCalendar.
+
+    .. attribute:: info
+
+        An :class:`EventInfo` if the event has a description, else *None*.
+    """
 
-    events_json = []
+    def __init__(self, id, start_time, end_time, all_day, json, info):
+        self.id = id
+        self.start_time = start_time
+        self.end_time = end_time
+        self.all_day = all_day
+        self.json = json
+        self.info = info
+
+
+def _make_calendar_events(course, repo, commit_sha):
+    from course.content import markup_to_html
 
     from course.content import get_raw_yaml_from_repo
     try:
-        event_descr = get_raw_yaml_from_repo(pctx.repo,
-                pctx.course.events_file, pctx.course_commit_sha)
+        event_descr = get_raw_yaml_from_repo(repo,
+                course.events_file, commit_sha)
     except ObjectDoesNotExist:
         event_descr = {}
 
     event_kinds_desc = event_descr.get("event_kinds", {})
     event_info_desc = event_descr.get("events", {})
 
-    event_info_list = []
+    calendar_events = []
 
     for event in (Event.objects
             .filter(
-                course=pctx.course,
+                course=course,
                 shown_in_calendar=True)
             .order_by("-time")):
         kind_desc = event_kinds_desc.get(event.kind)
@@ -319,7 +340,7 @@ def view_calendar(pctx):
         if event_desc is not None:
             if "description" in event_desc:
                 description = markup_to_html(
-                        pctx.course, pctx.repo, pctx.course_commit_sha,
+                        course, repo, commit_sha,
                         event_desc["description"])
 
             if "title" in event_desc:
@@ -330,8 +351,10 @@ def view_calendar(pctx):
 
         event_json["title"] = human_title
 
+        event_info = None
         if description:
-            event_json["url"] = "#event-%d" % event.id
+            # shown by the calendar page when the event is clicked
+            event_json["description"] = description
 
             start_time = event.time
             end_time = event.end_time
@@ -340,29 +363,258 @@ def view_calendar(pctx):
                 start_time = start_time.date()
                 end_time = end_time.date()
 
-            event_info_list.append(
-                    EventInfo(
-                        id=event.id,
-                        human_title=human_title,
-                        start_time=start_time,
-                        end_time=end_time,
-                        description=description
-                        ))
+            event_info = EventInfo(
+                    id=event.id,
+                    human_title=human_title,
+                    start_time=start_time,
+                    end_time=end_time,
+                    description=description
+                    )
 
-        events_json.append(event_json)
+        calendar_events.append(
+                CalendarEvent(
+                    id=event.id,
+                    start_time=event.time,
+                    end_time=event.end_time,
+                    all_day=event.all_day,
+                    json=event_json,
+                    info=event_info))
+
+    return calendar_events
+
+
+def get_calendar_events(course, repo, commit_sha):
+    """Return a list of :class:`CalendarEvent` instances for the events
+    shown in the calendar of *course*, latest first.
+    """
+
+    from course.caching import (
+            CACHE_MISS, get_cached_content, set_cached_content,
+            get_cache_generation, get_course_events_generation_name)
+
+    generation = get_cache_generation(
+            get_course_events_generation_name(course.id))
+    if generation is None:
+        return _make_calendar_events(course, repo, commit_sha)
+
+    key_parts = (course.id, commit_sha, generation)
+
+    result = get_cached_content("calendar", key_parts)
+    if result is CACHE_MISS:
+        result = _make_calendar_events(course, repo, commit_sha)
+        set_cached_content("calendar", key_parts, result)
+
+    return result
+
+
+@course_view
+def view_calendar(pctx):
+    # The events, including their descriptions, are loaded by the page from
+    # get_calendar_feed, a range at a time.
 
     from course.views import get_now_or_fake_time
     default_date = get_now_or_fake_time(pctx.request).date()
     if pctx.course.end_date is not None and default_date > pctx.course.end_date:
         default_date = pctx.course.end_date
 
-    from json import dumps
     return render_course_page(pctx, "course/calendar.html", {
-        "events_json": dumps(events_json),
-        "event_info_list": event_info_list,
         "default_date": default_date.isoformat(),
     })
 
+
+# {{{ feed
+
+def _parse_feed_range_bound(s):
+    import datetime
+    from django.utils.dateparse import parse_date, parse_datetime
+    from relate.utils import localize_datetime
+
+    try:
+        result = parse_datetime(s)
+        if result is None:
+            d = parse_date(s)
+            if d is None:
+                return None
+            result = datetime.datetime.combine(d, datetime.time())
+    except ValueError:
+        return None
+
+    if result.tzinfo is None:
+        result = localize_datetime(result)
+
+    return result
+
+
+def _get_calendar_feed_etag(pctx, feed_format):
+    """
+    :returns: *None* if changes to the events cannot be detected (see
+        :func:`course.caching.get_cache_generation`).
+    """
+
+    from course.caching import (
+            get_cache_generation, get_course_events_generation_name)
+
+    generation = get_cache_generation(
+            get_course_events_generation_name(pctx.course.id))
+    if generation is None:
+        return None
+
+    return ":".join([
+        pctx.course.identifier,
+        pctx.course_commit_sha.decode(),
+        str(generation),
+        feed_format,
+        pctx.request.GET.get("start", ""),
+        pctx.request.GET.get("end", ""),
+        ])
+
+
+def _escape_ical_text(s):
+    return (s
+            .replace("\\", "\\\\")
+            .replace(";", "\\;")
+            .replace(",", "\\,")
+            .replace("\n", "\\n"))
+
+
+def _fold_ical_line(line):
+    # Lines are limited to 75 octets, including the space that starts each
+    # continuation line.
+    pieces = []
+    piece = ""
+    piece_len = 0
+    for c in line:
+        c_len = len(c.encode("utf-8"))
+        if piece_len + c_len > 74:
+            pieces.append(piece)
+            piece = ""
+            piece_len = 0
+
+        piece += c
+        piece_len += c_len
+
+    pieces.append(piece)
+    return "\r\n ".join(pieces)
+
+
+def _format_ical_time(name, dt, all_day):
+    if all_day:
+        from relate.utils import as_local_time
+        return "%s;VALUE=DATE:%s" % (
+                name, as_local_time(dt).strftime("%Y%m%d"))
+    else:
+        from pytz import utc
+        return "%s:%s" % (name, dt.astimezone(utc).strftime("%Y%m%dT%H%M%SZ"))
+
+
+def _make_ical_feed(request, course, calendar_events):
+    from django.utils.html import strip_tags
+    from django.utils.timezone import now
+    from django.core.urlresolvers import reverse
+
+    calendar_url = request.build_absolute_uri(
+            reverse("relate-view_calendar", args=(course.identifier,)))
+
+    lines = [
+            "BEGIN:VCALENDAR",
+            "VERSION:2.0",
+            "PRODID:-//RELATE//%s//EN" % course.identifier,
+            "X-WR-CALNAME:%s" % _escape_ical_text(
+                "%s %s" % (course.number, course.name)),
+            ]
+
+    dtstamp = _format_ical_time("DTSTAMP", now(), all_day=False)
+
+    for calendar_event in calendar_events:
+        lines.extend([
+            "BEGIN:VEVENT",
+            "UID:relate-%s-event-%d@%s" % (
+                course.identifier, calendar_event.id, request.get_host()),
+            dtstamp,
+            _format_ical_time("DTSTART", calendar_event.start_time,
+                calendar_event.all_day),
+            ])
+
+        if calendar_event.end_time is not None:
+            lines.append(
+                    _format_ical_time("DTEND", calendar_event.end_time,
+                        calendar_event.all_day))
+
+        lines.append("SUMMARY:%s" % _escape_ical_text(
+            calendar_event.json["title"]))
+
+        if calendar_event.info is not None:
+            lines.extend([
+                "DESCRIPTION:%s" % _escape_ical_text(
+                    strip_tags(calendar_event.info.description).strip()),
+                "URL:%s" % calendar_url,
+                ])
+
+        lines.append("END:VEVENT")
+
+    lines.append("END:VCALENDAR")
+
+    return "".join(_fold_ical_line(line) + "\r\n" for line in lines)
+
+
+@course_view
+def get_calendar_feed(pctx, feed_format):
+    """Serve the events of the course calendar as FullCalendar-style JSON or
+    as iCalendar. The optional ``start`` and ``end`` query parameters (dates
+    or date/times in ISO 8601 format) restrict the result to the events
+    overlapping that range.
+    """
+
+    # The ETag is only checked once course_view has set up the course and
+    # the user's role in it.
+    etag = _get_calendar_feed_etag(pctx, feed_format)
+
+    @http_dec.condition(etag_func=lambda request: etag)
+    def respond(request):
+        return _make_calendar_feed_response(pctx, feed_format)
+
+    return respond(pctx.request)
+
+
+def _make_calendar_feed_response(pctx, feed_format):
+    range_start = range_end = None
+    if "start" in pctx.request.GET:
+        range_start = _parse_feed_range_bound(pctx.request.GET["start"])
+        if range_start is None:
+            return http.HttpResponseBadRequest("invalid 'start'")
+    if "end" in pctx.request.GET:
+        range_end = _parse_feed_range_bound(pctx.request.GET["end"])
+        if range_end is None:
+            return http.HttpResponseBadRequest("invalid 'end'")
+
+    calendar_events = [
+            calendar_event
+            for calendar_event in get_calendar_events(
+                pctx.course, pctx.repo, pctx.course_commit_sha)
+            if (range_end is None
+                or calendar_event.start_time < range_end)
+            and (range_start is None
+                or (calendar_event.end_time or calendar_event.start_time)
+                >= range_start)]
+
+    if feed_format == "json":
+        from json import dumps
+        response = http.HttpResponse(
+                dumps([calendar_event.json
+                    for calendar_event in calendar_events]),
+                content_type="application/json")
+    else:
+        response = http.HttpResponse(
+                _make_ical_feed(pctx.request, pctx.course, calendar_events),
+                content_type="text/calendar; charset=utf-8")
+
+    # Let clients cache the feed, but have them revalidate it (cheaply, by
+    # ETag) on each use.
+    response["Cache-Control"] = "private, max-age=0, must-revalidate"
+    return response
+
+# }}}
+
 # }}}
 
 # vim: foldmethod=marker
@@ -30,16 +30,18 @@ from django.utils.translation import ugettext as _
 import re
 import datetime
 import six
-import sys
+import stat
+import threading
+
+from collections import OrderedDict
 
 from django.utils.timezone import now
-from django.core.exceptions import ObjectDoesNotExist, ImproperlyConfigured
+from django.core.exceptions import ObjectDoesNotExist
 from django.core.urlresolvers import NoReverseMatch
 
 from markdown.extensions import Extension
 from markdown.treeprocessors import Treeprocessor
 
-from six.moves import html_parser
 
 from jinja2 import (
         BaseLoader as BaseTemplateLoader, TemplateNotFound, FileSystemLoader)
@@ -48,10 +50,8 @@ from relate.utils import dict_to_struct
 
 from yaml import load as load_yaml
 
-if sys.version_info >= (3,):
-    CACHE_KEY_ROOT = "py3"
-else:
-    CACHE_KEY_ROOT = "py2"
+from course.caching import (  # noqa
+        CACHE_KEY_ROOT, CACHE_MISS, get_cached_content, set_cached_content)
 
 
 # {{{ repo blob getting
@@ -99,6 +99,184 @@ def get_course_repo(course):
         return repo
 
 
+class RepoPathIndex(object):
+    """A flat mapping from slash-separated paths within one commit to
+    *(mode, sha)* tuples.
+
+    Directories are read from the object store only the first time a path
+    below them is requested. The index does not hold on to the repository,
+    so one instance may be shared among requests for the same commit.
+    """
+
+    def __init__(self, root_tree_sha):
+        self.entries = {"": (stat.S_IFDIR, root_tree_sha)}
+
+        # maps directory paths to sorted lists of (name, mode, sha)
+        self.dir_contents = {}
+
+    def _index_directory(self, repo, dir_path):
+        mode, tree_sha = self.entries[dir_path]
+        if not stat.S_ISDIR(mode):
+            raise NotADirectory(dir_path)
+
+        if dir_path:
+            prefix = dir_path + "/"
+        else:
+            prefix = ""
+
+        contents = []
+        for entry in repo[tree_sha].items():
+            name = entry.path.decode("utf-8")
+            self.entries[prefix + name] = (entry.mode, entry.sha)
+            contents.append((name, entry.mode, entry.sha))
+
+        contents.sort(key=lambda entry: entry[0])
+        self.dir_contents[dir_path] = contents
+        return contents
+
+    def get_entry(self, repo, path):
+        """Return *(mode, sha)* for *path*, which must be normalized
+        as by :func:`normalize_repo_path`.
+
+        :raises KeyError: if *path* does not exist.
+        :raises NotADirectory: if a leading component of *path* is a file.
+        """
+        try:
+            return self.entries[path]
+        except KeyError:
+            pass
+
+        dir_path = ""
+        for name in path.split("/"):
+            if dir_path not in self.dir_contents:
+                self._index_directory(repo, dir_path)
+
+            if dir_path:
+                dir_path = dir_path + "/" + name
+            else:
+                dir_path = name
+
+        return self.entries[path]
+
+    def list_directory(self, repo, path):
+        """Return a sorted list of *(name, mode, sha)* for the entries in the
+        directory *path*.
+        """
+        try:
+            return self.dir_contents[path]
+        except KeyError:
+            pass
+
+        self.get_entry(repo, path)
+        return self._index_directory(repo, path)
+
+
+class NotADirectory(KeyError):
+    pass
+
+
+def normalize_repo_path(path):
+    # tolerate empty path components (begrudgingly)
+    return "/".join(name for name in path.split("/") if name)
+
+
+REPO_PATH_INDEX_CACHE_SIZE = 32
+
+_repo_path_index_cache = OrderedDict()
+
+
+def get_repo_path_index(repo, commit_sha):
+    """Return a :class:`RepoPathIndex` for *commit_sha* in *repo*.
+
+    Indices for real commits (i.e. when *commit_sha* is a byte string) are
+    kept in a per-process cache keyed by repository and commit, so that
+    repeated lookups only pay for each directory object once.
+
+    :arg repo: The actual repository, not a :class:`SubdirRepoWrapper`.
+    """
+
+    if not isinstance(commit_sha, six.binary_type):
+        # e.g. the file system used by offline validation, which may
+        # change underneath us
+        return RepoPathIndex(repo[commit_sha].tree)
+
+    cache_key = (repo.controldir(), commit_sha)
+
+    try:
+        index = _repo_path_index_cache.pop(cache_key)
+    except KeyError:
+        index = RepoPathIndex(repo[commit_sha].tree)
+
+    _repo_path_index_cache[cache_key] = index
+    while len(_repo_path_index_cache) > REPO_PATH_INDEX_CACHE_SIZE:
+        _repo_path_index_cache.popitem(last=False)
+
+    return index
+
+
+# {{{ repo read recording
+
+_repo_read_recorders = threading.local()
+
+
+class record_repo_reads(object):  # noqa
+    """A context manager collecting the (normalized, repository-root-relative)
+    paths of all files requested through :func:`get_repo_blob` and
+    :func:`get_repo_blob_data_cached` in the current thread while it is
+    active. Paths that were requested but do not exist are included.
+
+    Used to find the files on which a piece of content depends, for example
+    through Jinja includes.
+    """
+
+    def __enter__(self):
+        self.paths = set()
+
+        stack = getattr(_repo_read_recorders, "stack", None)
+        if stack is None:
+            stack = _repo_read_recorders.stack = []
+        stack.append(self.paths)
+
+        return self.paths
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        popped = _repo_read_recorders.stack.pop()
+        assert popped is self.paths
+
+
+def _note_repo_read(path):
+    for paths in getattr(_repo_read_recorders, "stack", ()):
+        paths.add(path)
+
+
+def _is_recording_repo_reads():
+    return bool(getattr(_repo_read_recorders, "stack", None))
+
+
+def get_changed_repo_paths(repo, old_commit_sha, new_commit_sha):
+    """Return a set of (repository-root-relative) paths that were added,
+    removed or modified between *old_commit_sha* and *new_commit_sha*.
+
+    :raises KeyError: if one of the commits is not in the repository.
+    """
+
+    repo, dummy = get_true_repo_and_path(repo, "")
+
+    from dulwich.diff_tree import tree_changes
+
+    changed_paths = set()
+    for change in tree_changes(
+            repo.object_store,
+            repo[old_commit_sha].tree, repo[new_commit_sha].tree):
+        for entry in [change.old, change.new]:
+            if entry.path is not None:
+                changed_paths.add(entry.path.decode("utf-8"))
+
+    return changed_paths
+
+# }}}
+
+
 def get_repo_blob(repo, full_name, commit_sha, allow_tree=True):
     """
     :arg full_name: A Unicode string indicating the file name.
@@ -108,54 +286,51 @@ def get_repo_blob(repo, full_name, commit_sha, allow_tree=True):
 
     repo, full_name = get_true_repo_and_path(repo, full_name)
 
-    names = full_name.split("/")
-
-    # Allow non-ASCII file name
-    full_name = full_name.encode('utf-8')
+    path = normalize_repo_path(full_name)
+    _note_repo_read(path)
 
-    tree_sha = repo[commit_sha].tree
-    tree = repo[tree_sha]
+    if not path and not allow_tree:
+        raise ObjectDoesNotExist(
+                _("repo root is a directory, not a file"))
 
-    def access_directory_content(maybe_tree, name):
-        try:
-            mode_and_blob_sha = tree[name.encode()]
-        except TypeError:
-            raise ObjectDoesNotExist(_("resource '%s' is a file, "
-                "not a directory")
-                % full_name.decode("utf-8"))
-
-        mode, blob_sha = mode_and_blob_sha
-        return mode_and_blob_sha
-
-    if not full_name:
-        if allow_tree:
-            return tree
-        else:
-            raise ObjectDoesNotExist(
-                    _("repo root is a directory, not a file"))
+    index = get_repo_path_index(repo, commit_sha)
 
     try:
-        for name in names[:-1]:
-            if not name:
-                # tolerate empty path components (begrudgingly)
-                continue
+        mode, blob_sha = index.get_entry(repo, path)
+    except NotADirectory:
+        raise ObjectDoesNotExist(_("resource '%s' is a file, "
+            "not a directory") % full_name)
+    except KeyError:
+        raise ObjectDoesNotExist(_("resource '%s' not found") % full_name)
 
-            mode, blob_sha = access_directory_content(tree, name)
-            tree = repo[blob_sha]
+    if not allow_tree and stat.S_ISDIR(mode):
+        raise ObjectDoesNotExist(
+                _("resource '%s' is a directory, not a file")
+                % full_name)
 
-        mode, blob_sha = access_directory_content(tree, names[-1])
+    return repo[blob_sha]
 
-        result = repo[blob_sha]
-        if not allow_tree and not hasattr(result, "data"):
-            raise ObjectDoesNotExist(
-                    _("resource '%s' is a directory, not a file")
-                    % full_name)
 
-        return result
+def list_repo_directory(repo, dir_name, commit_sha):
+    """Return a sorted list of *(name, mode, sha)* tuples, with *name* a Unicode
+    string, for the entries of the directory *dir_name* in *repo* at
+    *commit_sha*.
 
+    :arg commit_sha: A byte string containing the commit hash
+    """
+
+    repo, dir_name = get_true_repo_and_path(repo, dir_name)
+    path = normalize_repo_path(dir_name)
+
+    index = get_repo_path_index(repo, commit_sha)
+
+    try:
+        return index.list_directory(repo, path)
+    except NotADirectory:
+        raise ObjectDoesNotExist(_("resource '%s' is a file, "
+            "not a directory") % dir_name)
     except KeyError:
-        raise ObjectDoesNotExist(_("resource '%s' not found")
-                % full_name.decode("utf-8"))
+        raise ObjectDoesNotExist(_("resource '%s' not found") % dir_name)
 
 
 def get_repo_blob_data_cached(repo, full_name, commit_sha):
@@ -163,49 +338,26 @@ def get_repo_blob_data_cached(repo, full_name, commit_sha):
     :arg commit_sha: A byte string containing the commit hash
     """
 
-    if isinstance(commit_sha, six.binary_type):
-        from six.moves.urllib.parse import quote_plus
-        cache_key = "%s%R%1".join((
-            CACHE_KEY_ROOT,
-            quote_plus(repo.controldir()),
-            quote_plus(full_name),
-            commit_sha.decode(),
-            ".".join(str(s) for s in sys.version_info[:2]),
-            ))
-    else:
-        cache_key = None
-
-    try:
-        import django.core.cache as cache
-    except ImproperlyConfigured:
-        cache_key = None
+    dummy, true_full_name = get_true_repo_and_path(repo, full_name)
+    _note_repo_read(normalize_repo_path(true_full_name))
 
-    if cache_key is None:
+    if not isinstance(commit_sha, six.binary_type):
         result = get_repo_blob(repo, full_name, commit_sha,
                 allow_tree=False).data
         assert isinstance(result, six.binary_type)
         return result
 
-    # Byte string is wrapped in a tuple to force pickling because memcache's
-    # python wrapper appears to auto-decode/encode string values, thus trying
-    # to decode our byte strings. Grr.
-
-    def_cache = cache.caches["default"]
-
-    result = None
-    # Memcache is apparently limited to 250 characters.
-    if len(cache_key) < 240:
-        result = def_cache.get(cache_key)
-    if result is not None:
-        (result,) = result
-        assert isinstance(result, six.binary_type), cache_key
+    key_parts = (repo.controldir(), full_name, commit_sha)
+    result = get_cached_content("blob", key_parts)
+    if result is not CACHE_MISS:
+        assert isinstance(result, six.binary_type), key_parts
         return result
 
     result = get_repo_blob(repo, full_name, commit_sha,
             allow_tree=False).data
 
     if len(result) <= getattr(settings, "RELATE_CACHE_MAX_BYTES", 0):
-        def_cache.add(cache_key, (result,), None)
+        set_cached_content("blob", key_parts, result)
 
     assert isinstance(result, six.binary_type)
 
@@ -439,27 +591,23 @@ def expand_yaml_macros(repo, commit_sha, yaml_str):
 
 # {{{ repo yaml getting
 
-def get_raw_yaml_from_repo(repo, full_name, commit_sha):
+def get_raw_yaml_from_repo(repo, full_name, commit_sha, cached=True):
     """Return decoded YAML data structure from
     the given file in *repo* at *commit_sha*.
 
     :arg commit_sha: A byte string containing the commit hash
     """
 
-    from six.moves.urllib.parse import quote_plus
-    cache_key = "%RAW%%2".join((
-        CACHE_KEY_ROOT,
-        quote_plus(repo.controldir()), quote_plus(full_name), commit_sha.decode(),
-        ))
-
-    import django.core.cache as cache
-    def_cache = cache.caches["default"]
-    result = None
-    # Memcache is apparently limited to 250 characters.
-    if len(cache_key) < 240:
-        result = def_cache.get(cache_key)
-    if result is not None:
-        return result
+    if cached:
+        result = get_from_content_bundle(
+                repo, "raw", full_name, commit_sha)
+        if result is not NOT_IN_BUNDLE:
+            return result
+
+        key_parts = (repo.controldir(), full_name, commit_sha)
+        result = get_cached_content("raw_yaml", key_parts)
+        if result is not CACHE_MISS:
+            return result
 
     result = load_yaml(
             expand_yaml_macros(
@@ -467,7 +615,8 @@ def get_raw_yaml_from_repo(repo, full_name, commit_sha):
                 get_repo_blob(repo, full_name, commit_sha,
                     allow_tree=False).data))
 
-    def_cache.add(cache_key, result, None)
+    if cached:
+        set_cached_content("raw_yaml", key_parts, result)
 
     return result
 
@@ -481,19 +630,14 @@ def get_yaml_from_repo(repo, full_name, commit_sha, cached=True):
     """
 
     if cached:
-        from six.moves.urllib.parse import quote_plus
-        cache_key = "%%%2".join(
-                (CACHE_KEY_ROOT,
-                    quote_plus(repo.controldir()), quote_plus(full_name),
-                    commit_sha.decode()))
-
-        import django.core.cache as cache
-        def_cache = cache.caches["default"]
-        result = None
-        # Memcache is apparently limited to 250 characters.
-        if len(cache_key) < 240:
-            result = def_cache.get(cache_key)
-        if result is not None:
+        result = get_from_content_bundle(
+                repo, "struct", full_name, commit_sha)
+        if result is not NOT_IN_BUNDLE:
+            return result
+
+        key_parts = (repo.controldir(), full_name, commit_sha)
+        result = get_cached_content("yaml", key_parts)
+        if result is not CACHE_MISS:
             return result
 
     expanded = expand_yaml_macros(
@@ -504,7 +648,7 @@ def get_yaml_from_repo(repo, full_name, commit_sha, cached=True):
     result = dict_to_struct(load_yaml(expanded))
 
     if cached:
-        def_cache.add(cache_key, result, None)
+        set_cached_content("yaml", key_parts, result)
 
     return result
 
@@ -523,51 +667,17 @@ def _attr_to_string(key, val):
         return "%s=\"%s\"" % (key, val)
 
 
-class TagProcessingHTMLParser(html_parser.HTMLParser):
-    def __init__(self, out_file, process_tag_func):
-        html_parser.HTMLParser.__init__(self)
-
-        self.out_file = out_file
-        self.process_tag_func = process_tag_func
-
-    def handle_starttag(self, tag, attrs):
-        attrs = dict(attrs)
-        attrs.update(self.process_tag_func(tag, attrs))
-
-        self.out_file.write("<%s %s>" % (tag, " ".join(
-            _attr_to_string(k, v) for k, v in six.iteritems(attrs))))
-
-    def handle_endtag(self, tag):
-        self.out_file.write("</%s>" % tag)
-
-    def handle_startendtag(self, tag, attrs):
-        attrs = dict(attrs)
-        attrs.update(self.process_tag_func(tag, attrs))
-
-        self.out_file.write("<%s %s/>" % (tag, " ".join(
-            _attr_to_string(k, v) for k, v in six.iteritems(attrs))))
-
-    def handle_data(self, data):
-        self.out_file.write(data)
+# matches the start tags that LinkFixerTreeprocessor.process_tag may change
+REWRITABLE_TAG_RE = re.compile(
+        r"<(a|link|img|object|table)"
+        r"((?:\s+[^\s\"'=/<>]+"
+        r"(?:\s*=\s*(?:\"[^\"]*\"|'[^']*'|[^\s\"'=<>`]+))?)*)"
+        r"\s*(/?)>",
+        re.IGNORECASE)
 
-    def handle_entityref(self, name):
-        self.out_file.write("&%s;" % name)
-
-    def handle_charref(self, name):
-        self.out_file.write("&#%s;" % name)
-
-    def handle_comment(self, data):
-        self.out_file.write("<!--%s-->" % data)
-
-    def handle_decl(self, decl):
-        self.out_file.write("<!%s>" % decl)
-
-    def handle_pi(self, data):
-        raise NotImplementedError(
-                _("I have no idea what a processing instruction is."))
-
-    def unknown_decl(self, data):
-        self.out_file.write("<![%s]>" % data)
+HTML_ATTR_RE = re.compile(
+        r"([^\s\"'=/<>]+)"
+        r"(?:\s*=\s*(?:\"([^\"]*)\"|'([^']*)'|([^\s\"'=<>`]+)))?")
 
 
 class PreserveFragment(object):
@@ -707,18 +817,47 @@ class LinkFixerTreeprocessor(Treeprocessor):
         for child in root:
             self.walk_and_process_tree(child)
 
+    def rewrite_start_tag(self, match):
+        tag_name = match.group(1).lower()
+
+        attr_list = []
+        for attr_match in HTML_ATTR_RE.finditer(match.group(2)):
+            key, dquoted, squoted, unquoted = attr_match.groups()
+            if dquoted is not None:
+                val = dquoted
+            elif squoted is not None:
+                val = squoted
+            else:
+                val = unquoted
+
+            attr_list.append((key.lower(), val))
+
+        changed_attrs = self.process_tag(tag_name, dict(attr_list))
+        if not changed_attrs:
+            return match.group(0)
+
+        new_attr_list = [
+                (key, changed_attrs.pop(key, val))
+                for key, val in attr_list]
+        new_attr_list.extend(sorted(six.iteritems(changed_attrs)))
+
+        return "<%s %s%s>" % (tag_name, " ".join(
+            _attr_to_string(key, val) for key, val in new_attr_list),
+            match.group(3))
+
+    def process_html(self, html):
+        """Rewrite the RELATE URLs in the HTML string *html* in a single
+        pass, leaving all tags that need no change as they are.
+        """
+        return REWRITABLE_TAG_RE.sub(self.rewrite_start_tag, html)
+
     def run(self, root):
         self.walk_and_process_tree(root)
 
         # root through and process Markdown's HTML stash (gross!)
-        from six.moves import cStringIO
-
-        for i, (html, safe) in enumerate(self.md.htmlStash.rawHtmlBlocks):
-            outf = cStringIO()
-            parser = TagProcessingHTMLParser(outf, self.process_tag)
-            parser.feed(html)
-
-            self.md.htmlStash.rawHtmlBlocks[i] = (outf.getvalue(), safe)
+        raw_html_blocks = self.md.htmlStash.rawHtmlBlocks
+        for i, (html, safe) in enumerate(raw_html_blocks):
+            raw_html_blocks[i] = (self.process_html(html), safe)
 
 
 class LinkFixerExtension(Extension):
@@ -734,6 +873,68 @@ class LinkFixerExtension(Extension):
                         reverse_func=self.reverse_func)
 
 
+# {{{ markdown renderer pool
+
+# Setting up a markdown.Markdown instance with all its extensions takes
+# longer than converting most course markup, so instances are reset and
+# reused. Only the link fixer depends on the course and commit being rendered,
+# and it is pointed at them for each use.
+
+MAX_POOLED_MARKDOWN_RENDERERS = 8
+
+_markdown_renderer_pool = []
+_markdown_renderer_pool_lock = threading.Lock()
+
+
+def make_markdown_renderer(course=None, commit_sha=None, reverse_func=None):
+    from course.mdx_mathjax import MathJaxExtension
+    import markdown
+    return markdown.Markdown(
+        extensions=[
+            LinkFixerExtension(course, commit_sha, reverse_func=reverse_func),
+            MathJaxExtension(),
+            "markdown.extensions.extra",
+            "markdown.extensions.codehilite",
+            ],
+        output_format="html5")
+
+
+def render_markdown(course, commit_sha, text, reverse_func):
+    with _markdown_renderer_pool_lock:
+        if _markdown_renderer_pool:
+            md = _markdown_renderer_pool.pop()
+        else:
+            md = None
+
+    if md is None:
+        md = make_markdown_renderer()
+
+    link_fixer = md.treeprocessors["relate_link_fixer"]
+    link_fixer.course = course
+    link_fixer.commit_sha = commit_sha
+    link_fixer.reverse_func = reverse_func
+
+    # A renderer that failed is dropped rather than trusted to be reusable.
+    result = md.convert(text)
+
+    md.reset()
+    link_fixer.course = link_fixer.commit_sha = link_fixer.reverse_func = None
+
+    # The abbreviation extension adds an inline pattern for each
+    # abbreviation it finds, which reset() does not remove.
+    for name in list(md.inlinePatterns.keys()):
+        if name.startswith("abbr-"):
+            del md.inlinePatterns[name]
+
+    with _markdown_renderer_pool_lock:
+        if len(_markdown_renderer_pool) < MAX_POOLED_MARKDOWN_RENDERERS:
+            _markdown_renderer_pool.append(md)
+
+    return result
+
+# }}}
+
+
 def remove_prefix(prefix, s):
     if s.startswith(prefix):
         return s[len(prefix):]
@@ -751,26 +952,16 @@ def markup_to_html(course, repo, commit_sha, text, reverse_func=None,
         reverse_func = reverse
 
     if course is not None and not jinja_env:
-        try:
-            import django.core.cache as cache
-        except ImproperlyConfigured:
-            cache_key = None
-        else:
-            import hashlib
-            cache_key = ("markup:v6:%s:%d:%s:%s"
-                    % (CACHE_KEY_ROOT, course.id, str(commit_sha),
-                        hashlib.md5(text.encode("utf-8")).hexdigest()))
-
-            def_cache = cache.caches["default"]
-            result = def_cache.get(cache_key)
-            if result is not None:
-                assert isinstance(result, six.text_type)
-                return result
+        key_parts = (course.id, str(commit_sha), text)
+        result = get_cached_content("markup", key_parts)
+        if result is not CACHE_MISS:
+            assert isinstance(result, six.text_type)
+            return result
 
         if text.lstrip().startswith(JINJA_PREFIX):
             text = remove_prefix(JINJA_PREFIX, text.lstrip())
     else:
-        cache_key = None
+        key_parts = None
 
     if not isinstance(text, six.text_type):
         text = six.text_type(text)
@@ -789,20 +980,11 @@ def markup_to_html(course, repo, commit_sha, text, reverse_func=None,
     if validate_only:
         return
 
-    from course.mdx_mathjax import MathJaxExtension
-    import markdown
-    result = markdown.markdown(text,
-        extensions=[
-            LinkFixerExtension(course, commit_sha, reverse_func=reverse_func),
-            MathJaxExtension(),
-            "markdown.extensions.extra",
-            "markdown.extensions.codehilite",
-            ],
-        output_format="html5")
+    result = render_markdown(course, commit_sha, text, reverse_func)
 
     assert isinstance(result, six.text_type)
-    if cache_key is not None:
-        def_cache.add(cache_key, result, None)
+    if key_parts is not None:
+        set_cached_content("markup", key_parts, result)
 
     return result
 
@@ -1086,22 +1268,85 @@ def compute_chunk_weight_and_shown(course, chunk, role, now_datetime,
     return 0, True
 
 
+def _get_chunk_rule_datespecs(page_desc):
+    for chunk in page_desc.chunks:
+        for rule in getattr(chunk, "rules", []):
+            for attr in ["if_after", "if_before", "start", "end"]:
+                if hasattr(rule, attr):
+                    yield getattr(rule, attr)
+
+
 def get_processed_page_chunks(course, repo, commit_sha,
-        page_desc, role, now_datetime, facilities):
+        page_desc, role, now_datetime, facilities, page_path=None):
+    """
+    :arg page_path: If given, the path of the file containing *page_desc*.
+        The result is then cached until the next point in time at which the
+        outcome of one of the chunk rules may change.
+    """
+
+    key_parts = None
+    if page_path is not None:
+        from course.caching import (
+                get_cache_generation, get_course_events_generation_name)
+
+        # datespecs may refer to events
+        events_generation = get_cache_generation(
+                get_course_events_generation_name(course.id))
+        if events_generation is not None:
+            key_parts = (
+                    course.id, commit_sha, page_path, role,
+                    ",".join(sorted(facilities)),
+                    events_generation)
+
+    if key_parts is not None:
+        cached = get_cached_content("page_chunks", key_parts)
+        if cached is not CACHE_MISS:
+            valid_after, valid_before, chunks = cached
+            if ((valid_after is None or valid_after < now_datetime)
+                    and (valid_before is None or now_datetime < valid_before)):
+                return chunks
+
+    chunks = []
     for chunk in page_desc.chunks:
-        chunk.weight, chunk.shown = \
+        weight, shown = \
                 compute_chunk_weight_and_shown(
                         course, chunk, role, now_datetime,
                         facilities)
-        chunk.html_content = markup_to_html(course, repo, commit_sha, chunk.content)
-        if not hasattr(chunk, "title"):
-            from course.content import extract_title_from_markup
-            chunk.title = extract_title_from_markup(chunk.content)
+        if not shown:
+            continue
 
-    page_desc.chunks.sort(key=lambda chunk: chunk.weight, reverse=True)
+        if hasattr(chunk, "title"):
+            title = chunk.title
+        else:
+            title = extract_title_from_markup(chunk.content)
+
+        chunks.append(chunk._replace(
+            weight=weight,
+            shown=shown,
+            html_content=markup_to_html(
+                course, repo, commit_sha, chunk.content),
+            title=title))
+
+    chunks.sort(key=lambda chunk: chunk.weight, reverse=True)
+
+    if key_parts is not None:
+        valid_after = None
+        valid_before = None
+        for datespec in _get_chunk_rule_datespecs(page_desc):
+            boundary = parse_date_spec(course, datespec)
+            if boundary is None:
+                continue
+            if boundary <= now_datetime:
+                if valid_after is None or boundary > valid_after:
+                    valid_after = boundary
+            if boundary >= now_datetime:
+                if valid_before is None or boundary < valid_before:
+                    valid_before = boundary
 
-    return [chunk for chunk in page_desc.chunks
-            if chunk.shown]
+        set_cached_content("page_chunks", key_parts,
+                (valid_after, valid_before, chunks))
+
+    return chunks
 
 
 # }}}
@@ -1146,16 +1391,20 @@ def normalize_flow_desc(flow_desc):
             # Legacy content with grade_identifier in grading rule,
             # move first found grade_identifier up to rules.
 
-            rules.grade_identifier = None
-            rules.grade_aggregation_strategy = None
+            grade_identifier = None
+            grade_aggregation_strategy = None
 
             for grule in rules.grading:
                 if grule.grade_identifier is not None:
-                    rules.grade_identifier = grule.grade_identifier
-                    rules.grade_aggregation_strategy = \
+                    grade_identifier = grule.grade_identifier
+                    grade_aggregation_strategy = \
                             grule.grade_aggregation_strategy
                     break
 
+            flow_desc = flow_desc._replace(rules=rules._replace(
+                grade_identifier=grade_identifier,
+                grade_aggregation_strategy=grade_aggregation_strategy))
+
     return flow_desc
 
 
@@ -1164,9 +1413,8 @@ def get_flow_desc(repo, course, flow_id, commit_sha):
 
     flow_desc = normalize_flow_desc(flow_desc)
 
-    flow_desc.description_html = markup_to_html(
-            course, repo, commit_sha, getattr(flow_desc, "description", None))
-    return flow_desc
+    return flow_desc._replace(description_html=markup_to_html(
+            course, repo, commit_sha, getattr(flow_desc, "description", None)))
 
 
 def get_flow_page_desc(flow_id, flow_desc, group_id, page_id):
@@ -1263,21 +1511,39 @@ def instantiate_flow_page(location, repo, page_desc, commit_sha):
 # }}}
 
 
-def get_course_commit_sha(course, participation):
-    # logic duplicated in course.utils.CoursePageContext
+class CourseCommitSHADoesNotExist(Exception):
+    pass
+
+
+def get_course_commit_sha(course, participation, repo=None,
+        raise_on_nonexistent_preview_commit=False):
+    """
+    :arg repo: the course repository, if already open.
+    :arg raise_on_nonexistent_preview_commit: if *True*, raise
+        :exc:`CourseCommitSHADoesNotExist` instead of silently falling back
+        to the active commit if the preview commit of *participation* does
+        not exist.
+    """
 
     sha = course.active_git_commit_sha
 
     if participation is not None and participation.preview_git_commit_sha:
         preview_sha = participation.preview_git_commit_sha
 
-        repo = get_course_repo(course)
+        if repo is None:
+            repo = get_course_repo(course)
         if isinstance(repo, SubdirRepoWrapper):
             repo = repo.repo
 
         try:
             repo[preview_sha.encode()]
         except KeyError:
+            if raise_on_nonexistent_preview_commit:
+                raise CourseCommitSHADoesNotExist(
+                        _("Preview revision '%s' does not exist--"
+                        "showing active course content instead.")
+                        % preview_sha)
+
             preview_sha = None
 
         if preview_sha is not None:
@@ -1289,15 +1555,341 @@ def get_course_commit_sha(course, participation):
 def list_flow_ids(repo, commit_sha):
     flow_ids = []
     try:
-        flows_tree = get_repo_blob(repo, "flows", commit_sha)
+        flows_entries = list_repo_directory(repo, "flows", commit_sha)
     except ObjectDoesNotExist:
         # That's OK--no flows yet.
         pass
     else:
-        for entry in flows_tree.items():
-            if entry.path.endswith(b".yml"):
-                flow_ids.append(entry.path[:-4])
+        for name, mode, sha in flows_entries:
+            if name.endswith(".yml"):
+                flow_ids.append(name[:-4].encode("utf-8"))
 
     return sorted(flow_ids)
 
+
+# {{{ content bundles
+
+CONTENT_BUNDLE_MAGIC = b"RELATE-CONTENT-BUNDLE-2\n"
+CONTENT_BUNDLE_DIR_NAME = "relate-content-bundles"
+CONTENT_BUNDLE_CACHE_SIZE = 8
+CONTENT_BUNDLES_KEPT = 10
+
+# seconds after which to check again for a bundle that did not exist
+CONTENT_BUNDLE_RECHECK_INTERVAL = 30
+
+NOT_IN_BUNDLE = object()
+
+
+class ContentBundle(object):
+    """The parsed YAML content of one commit of a course repository, as
+    written by :func:`build_content_bundle`.
+
+    The file starts with :data:`CONTENT_BUNDLE_MAGIC`, followed by the
+    length of the pickled index as an 8-byte big-endian integer, the
+    pickled index itself and then the pickled items. The index maps
+    *(kind, path)* tuples (with *kind* either ``"raw"`` or ``"struct"``) to
+    *(offset, length)* tuples within the item data. The file is memory
+    mapped, and items are unpickled anew on each access, so that callers
+    may modify what they receive.
+    """
+
+    def __init__(self, filename):
+        import mmap
+        import struct
+        from six.moves import cPickle as pickle
+
+        with open(filename, "rb") as inf:
+            self.mmap = mmap.mmap(inf.fileno(), 0, access=mmap.ACCESS_READ)
+
+        header_len = len(CONTENT_BUNDLE_MAGIC)
+        if self.mmap[:header_len] != CONTENT_BUNDLE_MAGIC:
+            self.mmap.close()
+            raise ValueError("'%s' is not a content bundle" % filename)
+
+        index_len, = struct.unpack(
+                ">Q", self.mmap[header_len:header_len+8])
+        index_start = header_len + 8
+        self.index = pickle.loads(
+                self.mmap[index_start:index_start+index_len])
+        self.data_start = index_start + index_len
+
+    def get(self, kind, path):
+        try:
+            offset, length = self.index[kind, path]
+        except KeyError:
+            return NOT_IN_BUNDLE
+
+        from six.moves import cPickle as pickle
+        start = self.data_start + offset
+        return pickle.loads(self.mmap[start:start+length])
+
+
+def _get_content_bundle_path(repo, commit_sha):
+    import os
+    return os.path.join(
+            repo.controldir(), CONTENT_BUNDLE_DIR_NAME,
+            "%s-%s.bundle" % (commit_sha.decode(), CACHE_KEY_ROOT))
+
+
+# maps (control directory, commit SHA) to (bundle or None, time of check)
+_content_bundle_cache = OrderedDict()
+
+
+def get_content_bundle(repo, commit_sha):
+    """Return the :class:`ContentBundle` for *commit_sha* in the (true,
+    not subdirectory-wrapped) repository *repo*, or *None* if none has been
+    built.
+    """
+
+    from time import time
+
+    cache_key = (repo.controldir(), commit_sha)
+    try:
+        bundle, check_time = _content_bundle_cache.pop(cache_key)
+    except KeyError:
+        bundle = None
+        check_time = None
+
+    if bundle is None and (
+            check_time is None
+            or time() - check_time > CONTENT_BUNDLE_RECHECK_INTERVAL):
+        check_time = time()
+        try:
+            bundle = ContentBundle(_get_content_bundle_path(repo, commit_sha))
+        except (IOError, OSError, ValueError):
+            bundle = None
+
+    _content_bundle_cache[cache_key] = (bundle, check_time)
+    while len(_content_bundle_cache) > CONTENT_BUNDLE_CACHE_SIZE:
+        _content_bundle_cache.popitem(last=False)
+
+    return bundle
+
+
+def get_from_content_bundle(repo, kind, full_name, commit_sha):
+    """Return the item of *kind* for *full_name* from the content bundle
+    for *commit_sha*, or :data:`NOT_IN_BUNDLE`.
+    """
+
+    if _is_recording_repo_reads():
+        # Callers want to know which files the content came from.
+        return NOT_IN_BUNDLE
+
+    if not isinstance(commit_sha, six.binary_type):
+        # e.g. the validator's fake repository
+        return NOT_IN_BUNDLE
+
+    repo, full_name = get_true_repo_and_path(repo, full_name)
+
+    bundle = get_content_bundle(repo, commit_sha)
+    if bundle is None:
+        return NOT_IN_BUNDLE
+
+    return bundle.get(kind, normalize_repo_path(full_name))
+
+
+def _list_attributes_files(repo, commit_sha):
+    true_repo, prefix = get_true_repo_and_path(repo, "")
+    if prefix:
+        prefix = prefix + "/"
+
+    result = []
+    for entry in true_repo.object_store.iter_tree_contents(
+            true_repo[commit_sha].tree):
+        path = entry.path.decode("utf-8")
+        if (path.startswith(prefix)
+                and path.rsplit("/", 1)[-1] == ".attributes.yml"):
+            result.append(path[len(prefix):])
+
+    return result
+
+
+def build_content_bundle(repo, course, commit_sha):
+    """Parse the course file, events file, flows, static pages and
+    ``.attributes.yml`` files of *course* at *commit_sha* and write them to
+    a :class:`ContentBundle` in the control directory of *repo*. Files that
+    fail to parse are left out.
+
+    :returns: the number of items in the bundle.
+    """
+
+    items = [("struct", course.course_file), ("raw", course.events_file)]
+    items.extend(
+            ("struct", path)
+            for path in _list_staticpage_files(repo, commit_sha))
+    items.extend(
+            ("struct", "flows/%s.yml" % flow_id.decode("utf-8"))
+            for flow_id in list_flow_ids(repo, commit_sha))
+    items.extend(
+            ("raw", path)
+            for path in _list_attributes_files(repo, commit_sha))
+
+    from six.moves import cPickle as pickle
+
+    index = {}
+    data = []
+    offset = 0
+    for kind, path in items:
+        try:
+            if kind == "raw":
+                item = get_raw_yaml_from_repo(repo, path, commit_sha,
+                        cached=False)
+            else:
+                item = get_yaml_from_repo(repo, path, commit_sha,
+                        cached=False)
+        except Exception:
+            continue
+
+        pickled_item = pickle.dumps(item, protocol=2)
+        dummy, true_path = get_true_repo_and_path(repo, path)
+        index[kind, normalize_repo_path(true_path)] = (
+                offset, len(pickled_item))
+        data.append(pickled_item)
+        offset += len(pickled_item)
+
+    true_repo, dummy = get_true_repo_and_path(repo, "")
+    bundle_path = _get_content_bundle_path(true_repo, commit_sha)
+
+    import os
+    import struct
+
+    bundle_dir = os.path.dirname(bundle_path)
+    if not os.path.isdir(bundle_dir):
+        os.makedirs(bundle_dir)
+
+    pickled_index = pickle.dumps(index, protocol=2)
+    tmp_path = "%s.tmp-%d" % (bundle_path, os.getpid())
+    with open(tmp_path, "wb") as outf:
+        outf.write(CONTENT_BUNDLE_MAGIC)
+        outf.write(struct.pack(">Q", len(pickled_index)))
+        outf.write(pickled_index)
+        for pickled_item in data:
+            outf.write(pickled_item)
+    os.rename(tmp_path, bundle_path)
+
+    _content_bundle_cache.pop((true_repo.controldir(), commit_sha), None)
+
+    # {{{ remove old bundles
+
+    bundle_files = sorted(
+            (os.path.join(bundle_dir, name)
+                for name in os.listdir(bundle_dir)
+                if name.endswith(".bundle")),
+            key=os.path.getmtime, reverse=True)
+    for old_bundle_path in bundle_files[CONTENT_BUNDLES_KEPT:]:
+        try:
+            os.unlink(old_bundle_path)
+        except OSError:
+            pass
+
+    # }}}
+
+    return len(index)
+
+# }}}
+
+
+# {{{ cache warm-up
+
+def _list_staticpage_files(repo, commit_sha, dir_name="staticpages"):
+    try:
+        entries = list_repo_directory(repo, dir_name, commit_sha)
+    except ObjectDoesNotExist:
+        return []
+
+    result = []
+    for name, mode, sha in entries:
+        path = dir_name + "/" + name
+        if stat.S_ISDIR(mode):
+            result.extend(_list_staticpage_files(repo, commit_sha, path))
+        elif name.endswith(".yml"):
+            result.append(path)
+
+    return result
+
+
+def _warm_up_page_chunks(course, repo, commit_sha, page_desc):
+    for chunk in page_desc.chunks:
+        markup_to_html(course, repo, commit_sha, chunk.content)
+
+
+def _warm_up_flow(course, repo, commit_sha, flow_id):
+    flow_desc = get_flow_desc(repo, course, flow_id, commit_sha)
+
+    from course.page.base import PageContext
+    page_context = PageContext(course, repo, commit_sha, flow_session=None)
+
+    for grp in flow_desc.groups:
+        for page_desc in grp.pages:
+            page = instantiate_flow_page(
+                    "warm-up", repo, page_desc, commit_sha)
+            page_data = page.make_page_data()
+            page.title(page_context, page_data)
+            page.body(page_context, page_data)
+
+
+def _warm_up_calendar(course, repo, commit_sha):
+    try:
+        events_desc = get_raw_yaml_from_repo(
+                repo, course.events_file, commit_sha)
+    except ObjectDoesNotExist:
+        return
+
+    for event_desc in six.itervalues(events_desc.get("events", {})):
+        if "description" in event_desc:
+            markup_to_html(course, repo, commit_sha, event_desc["description"])
+
+
+def warm_up_content_caches(course, repo, commit_sha, progress=None):
+    """Fill the content caches (parsed YAML, rendered markup) for the
+    course page, all static pages, all flows and the calendar of *course*
+    at *commit_sha*, so that the first visitors after an update do not
+    have to.
+
+    Errors are ignored, since content that fails to render would also
+    fail (and not be cached) when it is visited.
+
+    :arg progress: if given, called as *progress(current, total, message)*
+        before each item.
+    :returns: a tuple *(item_count, failed_count)*.
+    """
+
+    items = [
+            (_("course page"),
+                lambda: _warm_up_page_chunks(course, repo, commit_sha,
+                    get_course_desc(repo, course, commit_sha))),
+            (_("calendar"),
+                lambda: _warm_up_calendar(course, repo, commit_sha)),
+            ]
+
+    def make_staticpage_item(path):
+        return (path,
+                lambda: _warm_up_page_chunks(course, repo, commit_sha,
+                    get_staticpage_desc(repo, course, commit_sha, path)))
+
+    def make_flow_item(flow_id):
+        return ("flows/%s.yml" % flow_id,
+                lambda: _warm_up_flow(course, repo, commit_sha, flow_id))
+
+    items.extend(
+            make_staticpage_item(path)
+            for path in _list_staticpage_files(repo, commit_sha))
+    items.extend(
+            make_flow_item(flow_id.decode("utf-8"))
+            for flow_id in list_flow_ids(repo, commit_sha))
+
+    failed_count = 0
+    for i, (description, warm_up) in enumerate(items):
+        if progress is not None:
+            progress(i, len(items), description)
+
+        try:
+            warm_up()
+        except Exception:
+            failed_count += 1
+
+    return len(items), failed_count
+
+# }}}
+
 # vim: foldmethod=marker
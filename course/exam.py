@@ -530,6 +530,9 @@ def check_in_for_exam(request):
 
 
 def is_from_exams_only_facility(request):
+    if not request.relate_facilities:
+        return False
+
     from course.utils import get_facilities_config
     for name, props in six.iteritems(get_facilities_config(request)):
         if not props.get("exams_only", False):
@@ -553,21 +556,23 @@ def get_login_exam_ticket(request):
 
 # {{{ lockdown middleware
 
-class ExamFacilityMiddleware(object):
-    def process_request(self, request):
-        exams_only = is_from_exams_only_facility(request)
+EXAM_LOCKDOWN_STATE_SESSION_KEY = "relate_exam_lockdown_state"
 
-        if not exams_only:
-            return None
 
-        if (exams_only and
-                "relate_session_locked_to_exam_flow_session_pk" in request.session):
-            # ExamLockdownMiddleware is in control.
-            return None
+def get_exam_lockdown_state(flow_session):
+    """Return what :class:`ExamLockdownMiddleware` needs to know about
+    *flow_session* in a form that can be stored in the Django session.
+    """
 
-        from django.core.urlresolvers import resolve
-        resolver_match = resolve(request.path)
+    return {
+            "flow_session_pk": flow_session.pk,
+            "flow_id": flow_session.flow_id,
+            "course_identifier": flow_session.course.identifier,
+            }
 
+
+class ExamFacilityMiddleware(object):
+    def __init__(self):
         from course.exam import check_in_for_exam, issue_exam_ticket
         from course.auth import (user_profile, sign_in_choice, sign_in_by_email,
                 sign_in_stage2_with_token, sign_in_by_user_pw, sign_out, impersonate,
@@ -575,8 +580,7 @@ class ExamFacilityMiddleware(object):
         from course.views import set_pretend_facilities
         from course.flow import view_start_flow, view_resume_flow, view_flow_page
 
-        ok = False
-        if resolver_match.func in [
+        self.allowed_views = frozenset([
                 sign_in_choice,
                 sign_in_by_email,
                 sign_in_stage2_with_token,
@@ -589,7 +593,26 @@ class ExamFacilityMiddleware(object):
                 view_resume_flow,
                 user_profile,
                 sign_out,
-                set_pretend_facilities]:
+                set_pretend_facilities])
+        self.issue_exam_ticket = issue_exam_ticket
+        self.view_flow_page = view_flow_page
+
+    def process_request(self, request):
+        exams_only = is_from_exams_only_facility(request)
+
+        if not exams_only:
+            return None
+
+        if (exams_only and
+                "relate_session_locked_to_exam_flow_session_pk" in request.session):
+            # ExamLockdownMiddleware is in control.
+            return None
+
+        from django.core.urlresolvers import resolve
+        resolver_match = resolve(request.path)
+
+        ok = False
+        if resolver_match.func in self.allowed_views:
             ok = True
 
         elif request.path.startswith("/saml2"):
@@ -600,12 +623,12 @@ class ExamFacilityMiddleware(object):
                     or
                     request.user.has_perm("course.can_issue_exam_tickets"))
                 and
-                resolver_match.func == issue_exam_ticket):
+                resolver_match.func == self.issue_exam_ticket):
             ok = True
 
         if not ok:
             if (request.user.is_authenticated()
-                    and resolver_match.func is view_flow_page):
+                    and resolver_match.func is self.view_flow_page):
                 messages.add_message(request, messages.INFO,
                         _("Access to flows in an exams-only facility "
                             "is only granted if the flow is locked down. "
@@ -619,70 +642,90 @@ class ExamFacilityMiddleware(object):
 
 
 class ExamLockdownMiddleware(object):
+    def __init__(self):
+        from course.views import (get_repo_file, get_current_repo_file)
+        from course.flow import (
+                view_start_flow, view_resume_flow, view_flow_page,
+                update_expiration_mode, update_page_bookmark_state,
+                finish_flow_session_view)
+        from course.auth import (user_profile, sign_in_choice, sign_in_by_email,
+                sign_in_stage2_with_token, sign_in_by_user_pw, sign_out)
+
+        self.allowed_views = frozenset([
+                get_repo_file,
+                get_current_repo_file,
+
+                check_in_for_exam,
+                list_available_exams,
+
+                sign_in_choice,
+                sign_in_by_email,
+                sign_in_stage2_with_token,
+                sign_in_by_user_pw,
+                user_profile,
+                sign_out])
+
+        # allowed only for the locked-down flow session
+        self.flow_session_views = frozenset([
+                view_resume_flow,
+                view_flow_page,
+                update_expiration_mode,
+                update_page_bookmark_state,
+                finish_flow_session_view])
+
+        self.view_start_flow = view_start_flow
+
+    def get_lockdown_state(self, request):
+        state = request.session.get(EXAM_LOCKDOWN_STATE_SESSION_KEY)
+        exam_flow_session_pk = request.session[
+                "relate_session_locked_to_exam_flow_session_pk"]
+
+        if state is not None and state["flow_session_pk"] == exam_flow_session_pk:
+            return state
+
+        # locked down before the lockdown state was stored in the session
+        try:
+            exam_flow_session = FlowSession.objects.get(pk=exam_flow_session_pk)
+        except ObjectDoesNotExist:
+            msg = _("Error while processing exam lockdown: "
+                    "flow session not found.")
+            messages.add_message(request, messages.ERROR, msg)
+            raise SuspiciousOperation(msg)
+
+        state = get_exam_lockdown_state(exam_flow_session)
+        request.session[EXAM_LOCKDOWN_STATE_SESSION_KEY] = state
+        return state
+
     def process_request(self, request):
         request.relate_exam_lockdown = False
 
         if "relate_session_locked_to_exam_flow_session_pk" in request.session:
-            exam_flow_session_pk = request.session[
-                    "relate_session_locked_to_exam_flow_session_pk"]
-
-            try:
-                exam_flow_session = FlowSession.objects.get(pk=exam_flow_session_pk)
-            except ObjectDoesNotExist:
-                msg = _("Error while processing exam lockdown: "
-                        "flow session not found.")
-                messages.add_message(request, messages.ERROR, msg)
-                raise SuspiciousOperation(msg)
+            state = self.get_lockdown_state(request)
 
             request.relate_exam_lockdown = True
 
             from django.core.urlresolvers import resolve
             resolver_match = resolve(request.path)
 
-            from course.views import (get_repo_file, get_current_repo_file)
-            from course.flow import (
-                    view_start_flow, view_resume_flow, view_flow_page,
-                    update_expiration_mode, update_page_bookmark_state,
-                    finish_flow_session_view)
-            from course.auth import (user_profile, sign_in_choice, sign_in_by_email,
-                    sign_in_stage2_with_token, sign_in_by_user_pw, sign_out)
-
             ok = False
-            if resolver_match.func in [
-                    get_repo_file,
-                    get_current_repo_file,
-
-                    check_in_for_exam,
-                    list_available_exams,
-
-                    sign_in_choice,
-                    sign_in_by_email,
-                    sign_in_stage2_with_token,
-                    sign_in_by_user_pw,
-                    user_profile,
-                    sign_out]:
+            if resolver_match.func in self.allowed_views:
                 ok = True
 
             elif request.path.startswith("/saml2"):
                 ok = True
 
             elif (
-                    resolver_match.func in [
-                        view_resume_flow,
-                        view_flow_page,
-                        update_expiration_mode,
-                        update_page_bookmark_state,
-                        finish_flow_session_view]
+                    resolver_match.func in self.flow_session_views
                     and
                     int(resolver_match.kwargs["flow_session_id"])
-                    == exam_flow_session_pk):
+                    == state["flow_session_pk"]):
                 ok = True
 
             elif (
-                    resolver_match.func == view_start_flow
+                    resolver_match.func == self.view_start_flow
                     and
                     resolver_match.kwargs["flow_id"]
-                    == exam_flow_session.flow_id):
+                    == state["flow_id"]):
                 ok = True
 
             if not ok:
@@ -692,8 +735,8 @@ class ExamLockdownMiddleware(object):
                         "RELATE is not currently allowed. "
                         "To abandon this exam, log out."))
                 return redirect("relate-view_start_flow",
-                        exam_flow_session.course.identifier,
-                        exam_flow_session.flow_id)
+                        state["course_identifier"],
+                        state["flow_id"])
 
 # }}}
 
@@ -257,8 +257,13 @@ def adjust_flow_session_page_data(repo, flow_session,
     """
     The caller may *not* be in a transaction that has a weaker isolation
     level than *serializable*.
+
+    Sessions with archived page visits are read-only and left alone.
     """
 
+    if flow_session.page_visits_archived:
+        return
+
     from course.content import get_course_commit_sha, get_flow_desc
     commit_sha = get_course_commit_sha(
             flow_session.course, flow_session.participation)
@@ -441,7 +446,30 @@ def get_prev_answer_visits_qset(page_data):
             .order_by("-visit_time"))
 
 
+def get_prev_answer_visits(page_data):
+    """Like :func:`get_prev_answer_visits_qset`, but returns a list and also
+    works for sessions whose page visits are archived.
+    """
+
+    flow_session = page_data.flow_session
+    if flow_session.page_visits_archived:
+        from course.archive import get_archived_graded_answer_visits
+        return [
+                visit
+                for visit in reversed(
+                    get_archived_graded_answer_visits(flow_session))
+                if visit.page_data_id == page_data.id]
+
+    return list(get_prev_answer_visits_qset(page_data))
+
+
 def get_prev_answer_visit(page_data):
+    if page_data.flow_session.page_visits_archived:
+        for prev_visit in get_prev_answer_visits(page_data):
+            return prev_visit
+
+        return None
+
     previous_answer_visits = get_prev_answer_visits_qset(page_data)
 
     for prev_visit in previous_answer_visits[:1]:
@@ -479,6 +507,22 @@ def assemble_page_grades(flow_sessions):
         if not flow_sessions[fsess_idx].in_progress:
             assert answer_visit["is_submitted_answer"] is True
 
+    grades_by_answer_visit = {}
+
+    # Archived page visits keep their IDs, so they can be looked up
+    # in the same way.
+    for fsess_idx, fsess in enumerate(flow_sessions):
+        if not fsess.page_visits_archived:
+            continue
+
+        from course.archive import get_archived_graded_answer_visits
+        for answer_visit in get_archived_graded_answer_visits(fsess):
+            ordinal = answer_visit.page_data.ordinal
+            if ordinal is not None:
+                answer_visit_ids[fsess_idx][ordinal] = answer_visit.id
+                grades_by_answer_visit[answer_visit.id] = \
+                        answer_visit.get_most_recent_grade()
+
     flat_answer_visit_ids = []
     for visit_id_list in answer_visit_ids:
         for visit_id in visit_id_list:
@@ -491,7 +535,6 @@ def assemble_page_grades(flow_sessions):
               .order_by("visit__id")
               .order_by("grade_time"))
 
-    grades_by_answer_visit = {}
     for grade in grades:
         grades_by_answer_visit[grade.visit_id] = grade
 
@@ -505,9 +548,14 @@ def assemble_page_grades(flow_sessions):
 def assemble_answer_visits(flow_session):
     answer_visits = [None] * flow_session.page_count
 
-    answer_page_visits = (
-            get_flow_session_graded_answers_qset(flow_session)
-            .order_by("visit_time"))
+    if flow_session.page_visits_archived:
+        from course.archive import get_archived_graded_answer_visits
+        answer_page_visits = get_archived_graded_answer_visits(flow_session)
+    else:
+        answer_page_visits = (
+                get_flow_session_graded_answers_qset(flow_session)
+                .select_related("page_data")
+                .order_by("visit_time"))
 
     for page_visit in answer_page_visits:
         if page_visit.page_data.ordinal is not None:
@@ -527,24 +575,225 @@ def get_all_page_data(flow_session):
             .order_by("ordinal"))
 
 
-def get_interaction_kind(fctx, flow_session, flow_generates_grade, all_page_data):
-    if not flow_session.in_progress:
-        return flow_session_interaction_kind.noninteractive
+# {{{ page summary
 
-    ikind = flow_session_interaction_kind.noninteractive
+# A flow session's page summary is a JSON-compatible dictionary stored in
+# FlowSession.page_summary with these keys:
+#
+# - ``revision_key``: the FlowSession.page_data_at_revision_key for which
+#   the summary was computed
+# - ``pages``: a list with one ``[title, bookmarked, answer_kind]`` entry per
+#   page ordinal, where ``answer_kind`` is one of the PAGE_ANSWER_KIND_*
+#   values below
+# - ``answered``: a bitmap (as a hexadecimal string) of the ordinals of
+#   pages for which an answer was saved
+# - ``last_answer_time``: the time of the most recent non-synthetic answer
+#   visit as an ISO 8601 string, or *None*
 
-    for i, page_data in enumerate(all_page_data):
+PAGE_ANSWER_KIND_NONE = None
+PAGE_ANSWER_KIND_UNGRADED = "ungraded"
+PAGE_ANSWER_KIND_GRADABLE = "gradable"
+
+
+class PageSummaryEntry(object):
+    """Stands in for a :class:`course.models.FlowPageData` in the flow
+    navigation.
+    """
+
+    def __init__(self, ordinal, title, bookmarked, answer_kind, answered):
+        self.ordinal = ordinal
+        self.title = title
+        self.bookmarked = bookmarked
+        self.answer_kind = answer_kind
+        self.answered = answered
+
+    def human_readable_ordinal(self):
+        return self.ordinal + 1
+
+
+def _format_summary_time(dt):
+    if dt is None:
+        return None
+    return dt.isoformat()
+
+
+def _make_page_summary(fctx, flow_session):
+    pages = []
+    for i, page_data in enumerate(get_all_page_data(flow_session)):
         assert i == page_data.ordinal
 
         page = instantiate_flow_page_with_ctx(fctx, page_data)
-        if page.expects_answer():
-            if page.is_answer_gradable():
-                if flow_generates_grade:
-                    return flow_session_interaction_kind.permanent_grade
-                else:
-                    return flow_session_interaction_kind.practice_grade
+        if not page.expects_answer():
+            answer_kind = PAGE_ANSWER_KIND_NONE
+        elif page.is_answer_gradable():
+            answer_kind = PAGE_ANSWER_KIND_GRADABLE
+        else:
+            answer_kind = PAGE_ANSWER_KIND_UNGRADED
+
+        pages.append([page_data.title, page_data.bookmarked, answer_kind])
+
+    if flow_session.page_visits_archived:
+        from course.archive import get_archived_page_visits
+        answer_visits = [
+                visit
+                for visit in get_archived_page_visits(flow_session)
+                if visit.answer is not None]
+
+        answered_ordinals = set(
+                visit.page_data.ordinal for visit in answer_visits
+                if visit.page_data.ordinal is not None)
+        answer_times = [
+                visit.visit_time for visit in answer_visits
+                if not visit.is_synthetic]
+        last_answer_time = max(answer_times) if answer_times else None
+
+    else:
+        answered_ordinals = (FlowPageVisit.objects
+                .filter(
+                    flow_session=flow_session,
+                    answer__isnull=False,
+                    page_data__ordinal__isnull=False)
+                .values_list("page_data__ordinal", flat=True)
+                .distinct())
+
+        last_answer_time = None
+        for visit_time in (FlowPageVisit.objects
+                .filter(
+                    flow_session=flow_session,
+                    answer__isnull=False,
+                    is_synthetic=False)
+                .order_by("-visit_time")
+                .values_list("visit_time", flat=True)
+                [:1]):
+            last_answer_time = visit_time
+
+    answered = 0
+    for ordinal in answered_ordinals:
+        answered |= 1 << ordinal
+
+    return {
+            "revision_key": flow_session.page_data_at_revision_key,
+            "pages": pages,
+            "answered": "%x" % answered,
+            "last_answer_time": _format_summary_time(last_answer_time),
+            }
+
+
+def get_flow_session_page_summary(fctx, flow_session):
+    """Return the page summary of *flow_session*, recomputing and storing it
+    if it is missing or was made for a different revision of the page data.
+    """
+
+    def is_current(summary):
+        return (summary is not None
+                and summary.get("revision_key")
+                == flow_session.page_data_at_revision_key)
+
+    summary = flow_session.page_summary
+    if is_current(summary):
+        return summary
+
+    # Recompute while holding the same lock as _update_page_summary, so that
+    # answers noted in the meantime are either seen by the recomputation or
+    # applied to its result.
+    with transaction.atomic():
+        summary = None
+        for locked_session in (FlowSession.objects
+                .select_for_update()
+                .filter(id=flow_session.id)
+                .only("page_summary")):
+            summary = locked_session.page_summary
+
+        if not is_current(summary):
+            summary = _make_page_summary(fctx, flow_session)
+            FlowSession.objects.filter(id=flow_session.id).update(
+                    page_summary=summary)
+
+    flow_session.page_summary = summary
+    return summary
+
+
+def get_page_summary_entries(summary):
+    answered = int(summary["answered"], 16)
+    return [
+            PageSummaryEntry(ordinal, title, bookmarked, answer_kind,
+                bool(answered & (1 << ordinal)))
+            for ordinal, (title, bookmarked, answer_kind)
+            in enumerate(summary["pages"])]
+
+
+def get_page_summary_last_answer_time(summary):
+    last_answer_time = summary.get("last_answer_time")
+    if last_answer_time is None:
+        return None
+
+    from django.utils.dateparse import parse_datetime
+    return parse_datetime(last_answer_time)
+
+
+def _update_page_summary(flow_session, update):
+    """Apply *update* to the stored page summary of *flow_session*, if there
+    is one. The summary is locked while doing so, so that concurrent updates
+    to the same session do not overwrite each other.
+    """
+
+    with transaction.atomic():
+        summary = None
+        for locked_session in (FlowSession.objects
+                .select_for_update()
+                .filter(id=flow_session.id)
+                .only("page_summary")):
+            summary = locked_session.page_summary
+
+        if summary is None:
+            flow_session.page_summary = None
+            return
+
+        update(summary)
+
+        FlowSession.objects.filter(id=flow_session.id).update(
+                page_summary=summary)
+
+    flow_session.page_summary = summary
+
+
+def note_page_summary_answer(flow_session, ordinal, visit_time):
+    def update(summary):
+        summary["answered"] = "%x" % (
+                int(summary["answered"], 16) | (1 << ordinal))
+
+        last_answer_time = get_page_summary_last_answer_time(summary)
+        if last_answer_time is None or visit_time > last_answer_time:
+            summary["last_answer_time"] = _format_summary_time(visit_time)
+
+    _update_page_summary(flow_session, update)
+
+
+def note_page_summary_bookmark(flow_session, ordinal, bookmarked):
+    def update(summary):
+        if ordinal < len(summary["pages"]):
+            summary["pages"][ordinal][1] = bookmarked
+
+    _update_page_summary(flow_session, update)
+
+# }}}
+
+
+def get_interaction_kind(flow_session, flow_generates_grade,
+        page_summary_entries):
+    if not flow_session.in_progress:
+        return flow_session_interaction_kind.noninteractive
+
+    ikind = flow_session_interaction_kind.noninteractive
+
+    for entry in page_summary_entries:
+        if entry.answer_kind == PAGE_ANSWER_KIND_GRADABLE:
+            if flow_generates_grade:
+                return flow_session_interaction_kind.permanent_grade
             else:
-                ikind = flow_session_interaction_kind.ungraded
+                return flow_session_interaction_kind.practice_grade
+        elif entry.answer_kind == PAGE_ANSWER_KIND_UNGRADED:
+            ikind = flow_session_interaction_kind.ungraded
 
     return ikind
 
@@ -989,6 +1238,9 @@ def reopen_session(session, force=False, suppress_log=False):
     if session.participation is None:
         raise RuntimeError(
                 _("Cannot reopen anonymous sessions"))
+    if session.page_visits_archived:
+        raise RuntimeError(
+                _("Cannot reopen a session whose page visits are archived"))
 
     session.in_progress = True
     session.points = None
@@ -1109,9 +1361,19 @@ def recalculate_session_grade(repo, course, session):
 
 def lock_down_if_needed(request, permissions, flow_session):
     if flow_permission.lock_down_as_exam_session in permissions:
+        if (request.session.get("relate_session_locked_to_exam_flow_session_pk")
+                == flow_session.pk):
+            # Already locked down. Avoid modifying (and thereby saving) the
+            # session on every request.
+            return
+
+        from course.exam import (
+                EXAM_LOCKDOWN_STATE_SESSION_KEY, get_exam_lockdown_state)
         request.session[
                 "relate_session_locked_to_exam_flow_session_pk"] = \
                         flow_session.pk
+        request.session[EXAM_LOCKDOWN_STATE_SESSION_KEY] = \
+                get_exam_lockdown_state(flow_session)
 
 
 # {{{ view: start flow
@@ -1123,7 +1385,7 @@ def view_start_flow(pctx, flow_id):
     login_exam_ticket = get_login_exam_ticket(pctx.request)
     now_datetime = get_now_or_fake_time(request)
     fctx = FlowContext(pctx.repo, pctx.course, flow_id,
-            participation=pctx.participation)
+            participation=pctx.participation, request=pctx.request)
 
     if request.method == "POST":
         return post_start_flow(pctx, fctx, flow_id)
@@ -1280,7 +1542,7 @@ def view_resume_flow(pctx, flow_session_id):
     flow_session = get_and_check_flow_session(pctx, int(flow_session_id))
 
     fctx = FlowContext(pctx.repo, pctx.course, flow_session.flow_id,
-            participation=pctx.participation)
+            participation=pctx.participation, request=pctx.request)
 
     login_exam_ticket = get_login_exam_ticket(pctx.request)
 
@@ -1423,6 +1685,10 @@ def add_buttons_to_form(form, fpctx, flow_session, permissions):
 
 
 def create_flow_page_visit(request, flow_session, page_data):
+    if flow_session.page_visits_archived:
+        # read-only, see course.archive
+        return
+
     if request.user.is_authenticated():
         # The access to 'is_authenticated' ought to wake up SimpleLazyObject.
         user = request.user
@@ -1439,7 +1705,8 @@ def create_flow_page_visit(request, flow_session, page_data):
     if hasattr(request, "relate_impersonate_original_user"):
         visit.impersonated_by = request.relate_impersonate_original_user
 
-    visit.save()
+    from course.page_visits import log_page_visit
+    log_page_visit(visit)
 
 
 @course_view
@@ -1533,8 +1800,7 @@ def view_flow_page(pctx, flow_session_id, ordinal):
     else:
         create_flow_page_visit(request, flow_session, fpctx.page_data)
 
-        prev_answer_visits = list(
-                get_prev_answer_visits_qset(fpctx.page_data))
+        prev_answer_visits = get_prev_answer_visits(fpctx.page_data)
 
         # {{{ fish out previous answer_visit
 
@@ -1647,7 +1913,7 @@ def view_flow_page(pctx, flow_session_id, ordinal):
         shown_feedback = feedback
 
     title = fpctx.page.title(page_context, page_data.data)
-    body = fpctx.page.body(page_context, page_data.data)
+    body = fpctx.get_page_body()
 
     if page_behavior.show_answer:
         correct_answer = fpctx.page.correct_answer(
@@ -1687,21 +1953,8 @@ def view_flow_page(pctx, flow_session_id, ordinal):
         if flow_session.participation is not None:
             time_factor = flow_session.participation.time_factor
 
-    all_page_data = get_all_page_data(flow_session)
-
-    from django.db import connection
-    with connection.cursor() as c:
-        c.execute(
-                "SELECT DISTINCT course_flowpagedata.ordinal "
-                "FROM course_flowpagevisit "
-                "INNER JOIN course_flowpagedata "
-                "ON course_flowpagedata.id = course_flowpagevisit.page_data_id "
-                "WHERE course_flowpagedata.flow_session_id = %s "
-                "AND course_flowpagevisit.answer IS NOT NULL "
-                "ORDER BY course_flowpagedata.ordinal",
-                [flow_session.id])
-
-        flow_page_ordinals_with_answers = set(row[0] for row in c.fetchall())
+    page_summary_entries = get_page_summary_entries(
+            get_flow_session_page_summary(fpctx, flow_session))
 
     args = {
         "flow_identifier": fpctx.flow_id,
@@ -1710,8 +1963,7 @@ def view_flow_page(pctx, flow_session_id, ordinal):
         "page_data": fpctx.page_data,
         "percentage": int(100*(fpctx.ordinal+1) / flow_session.page_count),
         "flow_session": flow_session,
-        "all_page_data": all_page_data,
-        "flow_page_ordinals_with_answers": flow_page_ordinals_with_answers,
+        "page_summary_entries": page_summary_entries,
 
         "title": title, "body": body,
         "form": form,
@@ -1738,7 +1990,7 @@ def view_flow_page(pctx, flow_session_id, ordinal):
 
         "flow_session_interaction_kind": flow_session_interaction_kind,
         "interaction_kind": get_interaction_kind(
-            fpctx, flow_session, generates_grade, all_page_data),
+            flow_session, generates_grade, page_summary_entries),
 
         "prev_answer_visits": prev_answer_visits,
         "prev_visit_id": prev_visit_id,
@@ -1768,8 +2020,7 @@ def post_flow_page(flow_session, fpctx, request, permissions, generates_grade):
     page_context = fpctx.page_context
     page_data = fpctx.page_data
 
-    prev_answer_visits = list(
-            get_prev_answer_visits_qset(fpctx.page_data))
+    prev_answer_visits = get_prev_answer_visits(fpctx.page_data)
 
     submission_allowed = True
 
@@ -1820,6 +2071,9 @@ def post_flow_page(flow_session, fpctx, request, permissions, generates_grade):
         answer_visit.is_submitted_answer = pressed_button == "submit"
         answer_visit.save()
 
+        note_page_summary_answer(
+                flow_session, fpctx.ordinal, answer_visit.visit_time)
+
         prev_answer_visits.insert(0, answer_visit)
 
         answer_was_graded = answer_visit.is_submitted_answer
@@ -1932,6 +2186,8 @@ def update_page_bookmark_state(pctx, flow_session_id, ordinal):
     fpd.bookmarked = bookmark_state
     fpd.save()
 
+    note_page_summary_bookmark(flow_session, fpd.ordinal, bookmark_state)
+
     return http.HttpResponse("OK")
 
 # }}}
@@ -1961,7 +2217,7 @@ def update_expiration_mode(pctx, flow_session_id):
         raise SuspiciousOperation(_("invalid expiration mode"))
 
     fctx = FlowContext(pctx.repo, pctx.course, flow_session.flow_id,
-            participation=pctx.participation)
+            participation=pctx.participation, request=pctx.request)
 
     access_rule = get_session_access_rule(
             flow_session, pctx.role, fctx.flow_desc,
@@ -1998,7 +2254,7 @@ def finish_flow_session_view(pctx, flow_session_id):
     flow_id = flow_session.flow_id
 
     fctx = FlowContext(pctx.repo, pctx.course, flow_id,
-            participation=pctx.participation)
+            participation=pctx.participation, request=pctx.request)
 
     access_rule = get_session_access_rule(
             flow_session, pctx.role, fctx.flow_desc, now_datetime,
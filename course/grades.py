@@ -25,6 +25,9 @@ THE SOFTWARE.
 """
 
 import re
+import json
+from decimal import Decimal
+
 import six
 
 from django.utils.translation import (
@@ -38,6 +41,7 @@ from django.db import connection
 from django import forms
 from django.db import transaction
 from django.utils.timezone import now
+from django.utils.dateparse import parse_datetime
 from django import http
 
 from django.core.urlresolvers import reverse
@@ -335,13 +339,6 @@ def export_gradebook_csv(pctx):
 
 # {{{ grades by grading opportunity
 
-class OpportunitySessionGradeInfo(object):
-    def __init__(self, grade_state_machine, flow_session, grades=None):
-        self.grade_state_machine = grade_state_machine
-        self.flow_session = flow_session
-        self.grades = grades
-
-
 class ModifySessionsForm(StyledForm):
     def __init__(self, session_rule_tags, *args, **kwargs):
         super(ModifySessionsForm, self).__init__(*args, **kwargs)
@@ -394,10 +391,8 @@ def view_grades_by_opportunity(pctx, opp_id):
     if pctx.course != opportunity.course:
         raise SuspiciousOperation(_("opportunity from wrong course"))
 
-    # {{{ batch sessions form
-
-    batch_session_ops_form = None
-    if pctx.role == participation_role.instructor and opportunity.flow_id:
+    session_rule_tags = []
+    if opportunity.flow_id:
         cursor = connection.cursor()
         cursor.execute("select distinct access_rules_tag from course_flowsession "
                 "where course_id = %s and flow_id = %s "
@@ -405,6 +400,10 @@ def view_grades_by_opportunity(pctx, opp_id):
         session_rule_tags = [
                 mangle_session_access_rule_tag(row[0]) for row in cursor.fetchall()]
 
+    # {{{ batch sessions form
+
+    batch_session_ops_form = None
+    if pctx.role == participation_role.instructor and opportunity.flow_id:
         request = pctx.request
         if request.method == "POST":
             batch_session_ops_form = ModifySessionsForm(
@@ -471,127 +470,302 @@ def view_grades_by_opportunity(pctx, opp_id):
 
     # }}}
 
-    # NOTE: It's important that these queries are sorted consistently,
-    # also consistently with the code below.
+    # The rows of the grade table are fetched by the page from
+    # view_grades_by_opportunity_rows.
 
-    participations = list(Participation.objects
+    view_page_grades = pctx.request.GET.get("view_page_grades") == "1"
+
+    total_sessions = finished_sessions = 0
+    page_numbers = []
+    if opportunity.flow_id:
+        from django.db.models import Count, Max, Case, When, IntegerField
+        session_stats = (
+                get_opportunity_flow_sessions(pctx.course, opportunity)
+                .aggregate(
+                    total_sessions=Count("id"),
+                    finished_sessions=Count(Case(
+                        When(in_progress=False, then=1),
+                        output_field=IntegerField())),
+                    max_page_count=Max("page_count")))
+
+        total_sessions = session_stats["total_sessions"]
+        finished_sessions = session_stats["finished_sessions"]
+        if view_page_grades:
+            page_numbers = list(range(
+                1, 1 + (session_stats["max_page_count"] or 0)))
+
+    return render_course_page(pctx, "course/gradebook-by-opp.html", {
+        "opportunity": opportunity,
+        "grade_state_change_types": grade_state_change_types,
+        "batch_session_ops_form": batch_session_ops_form,
+        "session_rule_tags": session_rule_tags,
+        "rule_tag_none_string": RULE_TAG_NONE_STRING,
+        "page_numbers": page_numbers,
+        "view_page_grades": view_page_grades,
+        "page_size": GRADE_ROWS_PAGE_SIZE,
+
+        "total_sessions": total_sessions,
+        "finished_sessions": finished_sessions,
+        })
+
+# }}}
+
+
+# {{{ grades by opportunity: rows
+
+GRADE_ROWS_PAGE_SIZE = 100
+GRADE_ROWS_MAX_PAGE_SIZE = 500
+
+
+def _parse_cursor_datetime(s):
+    result = parse_datetime(s)
+    if result is None:
+        raise ValueError("datetime expected")
+    return result
+
+
+def _parse_cursor_bool(value):
+    if not isinstance(value, bool):
+        raise ValueError("bool expected")
+    return value
+
+
+# Maps the sort orders of view_grades_by_opportunity_rows to the session
+# field they sort by and to a function reading that field's value from a
+# cursor.
+GRADE_ROW_SORT_KEYS = {
+        "username": ("participation__user__username", six.text_type),
+        "start_time": ("start_time", _parse_cursor_datetime),
+        "points": ("sort_points", Decimal),
+        "in_progress": ("in_progress", _parse_cursor_bool),
+        }
+
+
+def get_opportunity_flow_sessions(course, opportunity):
+    """Return the sessions shown in the grade table of *opportunity*, i.e.
+    those of active participants in *course*.
+    """
+
+    return (FlowSession.objects
             .filter(
-                course=pctx.course,
-                status=participation_status.active)
-            .order_by("id")
-            .select_related("user"))
+                course=course,
+                flow_id=opportunity.flow_id,
+                participation__course=course,
+                participation__status=participation_status.active))
 
-    grade_changes = list(GradeChange.objects
-            .filter(opportunity=opportunity)
-            .order_by(
-                "participation__id",
-                "grade_time")
-            .select_related("participation")
-            .select_related("participation__user")
-            .select_related("opportunity"))
 
-    if opportunity.flow_id:
-        flow_sessions = list(FlowSession.objects
-                .filter(
-                    flow_id=opportunity.flow_id,
-                    )
-                .order_by(
-                    "participation__id",
-                    "start_time"
-                    ))
+def _format_cursor_value(value):
+    import datetime
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    elif isinstance(value, Decimal):
+        return str(value)
     else:
-        flow_sessions = None
+        return value
 
-    view_page_grades = pctx.request.GET.get("view_page_grades") == "1"
 
-    gchng_idx = 0
-    fsess_idx = 0
+@course_view
+def view_grades_by_opportunity_rows(pctx, opp_id):
+    """Return a page of rows of the grade table of an opportunity as JSON.
+    Rows are sessions, ordered by one of :data:`GRADE_ROW_SORT_KEYS` given
+    as ``sort`` (prefixed with ``-`` for descending order) and then by
+    session ID. The ``next`` of the response is passed back as ``after`` to
+    get the following page, and is *None* on the last page.
+
+    Sessions may be filtered by access rules ``tag`` and by ``state``
+    (``in_progress`` or ``finished``). With ``page_grades=1``, rows include
+    the grades of the session's pages.
+    """
 
-    finished_sessions = 0
-    total_sessions = 0
+    if pctx.role not in [
+            participation_role.instructor,
+            participation_role.teaching_assistant]:
+        raise PermissionDenied(_("must be instructor or TA to view grades"))
 
-    grade_table = []
-    for idx, participation in enumerate(participations):
-        # Advance in grade change list
-        while (
-                gchng_idx < len(grade_changes)
-                and grade_changes[gchng_idx].participation.pk < participation.pk):
-            gchng_idx += 1
+    opportunity = get_object_or_404(GradingOpportunity, id=int(opp_id))
 
-        my_grade_changes = []
-        while (
-                gchng_idx < len(grade_changes)
-                and grade_changes[gchng_idx].participation.pk == participation.pk):
-            my_grade_changes.append(grade_changes[gchng_idx])
-            gchng_idx += 1
-
-        # Advance in flow session list
-        if flow_sessions is None:
-            my_flow_sessions = []
-        else:
-            while (
-                    fsess_idx < len(flow_sessions) and (
-                    flow_sessions[fsess_idx].participation is None or
-                    flow_sessions[fsess_idx].participation.pk < participation.pk)):
-                fsess_idx += 1
+    if pctx.course != opportunity.course:
+        raise SuspiciousOperation(_("opportunity from wrong course"))
 
-            my_flow_sessions = []
-            while (
-                    fsess_idx < len(flow_sessions) and
-                    flow_sessions[fsess_idx].participation is not None and
-                    flow_sessions[fsess_idx].participation.pk == participation.pk):
-                my_flow_sessions.append(flow_sessions[fsess_idx])
-                fsess_idx += 1
+    request = pctx.request
 
-        state_machine = GradeStateMachine()
-        state_machine.consume(my_grade_changes)
+    # {{{ parse arguments
 
-        for fsession in my_flow_sessions:
-            total_sessions += 1
+    sort = request.GET.get("sort", "username")
+    descending = sort.startswith("-")
+    if descending:
+        sort = sort[1:]
+    if sort not in GRADE_ROW_SORT_KEYS:
+        return http.HttpResponseBadRequest("invalid 'sort'")
+    sort_field, parse_sort_value = GRADE_ROW_SORT_KEYS[sort]
 
-            if fsession is None:
-                continue
+    try:
+        page_size = min(
+                int(request.GET.get("page_size", GRADE_ROWS_PAGE_SIZE)),
+                GRADE_ROWS_MAX_PAGE_SIZE)
+    except ValueError:
+        return http.HttpResponseBadRequest("invalid 'page_size'")
+    if page_size < 1:
+        return http.HttpResponseBadRequest("invalid 'page_size'")
+
+    after = None
+    if "after" in request.GET:
+        try:
+            after_value, after_id = json.loads(request.GET["after"])
+            after = (parse_sort_value(after_value), int(after_id))
+        except (ValueError, TypeError, ArithmeticError):
+            return http.HttpResponseBadRequest("invalid 'after'")
+
+    state = request.GET.get("state") or None
+    if state not in [None, "in_progress", "finished"]:
+        return http.HttpResponseBadRequest("invalid 'state'")
+
+    view_page_grades = request.GET.get("page_grades") == "1"
+
+    # }}}
+
+    if not opportunity.flow_id:
+        sessions = []
+        has_more = False
+
+    else:
+        from django.db.models import Q, Value, DecimalField
+        from django.db.models.functions import Coalesce
+
+        # ungraded sessions sort below all graded ones
+        qset = (get_opportunity_flow_sessions(pctx.course, opportunity)
+                .annotate(sort_points=Coalesce(
+                    "points", Value(-1),
+                    output_field=DecimalField(
+                        max_digits=10, decimal_places=2)))
+                .select_related("participation__user"))
+
+        if request.GET.get("tag"):
+            tag = request.GET["tag"]
+            if tag == RULE_TAG_NONE_STRING:
+                qset = qset.filter(access_rules_tag__isnull=True)
+            else:
+                qset = qset.filter(access_rules_tag=tag)
+
+        if state == "in_progress":
+            qset = qset.filter(in_progress=True)
+        elif state == "finished":
+            qset = qset.filter(in_progress=False)
+
+        op = "lt" if descending else "gt"
+        if after is not None:
+            after_value, after_id = after
+            qset = qset.filter(
+                    Q(**{sort_field + "__" + op: after_value})
+                    | Q(**{sort_field: after_value, "id__" + op: after_id}))
 
-            if not fsession.in_progress:
-                finished_sessions += 1
+        prefix = "-" if descending else ""
+        sessions = list(
+                qset.order_by(prefix + sort_field, prefix + "id")
+                [:page_size + 1])
 
-            grade_table.append(
-                    (participation, OpportunitySessionGradeInfo(
-                        grade_state_machine=state_machine,
-                        flow_session=fsession)))
+        has_more = len(sessions) > page_size
+        sessions = sessions[:page_size]
 
-    if view_page_grades and len(grade_table) > 0:
-        # Query grades for flow pages
-        all_flow_sessions = [info.flow_session for _dummy, info in grade_table]
-        max_page_count = max(fsess.page_count for fsess in all_flow_sessions)
-        page_numbers = list(range(1, 1 + max_page_count))
+    # {{{ grade state of each participant
 
+    grade_changes_by_participation_id = {}
+    if sessions:
+        for gchange in (GradeChange.objects
+                .filter(
+                    opportunity=opportunity,
+                    participation__in=set(
+                        session.participation_id for session in sessions))
+                .order_by("participation__id", "grade_time")
+                .select_related("opportunity")):
+            grade_changes_by_participation_id.setdefault(
+                    gchange.participation_id, []).append(gchange)
+
+    state_machines = {}
+    for participation_id, gchanges in six.iteritems(
+            grade_changes_by_participation_id):
+        state_machine = GradeStateMachine()
+        state_machine.consume(gchanges)
+        state_machines[participation_id] = state_machine
+
+    # }}}
+
+    if view_page_grades and sessions:
         from course.flow import assemble_page_grades
-        page_grades = assemble_page_grades(all_flow_sessions)
-
-        for (_dummy, grade_info), grade_list in zip(grade_table, page_grades):
-            # Not all pages exist in all sessions
-            grades = list(enumerate(grade_list))
-            if len(grades) < max_page_count:
-                grades.extend([(None, None)] * (max_page_count - len(grades)))
-            grade_info.grades = grades
+        page_grades = [
+                list(grades) for grades in assemble_page_grades(sessions)]
     else:
-        page_numbers = []
+        page_grades = [None] * len(sessions)
 
-    # No need to sort here, datatables resorts anyhow.
+    from relate.utils import as_local_time, format_datetime_local
 
-    return render_course_page(pctx, "course/gradebook-by-opp.html", {
-        "opportunity": opportunity,
-        "participations": participations,
-        "grade_state_change_types": grade_state_change_types,
-        "grade_table": grade_table,
-        "batch_session_ops_form": batch_session_ops_form,
-        "page_numbers": page_numbers,
-        "view_page_grades": view_page_grades,
+    rows = []
+    for session, session_page_grades in zip(sessions, page_grades):
+        participation = session.participation
+        state_machine = state_machines.get(participation.id)
+        if state_machine is None:
+            state_machine = GradeStateMachine()
 
-        "total_sessions": total_sessions,
-        "finished_sessions": finished_sessions,
-        })
+        row = {
+                "participation_id": participation.id,
+                "username": participation.user.username,
+                "full_name": participation.user.get_full_name(),
+                "role": participation.role,
+                "single_grade_url": reverse("relate-view_single_grade",
+                    args=(pctx.course.identifier, participation.id,
+                        opportunity.id)),
+
+                "flow_session_id": session.id,
+                "in_progress": session.in_progress,
+                "completion_time": (
+                    format_datetime_local(as_local_time(session.completion_time))
+                    if session.completion_time is not None
+                    else None),
+                "access_rules_tag": session.access_rules_tag,
+                "points": (
+                    float(session.points) if session.points is not None
+                    else None),
+                "max_points": (
+                    float(session.max_points)
+                    if session.max_points is not None
+                    else None),
+
+                "grade": state_machine.stringify_state(),
+                }
+
+        grade_percentage = state_machine.percentage()
+        row["grade_percentage"] = (
+                float(grade_percentage) if grade_percentage is not None
+                else None)
+
+        if session_page_grades is not None:
+            row["page_grades"] = [
+                    {
+                        "url": reverse("relate-grade_flow_page",
+                            args=(pctx.course.identifier, session.id,
+                                ordinal)),
+                        "percentage": (
+                            grade.percentage() if grade is not None
+                            else None),
+                        }
+                    for ordinal, grade in enumerate(session_page_grades)]
+
+        rows.append(row)
+
+    if has_more:
+        last_session = sessions[-1]
+        last_value = last_session
+        for attr in sort_field.split("__"):
+            last_value = getattr(last_value, attr)
+
+        next_cursor = json.dumps(
+                [_format_cursor_value(last_value), last_session.id])
+    else:
+        next_cursor = None
+
+    return http.HttpResponse(
+            json.dumps({"rows": rows, "next": next_cursor}),
+            content_type="application/json")
 
 # }}}
 
@@ -637,6 +811,10 @@ def view_reopen_session(pctx, flow_session_id, opportunity_id):
 
     session = get_object_or_404(FlowSession, id=int(flow_session_id))
 
+    if session.page_visits_archived:
+        raise PermissionDenied(
+                _("may not reopen a session whose page visits are archived"))
+
     from course.content import get_flow_desc
     try:
         flow_desc = get_flow_desc(pctx.repo, pctx.course, session.flow_id,
@@ -790,6 +968,11 @@ def view_single_grade(pctx, participation_id, opportunity_id):
             session = FlowSession.objects.get(id=int(action_match.group(2)))
             op = action_match.group(1)
 
+            if session.page_visits_archived:
+                raise PermissionDenied(
+                        _("may not change a session whose page visits "
+                            "are archived"))
+
             adjust_flow_session_page_data(
                     pctx.repo, session, pctx.course.identifier)
 
@@ -1360,29 +1543,41 @@ def download_all_submissions(pctx, flow_id):
             from course.utils import PageInstanceCache
             page_cache = PageInstanceCache(pctx.repo, pctx.course, flow_id)
 
-            visits = (FlowPageVisit.objects
+            session_filter = {"course": pctx.course, "flow_id": flow_id}
+
+            if form.cleaned_data["non_in_progress_only"]:
+                session_filter["in_progress"] = False
+
+            if form.cleaned_data["restrict_to_rules_tag"] != ALL_SESSION_TAG:
+                session_filter["access_rules_tag"] = (
+                        form.cleaned_data["restrict_to_rules_tag"])
+
+            visits = list(FlowPageVisit.objects
                     .filter(
-                        flow_session__course=pctx.course,
-                        flow_session__flow_id=flow_id,
                         page_data__group_id=group_id,
                         page_data__page_id=page_id,
                         is_submitted_answer=True,
-                        )
+                        **dict(
+                            ("flow_session__" + key, value)
+                            for key, value in six.iteritems(session_filter)))
                     .select_related("flow_session")
                     .select_related("flow_session__participation__user")
-                    .select_related("page_data")
-
-                    # We overwrite earlier submissions with later ones
-                    # in a dictionary below.
-                    .order_by("visit_time"))
-
-            if form.cleaned_data["non_in_progress_only"]:
-                visits = visits.filter(flow_session__in_progress=False)
-
-            if form.cleaned_data["restrict_to_rules_tag"] != ALL_SESSION_TAG:
-                visits = visits.filter(
-                        flow_session__access_rules_tag=(
-                            form.cleaned_data["restrict_to_rules_tag"]))
+                    .select_related("page_data"))
+
+            from course.archive import get_archived_page_visits
+            for flow_session in (FlowSession.objects
+                    .filter(page_visits_archived=True, **session_filter)
+                    .select_related("participation__user")):
+                visits.extend(
+                        visit
+                        for visit in get_archived_page_visits(flow_session)
+                        if visit.is_submitted_answer
+                        and visit.page_data.group_id == group_id
+                        and visit.page_data.page_id == page_id)
+
+            # We overwrite earlier submissions with later ones
+            # in a dictionary below.
+            visits.sort(key=lambda visit: visit.visit_time)
 
             submissions = {}
 
@@ -155,7 +155,8 @@ def grade_flow_page(pctx, flow_session_id, page_ordinal):
     if (fpctx.page.expects_answer()
             and fpctx.page.is_answer_gradable()
             and fpctx.prev_answer_visit is not None
-            and not flow_session.in_progress):
+            and not flow_session.in_progress
+            and not flow_session.page_visits_archived):
         request = pctx.request
         if pctx.request.method == "POST":
             grading_form = fpctx.page.post_grading_form(
@@ -251,8 +252,7 @@ def grade_flow_page(pctx, flow_session_id, page_ordinal):
                 "ordinal": fpctx.ordinal,
                 "page_data": fpctx.page_data,
 
-                "body": fpctx.page.body(
-                    fpctx.page_context, fpctx.page_data.data),
+                "body": fpctx.get_page_body(),
                 "form": form,
                 "form_html": form_html,
                 "feedback": feedback,
@@ -352,6 +352,32 @@ def show_grader_statistics(pctx, flow_id):
     if last_grade is not None:
         commit_grade_info(last_grade)
 
+    # {{{ archived sessions
+
+    from course.archive import get_archived_page_visits
+
+    archived_grades = []
+    for flow_session in FlowSession.objects.filter(
+            course=pctx.course,
+            flow_id=flow_id,
+            page_visits_archived=True):
+        for visit in get_archived_page_visits(flow_session):
+            human_grades = [
+                    grade for grade in visit.archived_grades
+                    if grade.grader_id is not None]
+            if human_grades:
+                archived_grades.append(human_grades[-1])
+
+    from django.contrib.auth import get_user_model
+    graders_by_id = get_user_model().objects.in_bulk(
+            set(grade.grader_id for grade in archived_grades))
+
+    for grade in archived_grades:
+        grade.grader = graders_by_id.get(grade.grader_id)
+        commit_grade_info(grade)
+
+    # }}}
+
     graders = sorted(graders,
             key=lambda grader: grader.last_name if grader is not None else None)
     pages = sorted(pages)
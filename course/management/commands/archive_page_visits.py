@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import division, print_function
+
+__copyright__ = "Copyright (C) 2017 Andreas Kloeckner"
+
+__license__ = """
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+"""
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = ("Move the page visits, grades and bulk feedback of finished "
+            "flow sessions in courses that ended long ago into compressed "
+            "per-session archives, or restore them.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("course_identifiers", metavar="COURSE", nargs="*",
+                help="Identifiers of courses to process (default: all "
+                "courses that ended more than --retention-days ago)")
+        parser.add_argument("--retention-days", type=int,
+                default=settings.RELATE_PAGE_VISIT_ARCHIVE_RETENTION_DAYS)
+        parser.add_argument("--restore", action="store_true",
+                help="Move archived page visits back into the database")
+        parser.add_argument("--dry-run", action="store_true",
+                help="Only report what would be done")
+
+    def handle(self, *args, **options):
+        from datetime import timedelta
+        from django.utils.timezone import now
+
+        from course.models import Course, FlowSession
+        from course.archive import (
+                archive_flow_session, restore_flow_session,
+                get_archivable_flow_sessions)
+
+        courses = Course.objects.order_by("identifier")
+        if options["course_identifiers"]:
+            courses = courses.filter(
+                    identifier__in=options["course_identifiers"])
+
+            missing = (
+                    set(options["course_identifiers"])
+                    - set(c.identifier for c in courses))
+            if missing:
+                raise CommandError(
+                        "unknown course(s): %s" % ", ".join(sorted(missing)))
+
+        elif not options["restore"]:
+            courses = courses.filter(
+                    end_date__lt=(
+                        now().date()
+                        - timedelta(days=options["retention_days"])))
+
+        for course in courses:
+            if options["restore"]:
+                sessions = (FlowSession.objects
+                        .filter(course=course, page_visits_archived=True)
+                        .order_by("id"))
+                process = restore_flow_session
+                verb = "restored"
+            else:
+                sessions = get_archivable_flow_sessions(course)
+                process = archive_flow_session
+                verb = "archived"
+
+            session_count = visit_count = grade_count = 0
+            for session in sessions.iterator():
+                session_count += 1
+                if options["dry_run"]:
+                    continue
+
+                session_visit_count, session_grade_count = process(session)
+                visit_count += session_visit_count
+                grade_count += session_grade_count
+
+            if options["dry_run"]:
+                self.stdout.write("%s: would have %s %d sessions" % (
+                    course.identifier, verb, session_count))
+            else:
+                self.stdout.write(
+                        "%s: %s %d sessions, %d visits, %d grades" % (
+                            course.identifier, verb, session_count,
+                            visit_count, grade_count))
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import division, print_function
+
+__copyright__ = "Copyright (C) 2017 Andreas Kloeckner"
+
+__license__ = """
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+"""
+
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = ("Show hits and misses of the content cache per kind of content, "
+            "summed over all processes.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--reset", action="store_true",
+                help="Reset the counts after showing them")
+
+    def handle(self, *args, **options):
+        from course.caching import get_content_cache_stats
+
+        stats = get_content_cache_stats(reset=options["reset"])
+
+        self.stdout.write("%-10s %12s %12s %12s %9s" % (
+            "kind", "local hits", "shared hits", "misses", "hit rate"))
+        for kind in sorted(stats):
+            kind_stats = stats[kind]
+            total = sum(kind_stats.values())
+            if total:
+                hit_rate = "%.1f%%" % (
+                        100 * (total - kind_stats["miss"]) / total)
+            else:
+                hit_rate = "-"
+
+            self.stdout.write("%-10s %12d %12d %12d %9s" % (
+                kind, kind_stats["local_hit"], kind_stats["shared_hit"],
+                kind_stats["miss"], hit_rate))
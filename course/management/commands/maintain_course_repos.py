@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import division, print_function
+
+__copyright__ = "Copyright (C) 2017 Andreas Kloeckner"
+
+__license__ = """
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+"""
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+def format_lookup_time(t):
+    if t is None:
+        return "-"
+    return "%.1f us" % (t * 1e6)
+
+
+class Command(BaseCommand):
+    help = ("Repack or garbage-collect course repositories "
+            "that have accumulated too many loose objects or packs.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("course_identifiers", metavar="COURSE", nargs="*",
+                help="Identifiers of courses to process (default: all)")
+        parser.add_argument("--force", action="store_true",
+                help="Garbage-collect regardless of thresholds")
+        parser.add_argument("--dry-run", action="store_true",
+                help="Only report statistics, do not change repositories")
+        parser.add_argument("--max-loose-objects", type=int,
+                default=settings.RELATE_REPO_MAX_LOOSE_OBJECTS)
+        parser.add_argument("--max-packs", type=int,
+                default=settings.RELATE_REPO_MAX_PACKS)
+
+    def handle(self, *args, **options):
+        from course.models import Course
+        from course.versioning import maintain_and_record_course_repo
+
+        courses = Course.objects.order_by("identifier")
+        if options["course_identifiers"]:
+            courses = courses.filter(
+                    identifier__in=options["course_identifiers"])
+
+            missing = (
+                    set(options["course_identifiers"])
+                    - set(c.identifier for c in courses))
+            if missing:
+                raise CommandError(
+                        "unknown course(s): %s" % ", ".join(sorted(missing)))
+
+        failed_count = 0
+        for course in courses:
+            result, error = maintain_and_record_course_repo(course,
+                    max_loose_objects=options["max_loose_objects"],
+                    max_packs=options["max_packs"],
+                    force=options["force"],
+                    dry_run=options["dry_run"])
+
+            if error is not None:
+                failed_count += 1
+                self.stderr.write("%s: failed: %s" % (course.identifier, error))
+                continue
+
+            before = result["before"]
+            after = result["after"]
+            self.stdout.write(
+                    "%s: %s; loose objects %d -> %d, packs %d -> %d, "
+                    "lookup time %s -> %s" % (
+                        course.identifier, result["action"],
+                        before["loose_objects"], after["loose_objects"],
+                        before["packs"], after["packs"],
+                        format_lookup_time(before["lookup_time"]),
+                        format_lookup_time(after["lookup_time"])))
+
+        if failed_count:
+            raise CommandError(
+                    "maintenance failed for %d course(s)" % failed_count)
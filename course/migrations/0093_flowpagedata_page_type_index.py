@@ -0,0 +1,18 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('course', '0092_unicode_literals'),
+    ]
+
+    operations = [
+        migrations.AlterIndexTogether(
+            name='flowpagedata',
+            index_together=set([('flow_session', 'group_id', 'page_id', 'page_type')]),
+        ),
+    ]
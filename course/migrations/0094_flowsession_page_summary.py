@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+import jsonfield.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('course', '0093_flowpagedata_page_type_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='flowsession',
+            name='page_summary',
+            field=jsonfield.fields.JSONField(blank=True, null=True, verbose_name='Page summary'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('course', '0094_flowsession_page_summary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='flowsession',
+            name='page_visits_archived',
+            field=models.BooleanField(default=False, verbose_name='Page visits archived'),
+        ),
+        migrations.CreateModel(
+            name='FlowSessionArchive',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('archive_time', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Archive time')),
+                ('visit_count', models.IntegerField(verbose_name='Visit count')),
+                ('grade_count', models.IntegerField(verbose_name='Grade count')),
+                ('data', models.BinaryField(verbose_name='Data')),
+                ('flow_session', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='archive', to='course.FlowSession', verbose_name='Flow session')),
+            ],
+            options={
+                'verbose_name': 'Flow session archive',
+                'verbose_name_plural': 'Flow session archives',
+            },
+        ),
+    ]
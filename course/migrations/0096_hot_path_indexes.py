@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('course', '0095_flowsessionarchive'),
+    ]
+
+    operations = [
+        migrations.AlterIndexTogether(
+            name='flowsession',
+            index_together=set([('course', 'flow_id', 'participation', 'in_progress')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='flowpagevisit',
+            index_together=set([('flow_session', 'visit_time')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='gradechange',
+            index_together=set([('opportunity', 'participation', 'grade_time'), ('opportunity', 'participation', 'attempt_id', 'grade_time')]),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('course', '0096_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CourseRepositoryMaintenance',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('time', models.DateTimeField(db_index=True, default=django.utils.timezone.now, verbose_name='Time')),
+                ('action', models.CharField(blank=True, max_length=20, null=True, verbose_name='Action')),
+                ('error', models.TextField(blank=True, null=True, verbose_name='Error')),
+                ('loose_objects_before', models.IntegerField(blank=True, null=True, verbose_name='Loose objects before')),
+                ('loose_objects_after', models.IntegerField(blank=True, null=True, verbose_name='Loose objects after')),
+                ('packs_before', models.IntegerField(blank=True, null=True, verbose_name='Packs before')),
+                ('packs_after', models.IntegerField(blank=True, null=True, verbose_name='Packs after')),
+                ('lookup_time_before', models.FloatField(blank=True, null=True, verbose_name='Object lookup time before')),
+                ('lookup_time_after', models.FloatField(blank=True, null=True, verbose_name='Object lookup time after')),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='course.Course', verbose_name='Course')),
+            ],
+            options={
+                'verbose_name': 'Course repository maintenance',
+                'verbose_name_plural': 'Course repository maintenance',
+                'ordering': ('course', '-time'),
+            },
+        ),
+    ]
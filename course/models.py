@@ -217,6 +217,56 @@ class Course(models.Model):
 # }}}
 
 
+# {{{ course repository maintenance
+
+class CourseRepositoryMaintenance(models.Model):
+    """A record of one run of :func:`course.versioning.maintain_course_repo`,
+    kept so that repository performance can be followed over time.
+    """
+
+    course = models.ForeignKey(Course,
+            verbose_name=_('Course'), on_delete=models.CASCADE)
+    time = models.DateTimeField(default=now, db_index=True,
+            verbose_name=_('Time'))
+
+    # one of "none", "repack", "gc", or null if maintenance failed
+    action = models.CharField(max_length=20, null=True, blank=True,
+            verbose_name=_('Action'))
+    error = models.TextField(null=True, blank=True,
+            verbose_name=_('Error'))
+
+    loose_objects_before = models.IntegerField(null=True, blank=True,
+            verbose_name=_('Loose objects before'))
+    loose_objects_after = models.IntegerField(null=True, blank=True,
+            verbose_name=_('Loose objects after'))
+    packs_before = models.IntegerField(null=True, blank=True,
+            verbose_name=_('Packs before'))
+    packs_after = models.IntegerField(null=True, blank=True,
+            verbose_name=_('Packs after'))
+
+    # in seconds, see course.versioning.time_repo_object_lookups
+    lookup_time_before = models.FloatField(null=True, blank=True,
+            verbose_name=_('Object lookup time before'))
+    lookup_time_after = models.FloatField(null=True, blank=True,
+            verbose_name=_('Object lookup time after'))
+
+    class Meta:
+        verbose_name = _("Course repository maintenance")
+        verbose_name_plural = _("Course repository maintenance")
+        ordering = ("course", "-time")
+
+    def __unicode__(self):
+        return _("Repository maintenance of %(course)s at %(time)s") % {
+                "course": self.course,
+                "time": self.time,
+                }
+
+    if six.PY3:
+        __str__ = __unicode__
+
+# }}}
+
+
 # {{{ event
 
 class Event(models.Model):
@@ -495,11 +545,30 @@ class FlowSession(models.Model):
     result_comment = models.TextField(blank=True, null=True,
             verbose_name=_('Result comment'))
 
+    # Non-normal: A summary of the pages in this session (titles, bookmarks,
+    # which ones have answers, time of the last answer) from which the flow
+    # navigation is rendered. Maintained by course.flow and recomputed when
+    # missing or out of date with page_data_at_revision_key.
+    # See course.flow.get_flow_session_page_summary.
+    page_summary = JSONField(null=True, blank=True,
+            verbose_name=_('Page summary'))
+
+    # If set, the page visits, grades and bulk feedback of this session
+    # have been moved into its FlowSessionArchive. See course.archive.
+    page_visits_archived = models.BooleanField(default=False,
+            verbose_name=_('Page visits archived'))
+
     class Meta:
         verbose_name = _("Flow session")
         verbose_name_plural = _("Flow sessions")
         ordering = ("course", "-start_time")
 
+        # looking up a participant's sessions of a flow, see
+        # test/test_query_plans.py
+        index_together = (
+                ("course", "flow_id", "participation", "in_progress"),
+                )
+
     def __unicode__(self):
         if self.participation is None:
             return _("anonymous session %(session_id)d on '%(flow_id)s'") % {
@@ -514,6 +583,23 @@ class FlowSession(models.Model):
     if six.PY3:
         __str__ = __unicode__
 
+    def save(self, *args, **kwargs):
+        # page_summary is updated on its own, under a row lock, by
+        # course.flow. A full save of an existing session would write back
+        # the possibly outdated copy loaded with it, so leave it out.
+        if (not self._state.adding
+                and kwargs.get("update_fields") is None
+                and not kwargs.get("force_insert")
+                and not args):
+            deferred_fields = self.get_deferred_fields()
+            kwargs["update_fields"] = [
+                    field.name for field in self._meta.concrete_fields
+                    if not field.primary_key
+                    and field.name != "page_summary"
+                    and field.attname not in deferred_fields]
+
+        super(FlowSession, self).save(*args, **kwargs)
+
     def append_comment(self, s):
         if s is None:
             return
@@ -537,6 +623,18 @@ class FlowSession(models.Model):
         return assemble_answer_visits(self)
 
     def last_activity(self):
+        if self.page_summary is not None:
+            from course.flow import get_page_summary_last_answer_time
+            return get_page_summary_last_answer_time(self.page_summary)
+
+        if self.page_visits_archived:
+            from course.archive import get_archived_page_visits
+            answer_times = [
+                    visit.visit_time
+                    for visit in get_archived_page_visits(self)
+                    if visit.answer is not None and not visit.is_synthetic]
+            return max(answer_times) if answer_times else None
+
         for visit in (FlowPageVisit.objects
                 .filter(
                     flow_session=self,
@@ -590,6 +688,11 @@ class FlowPageData(models.Model):
         verbose_name = _("Flow page data")
         verbose_name_plural = _("Flow page data")
 
+        # used by course.validation.get_stored_page_types
+        index_together = (
+                ("flow_session", "group_id", "page_id", "page_type"),
+                )
+
     def __unicode__(self):
         # flow page data
         return (_("Data for page '%(group_id)s/%(page_id)s' "
@@ -688,9 +791,22 @@ class FlowPageVisit(models.Model):
         verbose_name = _("Flow page visit")
         verbose_name_plural = _("Flow page visits")
         # These must be distinguishable, to figure out what came later.
+        # This also serves looking up the (answer) visits of a page in order.
         unique_together = (("page_data", "visit_time"),)
 
+        # looking up the (answer) visits of a session in order, see
+        # test/test_query_plans.py
+        index_together = (
+                ("flow_session", "visit_time"),
+                )
+
     def get_most_recent_grade(self):
+        if hasattr(self, "archived_grades"):
+            # restored from a FlowSessionArchive, see course.archive
+            if self.archived_grades:
+                return self.archived_grades[-1]
+            return None
+
         grades = self.grades.order_by("-grade_time")[:1]
 
         for grade in grades:
@@ -816,12 +932,16 @@ def update_bulk_feedback(page_data, grade, bulk_feedback_json):
 
 
 def get_feedback_for_grade(grade):
-    try:
-        bulk_feedback_json = FlowPageBulkFeedback.objects.get(
-                page_data=grade.visit.page_data,
-                grade=grade).bulk_feedback
-    except ObjectDoesNotExist:
-        bulk_feedback_json = None
+    if hasattr(grade, "archived_bulk_feedback"):
+        # restored from a FlowSessionArchive, see course.archive
+        bulk_feedback_json = grade.archived_bulk_feedback
+    else:
+        try:
+            bulk_feedback_json = FlowPageBulkFeedback.objects.get(
+                    page_data=grade.visit.page_data,
+                    grade=grade).bulk_feedback
+        except ObjectDoesNotExist:
+            bulk_feedback_json = None
 
     from course.page import AnswerFeedback
     if grade is not None:
@@ -833,6 +953,37 @@ def get_feedback_for_grade(grade):
 # }}}
 
 
+# {{{ flow session archive
+
+class FlowSessionArchive(models.Model):
+    flow_session = models.OneToOneField(FlowSession, related_name="archive",
+            verbose_name=_('Flow session'), on_delete=models.CASCADE)
+    archive_time = models.DateTimeField(default=now,
+            verbose_name=_('Archive time'))
+
+    visit_count = models.IntegerField(
+            verbose_name=_('Visit count'))
+    grade_count = models.IntegerField(
+            verbose_name=_('Grade count'))
+
+    # zlib-compressed, newline-delimited JSON, see course.archive
+    data = models.BinaryField(
+            verbose_name=_('Data'))
+
+    class Meta:
+        verbose_name = _("Flow session archive")
+        verbose_name_plural = _("Flow session archives")
+
+    def __unicode__(self):
+        return _("Archived page visits of %(flow_session)s") % {
+                "flow_session": self.flow_session}
+
+    if six.PY3:
+        __str__ = __unicode__
+
+# }}}
+
+
 # {{{ flow access
 
 def validate_stipulations(stip):
@@ -1164,6 +1315,13 @@ class GradeChange(models.Model):
         verbose_name_plural = _("Grade changes")
         ordering = ("opportunity", "participation", "grade_time")
 
+        # looking up a participant's grade history for an opportunity
+        # (overall and per attempt), see test/test_query_plans.py
+        index_together = (
+                ("opportunity", "participation", "grade_time"),
+                ("opportunity", "participation", "attempt_id", "grade_time"),
+                )
+
     def __unicode__(self):
         # Translators: information for GradeChange
         return _("%(participation)s %(state)s on %(opportunityname)s") % {
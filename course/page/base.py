@@ -100,6 +100,31 @@ def markup_to_html(page_context, text):
             text)
 
 
+def get_cached_page_fragment(page_context, name, key_parts, compute):
+    """Return the result of calling *compute*, a function without arguments
+    producing (HTML) text or a list of it. The result is cached for the
+    course and commit of *page_context*, so it must be determined by those,
+    *name* and *key_parts* alone.
+    """
+
+    if page_context.course is None:
+        return compute()
+
+    from course.caching import (
+            CACHE_MISS, get_cached_content, set_cached_content)
+
+    key_parts = (
+            (page_context.course.id, str(page_context.commit_sha), name)
+            + tuple(key_parts))
+
+    result = get_cached_content("page_fragment", key_parts)
+    if result is CACHE_MISS:
+        result = compute()
+        set_cached_content("page_fragment", key_parts, result)
+
+    return result
+
+
 # {{{ answer feedback type
 
 def get_auto_feedback(correctness):
@@ -25,6 +25,7 @@ THE SOFTWARE.
 """
 
 
+import six
 from six.moves import range
 import django.forms as forms
 from django.utils.safestring import mark_safe
@@ -33,7 +34,8 @@ from django.utils.translation import (
 
 from relate.utils import StyledForm
 from course.page.base import (
-        AnswerFeedback, PageBaseWithTitle, PageBaseWithValue, markup_to_html)
+        AnswerFeedback, PageBaseWithTitle, PageBaseWithValue, markup_to_html,
+        get_cached_page_fragment)
 from course.content import remove_prefix
 from course.validation import validate_markup, ValidationError
 
@@ -65,6 +67,22 @@ def markup_to_html_plain(page_context, s):
     return s
 
 
+def get_choice_html_list(page_context, page_class, choices):
+    """Return the result of *page_class*.process_choice_string for each of
+    *choices*, in the given order.
+    """
+
+    return [
+            mark_safe(choice_html)
+            for choice_html in get_cached_page_fragment(
+                page_context, "%s.choices" % page_class.__name__,
+                [six.text_type(choice) for choice in choices],
+                lambda: [
+                    six.text_type(
+                        page_class.process_choice_string(page_context, choice))
+                    for choice in choices])]
+
+
 # {{{ choice question base
 
 class ChoiceQuestionBase(PageBaseWithTitle, PageBaseWithValue):
@@ -245,9 +263,10 @@ class ChoiceQuestion(ChoiceQuestionBase):
             self, page_context, page_data, page_behavior, *args, **kwargs):
         permutation = page_data["permutation"]
 
+        choice_html_list = get_choice_html_list(
+                page_context, type(self), self.page_desc.choices)
         choices = tuple(
-                (i,  self.process_choice_string(
-                    page_context, self.page_desc.choices[src_i]))
+                (i, choice_html_list[src_i])
                 for i, src_i in enumerate(permutation))
 
         form = ChoiceAnswerForm(
@@ -431,9 +450,10 @@ class MultipleChoiceQuestion(ChoiceQuestionBase):
             *args, **kwargs):
         permutation = page_data["permutation"]
 
+        choice_html_list = get_choice_html_list(
+                page_context, type(self), self.page_desc.choices)
         choices = tuple(
-                (i,  self.process_choice_string(
-                    page_context, self.page_desc.choices[src_i]))
+                (i, choice_html_list[src_i])
                 for i, src_i in enumerate(permutation))
 
         form = MultipleChoiceAnswerForm(
@@ -497,13 +517,12 @@ class MultipleChoiceQuestion(ChoiceQuestionBase):
         answer_html_list = []
         if unpermute:
             idx_list = list(set(idx_list))
+        choice_html_list = get_choice_html_list(
+                page_context, type(self), self.page_desc.choices)
         for idx in idx_list:
             answer_html_list.append(
                     "<li>"
-                    + (self.process_choice_string(
-                        page_context,
-                        self.page_desc.choices[idx])
-                        .lstrip())
+                    + choice_html_list[idx].lstrip()
                     + "</li>"
                     )
         answer_html = "<ul>"+"".join(answer_html_list)+"</ul>"
@@ -614,10 +633,8 @@ class SurveyChoiceQuestion(PageBaseWithTitle):
     def make_choice_form(self, page_context, page_data, page_behavior,
             *args, **kwargs):
 
-        choices = tuple(
-                (i,  self.process_choice_string(
-                    page_context, self.page_desc.choices[i]))
-                for i in range(len(self.page_desc.choices)))
+        choices = tuple(enumerate(get_choice_html_list(
+                page_context, type(self), self.page_desc.choices)))
 
         form = ChoiceAnswerForm(
             forms.TypedChoiceField(
@@ -34,7 +34,8 @@ import django.forms as forms
 
 from relate.utils import Struct, StyledInlineForm
 from course.page.base import (
-        AnswerFeedback, PageBaseWithValue, markup_to_html)
+        AnswerFeedback, PageBaseWithValue, markup_to_html,
+        get_cached_page_fragment)
 
 from course.page.text import TextQuestionBase, parse_matcher
 
@@ -456,15 +457,18 @@ class ChoicesAnswer(AnswerBase):
                 result.append(i)
         return result
 
+    def get_choice_html_list(self, page_context):
+        from course.page.choice import get_choice_html_list
+        return get_choice_html_list(
+                page_context, type(self), self.answers_desc.choices)
+
     def get_correct_answer_text(self, page_context):
         corr_idx = self.correct_indices()[0]
-        return self.process_choice_string(
-                page_context, self.answers_desc.choices[corr_idx]).lstrip()
+        return self.get_choice_html_list(page_context)[corr_idx].lstrip()
 
     def get_max_correct_answer_len(self, page_context):
         return max([len(answer) for answer in
-            [self.process_choice_string(page_context, processed)
-                for processed in self.answers_desc.choices]])
+            self.get_choice_html_list(page_context)])
 
     def get_correctness(self, answer):
         if answer == "":
@@ -477,13 +481,9 @@ class ChoicesAnswer(AnswerBase):
         return correctness
 
     def get_form_field(self, page_context, force_required=False):
-        choices = tuple(
-            (i, self.process_choice_string(
-                page_context, self.answers_desc.choices[i]))
-            for i, src_i in enumerate(self.answers_desc.choices))
         choices = (
                 (None, "-"*self.get_max_correct_answer_len(page_context)),
-                ) + choices
+                ) + tuple(enumerate(self.get_choice_html_list(page_context)))
         return (self.form_field_class)(
             required=self.required or force_required,
             choices=tuple(choices),
@@ -737,7 +737,7 @@ class InlineMultiQuestion(TextQuestionBase, PageBaseWithValue):
                 self.page_desc.question,
                 ).replace("<p>", "").replace("</p>", "<br/>")
 
-    def get_dict_for_form(self, page_context):
+    def get_html_list(self, page_context):
         remainder_html = self.get_question(page_context)
 
         html_list = []
@@ -748,8 +748,14 @@ class InlineMultiQuestion(TextQuestionBase, PageBaseWithValue):
         if remainder_html != "":
             html_list.append(remainder_html)
 
+        return html_list
+
+    def get_dict_for_form(self, page_context):
         return {
-                "html_list": html_list,
+                "html_list": get_cached_page_fragment(
+                    page_context, "InlineMultiQuestion.html_list",
+                    [self.page_desc.question],
+                    lambda: self.get_html_list(page_context)),
                 "answer_instance_list": self.answer_instance_list,
                }
 
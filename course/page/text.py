@@ -439,8 +439,8 @@ class FloatMatcher(TextAnswerMatcher):
                 )
 
         try:
-            self.matcher_desc.value = \
-                    float_or_sympy_evalf(matcher_desc.value)
+            self.matcher_desc = matcher_desc = matcher_desc._replace(
+                    value=float_or_sympy_evalf(matcher_desc.value))
         except:
             raise ValidationError(
                     string_concat(
@@ -450,8 +450,8 @@ class FloatMatcher(TextAnswerMatcher):
 
         if hasattr(matcher_desc, "rtol"):
             try:
-                self.matcher_desc.rtol = \
-                        float_or_sympy_evalf(matcher_desc.rtol)
+                self.matcher_desc = matcher_desc = matcher_desc._replace(
+                        rtol=float_or_sympy_evalf(matcher_desc.rtol))
             except:
                 raise ValidationError(
                         string_concat(
@@ -468,8 +468,8 @@ class FloatMatcher(TextAnswerMatcher):
 
         if hasattr(matcher_desc, "atol"):
             try:
-                self.matcher_desc.atol = \
-                        float_or_sympy_evalf(matcher_desc.atol)
+                self.matcher_desc = matcher_desc = matcher_desc._replace(
+                        atol=float_or_sympy_evalf(matcher_desc.atol))
             except:
                 raise ValidationError(
                         string_concat(
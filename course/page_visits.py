@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import division
+
+__copyright__ = "Copyright (C) 2017 Andreas Kloeckner"
+
+__license__ = """
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+"""
+
+import os
+import threading
+import logging
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+# Visits to flow pages that do not carry an answer are only a log, so
+# instead of being inserted one by one while the page is served, they are
+# collected in a per-process buffer and bulk-inserted by a background
+# thread every RELATE_PAGE_VISIT_FLUSH_INTERVAL seconds. If the buffer
+# holds RELATE_PAGE_VISIT_BUFFER_SIZE visits, further visits are saved
+# right away. Buffering is off unless a buffer size is set, since buffered
+# visits are lost when a process is killed.
+#
+# Visits carrying answers are never buffered, since grading and the flow
+# session state depend on them.
+
+PAGE_VISIT_BULK_BATCH_SIZE = 500
+
+
+class PageVisitBuffer(object):
+    def __init__(self, max_size, flush_interval):
+        self.max_size = max_size
+        self.flush_interval = flush_interval
+
+        self.pid = os.getpid()
+        self.visits = []
+        self.lock = threading.Lock()
+        self.wake_up = threading.Event()
+
+        self.thread = threading.Thread(
+                target=self._run, name="relate-page-visit-writer")
+        self.thread.daemon = True
+        self.thread.start()
+
+    def add(self, visit):
+        """
+        :returns: *True* if *visit* was buffered, *False* if the buffer is
+            full and the caller should save *visit* itself.
+        """
+
+        with self.lock:
+            if len(self.visits) >= self.max_size:
+                self.wake_up.set()
+                return False
+
+            self.visits.append(visit)
+            return True
+
+    def flush(self):
+        with self.lock:
+            visits = self.visits
+            self.visits = []
+
+        if visits:
+            try:
+                save_page_visits(visits)
+            except Exception:
+                logger.exception("could not save %d buffered page visits, "
+                        "dropping them", len(visits))
+                raise
+
+    def _run(self):
+        from django.db import close_old_connections
+
+        while True:
+            self.wake_up.wait(self.flush_interval)
+            self.wake_up.clear()
+
+            try:
+                self.flush()
+            except Exception:
+                # already logged by flush()
+                pass
+            finally:
+                close_old_connections()
+
+
+def save_page_visits(visits):
+    """Save *visits* in bulk. Visits that cannot be saved are logged and
+    dropped.
+
+    :returns: the number of dropped visits.
+    """
+
+    from django.db import IntegrityError, transaction
+    from course.models import FlowPageVisit
+
+    try:
+        with transaction.atomic():
+            FlowPageVisit.objects.bulk_create(
+                    visits, batch_size=PAGE_VISIT_BULK_BATCH_SIZE)
+    except IntegrityError:
+        # A page (or session) was deleted in the meantime, or two visits
+        # ended up with the same time. Salvage what can be saved.
+        dropped_count = 0
+        for visit in visits:
+            try:
+                with transaction.atomic():
+                    visit.save()
+            except IntegrityError:
+                logger.warning("dropping page visit to page data %s "
+                        "of flow session %s at %s", visit.page_data_id,
+                        visit.flow_session_id, visit.visit_time,
+                        exc_info=True)
+                dropped_count += 1
+
+        return dropped_count
+
+    return 0
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def _get_buffer():
+    global _buffer
+
+    max_size = getattr(settings, "RELATE_PAGE_VISIT_BUFFER_SIZE", 0)
+    if not max_size:
+        return None
+
+    with _buffer_lock:
+        # The writer thread does not survive a fork.
+        if _buffer is None or _buffer.pid != os.getpid():
+            _buffer = PageVisitBuffer(max_size,
+                    getattr(settings, "RELATE_PAGE_VISIT_FLUSH_INTERVAL", 2))
+
+            import atexit
+            atexit.register(_buffer.flush)
+
+        return _buffer
+
+
+def log_page_visit(visit):
+    """Save *visit*, a :class:`course.models.FlowPageVisit` without an
+    answer, at some point in the near future.
+    """
+
+    assert visit.answer is None
+    assert visit.pk is None
+
+    buf = _get_buffer()
+    if buf is None or not buf.add(visit):
+        visit.save()
+
+
+def flush_page_visits():
+    """Save all buffered visits of this process. Call this before relying on
+    all visits being in the database.
+    """
+
+    if _buffer is not None and _buffer.pid == os.getpid():
+        _buffer.flush()
+
+# vim: foldmethod=marker
@@ -24,14 +24,14 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 THE SOFTWARE.
 """
 
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.db import transaction
 from django.dispatch import receiver
 
 from accounts.models import User
 from course.models import (
         Course, Participation, participation_status,
-        ParticipationPreapproval,
+        ParticipationPreapproval, Event, InstantFlowRequest,
         )
 
 
@@ -103,4 +103,44 @@ def may_preapprove_role(course, user):
 
 # }}}
 
+
+# {{{ invalidate cached course catalog
+
+@receiver(post_save, sender=Course)
+@receiver(post_delete, sender=Course)
+def bump_courses_generation(sender, instance, **kwargs):
+    from course.caching import (
+            bump_cache_generation_on_commit, COURSES_GENERATION_NAME)
+    bump_cache_generation_on_commit(COURSES_GENERATION_NAME)
+
+# }}}
+
+
+# {{{ invalidate content cached with event dates
+
+@receiver(post_save, sender=Event)
+@receiver(post_delete, sender=Event)
+def bump_course_events_generation(sender, instance, **kwargs):
+    from course.caching import (
+            bump_cache_generation_on_commit, get_course_events_generation_name)
+    bump_cache_generation_on_commit(
+            get_course_events_generation_name(instance.course_id))
+
+# }}}
+
+
+# {{{ invalidate cached instant flow request schedules
+
+@receiver(post_save, sender=InstantFlowRequest)
+@receiver(post_delete, sender=InstantFlowRequest)
+def bump_course_instant_flow_requests_generation(sender, instance, **kwargs):
+    from course.caching import (
+            bump_cache_generation_on_commit,
+            get_course_instant_flow_requests_generation_name)
+    bump_cache_generation_on_commit(
+            get_course_instant_flow_requests_generation_name(
+                instance.course_id))
+
+# }}}
+
 # vim: foldmethod=marker
@@ -114,6 +114,7 @@ def recalculate_ended_sessions(self, course_id, flow_id, rule_tag):
                 participation__isnull=False,
                 access_rules_tag=rule_tag,
                 in_progress=False,
+                page_visits_archived=False,
                 ))
 
     nsessions = sessions.count()
@@ -142,7 +143,8 @@ def regrade_flow_sessions(self, course_id, flow_id, access_rules_tag, inprog_val
             .filter(
                 course=course,
                 participation__isnull=False,
-                flow_id=flow_id))
+                flow_id=flow_id,
+                page_visits_archived=False))
 
     if access_rules_tag:
         sessions = sessions.filter(access_rules_tag=access_rules_tag)
@@ -167,4 +169,162 @@ def regrade_flow_sessions(self, course_id, flow_id, access_rules_tag, inprog_val
     return {"message": _("%d sessions regraded.") % count}
 
 
+# {{{ course content
+
+def _make_fetch_progress_reporter(task):
+    from course.versioning import GitProgressReporter
+
+    def report(current, total, message):
+        task.update_state(
+                state='PROGRESS',
+                meta={'current': current, 'total': total, 'message': message})
+
+    return GitProgressReporter(report)
+
+
+@shared_task(bind=True)
+def update_course_content(self, course_id, participation_id, command, new_sha,
+        may_update, prevent_discarding_revisions):
+    from django.contrib import messages
+    from django.core.urlresolvers import reverse
+    from django.utils.html import strip_tags
+    from course.models import Participation
+    from course.content import SubdirRepoWrapper
+    from course.versioning import run_course_update_command
+
+    course = Course.objects.get(id=course_id)
+    participation = None
+    if participation_id is not None:
+        participation = Participation.objects.get(id=participation_id)
+
+    content_repo = get_course_repo(course)
+    if isinstance(content_repo, SubdirRepoWrapper):
+        repo = content_repo.repo
+    else:
+        repo = content_repo
+
+    message_texts = []
+
+    def add_message(level, text):
+        message_texts.append(strip_tags(text))
+
+    try:
+        run_course_update_command(
+                add_message, repo, content_repo, course, participation,
+                command, new_sha, may_update,
+                prevent_discarding_revisions=prevent_discarding_revisions,
+                fetch_progress=_make_fetch_progress_reporter(self))
+    except Exception as e:
+        add_message(messages.ERROR,
+                "%s: %s %s" % (_("Error"), type(e).__name__, str(e)))
+    finally:
+        content_repo.close()
+
+    return {
+            "message": "\n".join(message_texts),
+            "next_url": reverse("relate-update_course", args=(course.identifier,)),
+            }
+
+
+@shared_task(bind=True)
+def create_course(self, new_course, creator_id):
+    """
+    :arg new_course: an unsaved :class:`course.models.Course`.
+    """
+
+    from django.contrib.auth import get_user_model
+    from django.core.urlresolvers import reverse
+    from course.versioning import create_course_from_remote
+
+    creator = get_user_model().objects.get(id=creator_id)
+
+    create_course_from_remote(new_course, creator,
+            progress=_make_fetch_progress_reporter(self))
+
+    return {
+            "message": _("Course content validated, creation succeeded."),
+            "next_url": reverse("relate-course_page",
+                args=(new_course.identifier,)),
+            }
+
+
+@shared_task(bind=True)
+def warm_up_course_caches(self, course_id, commit_sha):
+    from time import time
+    from course.content import build_content_bundle, warm_up_content_caches
+
+    start_time = time()
+
+    course = Course.objects.get(id=course_id)
+    repo = get_course_repo(course)
+
+    def report(current, total, message):
+        self.update_state(
+                state='PROGRESS',
+                meta={'current': current, 'total': total, 'message': message})
+
+    try:
+        report(0, 0, _("Building content bundle"))
+        build_content_bundle(repo, course, commit_sha)
+
+        item_count, failed_count = warm_up_content_caches(
+                course, repo, commit_sha, progress=report)
+    finally:
+        repo.close()
+
+    return {"message": (
+        _("Caches for %(nitems)d items warmed up in %(duration).1f s "
+            "(%(nfailed)d failed).")
+        % {
+            "nitems": item_count,
+            "duration": time() - start_time,
+            "nfailed": failed_count,
+            })}
+
+# }}}
+
+
+# {{{ repository maintenance
+
+@shared_task(bind=True)
+def maintain_course_repositories(self, force=False):
+    from django.conf import settings
+    from course.versioning import maintain_and_record_course_repo
+
+    courses = list(Course.objects.all())
+
+    action_counts = {}
+    failed_courses = []
+    for i, course in enumerate(courses):
+        result, error = maintain_and_record_course_repo(course,
+                max_loose_objects=settings.RELATE_REPO_MAX_LOOSE_OBJECTS,
+                max_packs=settings.RELATE_REPO_MAX_PACKS,
+                force=force)
+
+        if error is not None:
+            failed_courses.append(course.identifier)
+        else:
+            action_counts[result["action"]] = \
+                    action_counts.get(result["action"], 0) + 1
+
+        self.update_state(
+                state='PROGRESS',
+                meta={'current': i+1, 'total': len(courses)})
+
+    return {
+            "message": (
+                _("%(ncourses)d repositories checked: %(nrepack)d repacked, "
+                    "%(ngc)d garbage-collected, %(nfailed)d failed.")
+                % {
+                    "ncourses": len(courses),
+                    "nrepack": action_counts.get("repack", 0),
+                    "ngc": action_counts.get("gc", 0),
+                    "nfailed": len(failed_courses),
+                    }),
+            "failed_courses": failed_courses,
+            }
+
+# }}}
+
+
 # vim: foldmethod=marker
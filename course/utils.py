@@ -391,6 +391,78 @@ def get_session_grading_rule(session, role, flow_desc, now_datetime):
 # }}}
 
 
+# {{{ request-scoped lookups
+
+class RequestLookupCache(object):
+    """Values looked up while handling one request, such as courses,
+    roles, participations and course commit SHAs.
+
+    .. attribute:: avoided_lookup_count
+
+        The number of lookups answered from the cache.
+    """
+
+    def __init__(self):
+        self.values = {}
+        self.avoided_lookup_count = 0
+
+    def get_or_compute(self, key, compute):
+        try:
+            result = self.values[key]
+        except KeyError:
+            result = self.values[key] = compute()
+        else:
+            self.avoided_lookup_count += 1
+
+        return result
+
+
+def memoize_in_request(request, key, compute):
+    """Return the result of calling *compute*, reusing it for later calls
+    with the same *key* while handling *request*. Without a
+    :class:`RequestLookupCacheMiddleware`, *compute* is called each time.
+    """
+
+    cache = getattr(request, "relate_lookup_cache", None)
+    if cache is None:
+        return compute()
+
+    return cache.get_or_compute(key, compute)
+
+
+def get_request_course(request, course_identifier):
+    from course.models import Course
+    return memoize_in_request(request, ("course", course_identifier),
+            lambda: get_object_or_404(Course, identifier=course_identifier))
+
+
+def _get_course_commit_sha_key(course, participation):
+    return ("course_commit_sha", course.id,
+            participation.id if participation is not None else None)
+
+
+def get_request_course_commit_sha(request, course, participation, repo=None):
+    return memoize_in_request(request,
+            _get_course_commit_sha_key(course, participation),
+            lambda: get_course_commit_sha(course, participation, repo=repo))
+
+
+class RequestLookupCacheMiddleware(object):
+    def process_request(self, request):
+        request.relate_lookup_cache = RequestLookupCache()
+
+    def process_response(self, request, response):
+        from django.conf import settings
+        cache = getattr(request, "relate_lookup_cache", None)
+        if cache is not None and settings.DEBUG:
+            response["X-Relate-Avoided-Lookups"] = str(
+                    cache.avoided_lookup_count)
+
+        return response
+
+# }}}
+
+
 # {{{ contexts
 
 class CoursePageContext(object):
@@ -398,8 +470,7 @@ class CoursePageContext(object):
         self.request = request
         self.course_identifier = course_identifier
 
-        from course.models import Course
-        self.course = get_object_or_404(Course, identifier=course_identifier)
+        self.course = get_request_course(request, course_identifier)
 
         from course.views import get_role_and_participation
         self.role, self.participation = get_role_and_participation(
@@ -408,43 +479,29 @@ class CoursePageContext(object):
         from course.views import check_course_state
         check_course_state(self.course, self.role)
 
-        self.course_commit_sha = get_course_commit_sha(
-                self.course, self.participation)
-
         self.repo = get_course_repo(self.course)
 
-        # logic duplicated in course.content.get_course_commit_sha
-        sha = self.course.active_git_commit_sha.encode()
-
-        if (self.participation is not None
-                and self.participation.preview_git_commit_sha):
-            preview_sha = self.participation.preview_git_commit_sha.encode()
-
-            repo = get_course_repo(self.course)
-
-            from course.content import SubdirRepoWrapper
-            if isinstance(repo, SubdirRepoWrapper):
-                repo = repo.repo
-
-            try:
-                repo[preview_sha]
-            except KeyError:
-                from django.contrib import messages
-                messages.add_message(request, messages.ERROR,
-                        _("Preview revision '%s' does not exist--"
-                        "showing active course content instead.")
-                        % preview_sha.decode())
-
-                preview_sha = None
-
-            if preview_sha is not None:
-                sha = preview_sha
+        from course.content import CourseCommitSHADoesNotExist
+        commit_sha_key = _get_course_commit_sha_key(
+                self.course, self.participation)
+        try:
+            self.course_commit_sha = memoize_in_request(request,
+                    commit_sha_key,
+                    lambda: get_course_commit_sha(
+                        self.course, self.participation, repo=self.repo,
+                        raise_on_nonexistent_preview_commit=True))
+        except CourseCommitSHADoesNotExist as e:
+            from django.contrib import messages
+            messages.add_message(request, messages.ERROR, six.text_type(e))
 
-        self.course_commit_sha = sha
+            self.course_commit_sha = memoize_in_request(request,
+                    commit_sha_key,
+                    lambda: self.course.active_git_commit_sha.encode())
 
 
 class FlowContext(object):
-    def __init__(self, repo, course, flow_id, participation=None):
+    def __init__(self, repo, course, flow_id, participation=None,
+            request=None):
         """*participation* and *flow_session* are not stored and only used
         to figure out versioning of the flow content.
         """
@@ -455,8 +512,8 @@ class FlowContext(object):
 
         from django.core.exceptions import ObjectDoesNotExist
 
-        self.course_commit_sha = get_course_commit_sha(
-                self.course, participation)
+        self.course_commit_sha = get_request_course_commit_sha(
+                request, self.course, participation, repo=repo)
 
         try:
             self.flow_desc = get_flow_desc(self.repo, self.course,
@@ -479,7 +536,8 @@ class FlowPageContext(FlowContext):
 
     def __init__(self, repo, course, flow_id, ordinal,
              participation, flow_session, request=None):
-        super(FlowPageContext, self).__init__(repo, course, flow_id, participation)
+        super(FlowPageContext, self).__init__(repo, course, flow_id,
+                participation, request=request)
 
         if ordinal >= flow_session.page_count:
             raise PageOrdinalOutOfRange()
@@ -528,6 +586,19 @@ class FlowPageContext(FlowContext):
     def ordinal(self):
         return self.page_data.ordinal
 
+    def get_page_body(self):
+        """Return the (HTML) body of the page, as rendered by an earlier
+        request for the same page, page data and commit if possible.
+        """
+
+        import json
+        from course.page.base import get_cached_page_fragment
+        return get_cached_page_fragment(
+                self.page_context, "body",
+                (self.flow_id, self.page_data.group_id, self.page_data.page_id,
+                    json.dumps(self.page_data.data, sort_keys=True)),
+                lambda: self.page.body(self.page_context, self.page_data.data))
+
 
 def instantiate_flow_page_with_ctx(fctx, page_data):
     from course.content import get_flow_page_desc
@@ -558,6 +629,67 @@ def course_view(f):
     return wrapper
 
 
+def _query_instant_flow_requests(course, now_datetime):
+    """Return the uncancelled instant flow requests of *course* that have
+    not ended by *now_datetime*, ordered by start time.
+    """
+
+    from course.models import InstantFlowRequest
+    return list((InstantFlowRequest.objects
+            .filter(
+                course=course,
+                end_time__gte=now_datetime,
+                cancelled=False)
+            .order_by("start_time")))
+
+
+def get_active_instant_flow_requests(course, now_datetime):
+    """Return the instant flow requests of *course* active at
+    *now_datetime*, ordered by start time.
+
+    The requests that had not ended a day before the first call are cached
+    per course, until an instant flow request of the course is saved or
+    deleted (if the cache is shared between processes).
+    """
+
+    from course.caching import (
+            CACHE_MISS, get_cached_content, set_cached_content,
+            get_cache_generation,
+            get_course_instant_flow_requests_generation_name)
+
+    generation = get_cache_generation(
+            get_course_instant_flow_requests_generation_name(course.id))
+    if generation is None:
+        return [
+                ifr for ifr in _query_instant_flow_requests(
+                    course, now_datetime)
+                if ifr.start_time <= now_datetime]
+
+    key_parts = (course.id, generation)
+
+    schedule = get_cached_content("instant_flow_requests", key_parts)
+    if schedule is CACHE_MISS:
+        from django.utils.timezone import now
+        from datetime import timedelta
+        schedule_start = now() - timedelta(days=1)
+        schedule = (
+                schedule_start,
+                _query_instant_flow_requests(course, schedule_start))
+        set_cached_content("instant_flow_requests", key_parts, schedule)
+
+    schedule_start, instant_flow_requests = schedule
+
+    if now_datetime < schedule_start:
+        # (fake) time before the schedule starts--the schedule may be
+        # missing requests that had ended by then
+        instant_flow_requests = _query_instant_flow_requests(
+                course, now_datetime)
+
+    return [
+            ifr for ifr in instant_flow_requests
+            if ifr.start_time <= now_datetime <= ifr.end_time]
+
+
 def render_course_page(pctx, template_name, args,
         allow_instant_flow_requests=True):
     args = args.copy()
@@ -566,14 +698,8 @@ def render_course_page(pctx, template_name, args,
     now_datetime = get_now_or_fake_time(pctx.request)
 
     if allow_instant_flow_requests:
-        from course.models import InstantFlowRequest
-        instant_flow_requests = list((InstantFlowRequest.objects
-                .filter(
-                    course=pctx.course,
-                    start_time__lte=now_datetime,
-                    end_time__gte=now_datetime,
-                    cancelled=False)
-                .order_by("start_time")))
+        instant_flow_requests = get_active_instant_flow_requests(
+                pctx.course, now_datetime)
     else:
         instant_flow_requests = []
 
@@ -745,6 +871,113 @@ def get_facilities_config(request=None):
         return facilities
 
 
+class FacilityIPIndex(object):
+    """Maps IP addresses to the set of facilities whose ``ip_ranges``
+    contain them.
+
+    For each IP version, the address space is split into intervals on which
+    the set of facilities is constant, so that a lookup is a binary search
+    over the interval starts.
+    """
+
+    def __init__(self, facility_ip_ranges):
+        """
+        :arg facility_ip_ranges: a sequence of tuples
+            *(facility_name, ip_ranges)*
+        """
+
+        import ipaddress
+
+        # maps IP versions to lists of (address, change, facility name)
+        version_to_events = {}
+        for name, ip_ranges in facility_ip_ranges:
+            for ir in ip_ranges:
+                network = ipaddress.ip_network(six.text_type(ir))
+                events = version_to_events.setdefault(network.version, [])
+                events.append((int(network.network_address), 1, name))
+                events.append((int(network.broadcast_address) + 1, -1, name))
+
+        # maps IP versions to sorted lists of interval starts and to the
+        # facility sets of the intervals
+        self.version_to_starts = {}
+        self.version_to_facility_sets = {}
+
+        for version, events in six.iteritems(version_to_events):
+            events.sort()
+
+            starts = []
+            facility_sets = []
+            name_to_count = {}
+
+            i = 0
+            while i < len(events):
+                address = events[i][0]
+                while i < len(events) and events[i][0] == address:
+                    _, change, name = events[i]
+                    name_to_count[name] = name_to_count.get(name, 0) + change
+                    i += 1
+
+                facility_set = frozenset(
+                        name for name, count in six.iteritems(name_to_count)
+                        if count > 0)
+                if not facility_sets or facility_set != facility_sets[-1]:
+                    starts.append(address)
+                    facility_sets.append(facility_set)
+
+            self.version_to_starts[version] = starts
+            self.version_to_facility_sets[version] = facility_sets
+
+    def lookup(self, address):
+        """
+        :arg address: an :class:`ipaddress.IPv4Address` or
+            :class:`ipaddress.IPv6Address`
+        :returns: a :class:`frozenset` of facility names
+        """
+
+        starts = self.version_to_starts.get(address.version)
+        if not starts:
+            return frozenset()
+
+        from bisect import bisect_right
+        i = bisect_right(starts, int(address)) - 1
+        if i < 0:
+            return frozenset()
+
+        return self.version_to_facility_sets[address.version][i]
+
+
+# (facilities, facility_ip_ranges, FacilityIPIndex) for the most recently
+# seen facilities configuration
+_facility_ip_index = (None, None, None)
+
+
+def get_facility_ip_index(facilities):
+    """Return a :class:`FacilityIPIndex` for *facilities*, a facilities
+    configuration as returned by :func:`get_facilities_config`. The index
+    is only rebuilt when the IP ranges in the configuration change.
+    """
+
+    global _facility_ip_index
+
+    from django.conf import settings
+
+    cached_facilities, cached_facility_ip_ranges, index = _facility_ip_index
+    if (facilities is cached_facilities
+            and facilities is getattr(settings, "RELATE_FACILITIES", None)):
+        # a static RELATE_FACILITIES setting, which cannot have changed
+        return index
+
+    facility_ip_ranges = tuple(sorted(
+        (name, tuple(props.get("ip_ranges", [])))
+        for name, props in six.iteritems(facilities)))
+
+    if facility_ip_ranges != cached_facility_ip_ranges:
+        index = FacilityIPIndex(facility_ip_ranges)
+
+    _facility_ip_index = (facilities, facility_ip_ranges, index)
+    return index
+
+
 class FacilityFindingMiddleware(object):
     def process_request(self, request):
         pretend_facilities = request.session.get("relate_pretend_facilities")
@@ -756,13 +989,8 @@ class FacilityFindingMiddleware(object):
             remote_address = ipaddress.ip_address(
                     six.text_type(request.META['REMOTE_ADDR']))
 
-            facilities = set()
-
-            for name, props in six.iteritems(get_facilities_config(request)):
-                ip_ranges = props.get("ip_ranges", [])
-                for ir in ip_ranges:
-                    if remote_address in ipaddress.ip_network(six.text_type(ir)):
-                        facilities.add(name)
+            facilities = get_facility_ip_index(
+                    get_facilities_config(request)).lookup(remote_address)
 
         request.relate_facilities = frozenset(facilities)
 
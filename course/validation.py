@@ -34,8 +34,8 @@ from django.utils.html import escape
 from django.utils.translation import (
         ugettext_lazy as _, ugettext, string_concat)
 
-from course.content import get_repo_blob
-from relate.utils import Struct
+from course.content import get_repo_blob, list_repo_directory
+from relate.utils import Struct, struct_to_dict
 
 
 # {{{ validation tools
@@ -113,7 +113,7 @@ def validate_struct(vctx, location, obj, required_attrs, allowed_attrs):
         raise ValidationError(
                 "%s: not a key-value map" % location)
 
-    present_attrs = set(name for name in dir(obj) if not name.startswith("_"))
+    present_attrs = set(struct_to_dict(obj))
 
     for required, attr_list in [
             (True, required_attrs),
@@ -186,6 +186,11 @@ class ValidationContext(object):
 
         A :class:`course.models.Course` instance, or *None*, if no database
         is currently available.
+
+    .. attribute:: datespecs
+
+        A list of tuples *(location, datespec)* of all date specifications
+        encountered.
     """
 
     def __init__(self, repo, commit_sha, course=None):
@@ -194,8 +199,11 @@ class ValidationContext(object):
         self.course = course
 
         self.warnings = []
+        self.datespecs = []
 
     def encounter_datespec(self, location, datespec):
+        self.datespecs.append((location, datespec))
+
         from course.content import parse_date_spec
         parse_date_spec(self.course, datespec, vctx=self, location=location)
 
@@ -1031,7 +1039,7 @@ def get_yaml_from_repo_safely(repo, full_name, commit_sha):
                     "err_str": six.text_type(e)})
 
 
-def check_attributes_yml(vctx, repo, path, tree):
+def check_attributes_yml(vctx, repo, path, commit_sha):
     """
     This function reads the .attributes.yml file and checks
     that each item for each header is a string
@@ -1054,22 +1062,17 @@ def check_attributes_yml(vctx, repo, path, tree):
             - test2.pdf
             - 42
     """
-    from course.content import get_true_repo_and_path
-    repo, path = get_true_repo_and_path(repo, path)
+    entries = list_repo_directory(repo, path, commit_sha)
 
-    try:
-        dummy, attr_blob_sha = tree[b".attributes.yml"]
-    except KeyError:
-        # no .attributes.yml here
-        pass
-    else:
+    if any(name == ".attributes.yml" for name, mode, sha in entries):
         from relate.utils import dict_to_struct
         from yaml import load as load_yaml
 
-        att_yml = dict_to_struct(load_yaml(repo[attr_blob_sha].data))
-
         loc = path + "/" + ".attributes.yml"
 
+        att_yml = dict_to_struct(load_yaml(
+            get_repo_blob(repo, loc, commit_sha, allow_tree=False).data))
+
         att_roles = ["public", "in_exam", "student", "ta",
                      "unenrolled", "instructor"]
         validate_struct(vctx, loc, att_yml,
@@ -1096,12 +1099,9 @@ def check_attributes_yml(vctx, repo, path, tree):
                             % (loc, i+1, access_kind))
 
     import stat
-    for entry in tree.items():
-        if stat.S_ISDIR(entry.mode):
-            dummy, blob_sha = tree[entry.path]
-            subtree = repo[blob_sha]
-            check_attributes_yml(vctx, repo,
-                                 path+"/"+entry.path.decode("utf-8"), subtree)
+    for name, mode, sha in entries:
+        if stat.S_ISDIR(mode):
+            check_attributes_yml(vctx, repo, path+"/"+name, commit_sha)
 
 
 # {{{ check whether flow grade identifiers were changed in sketchy ways
@@ -1138,57 +1138,248 @@ def check_grade_identifier_link(
 
 # {{{ check whether page types were changed
 
-def check_for_page_type_changes(vctx, location, course, flow_id, flow_desc):
-    from course.content import normalize_flow_desc
-    n_flow_desc = normalize_flow_desc(flow_desc)
+def get_stored_page_types(course):
+    """Return a dictionary mapping *(flow_id, group_id, page_id)* to the set of
+    page types recorded in the database for pages of *course*.
+    """
 
     from course.models import FlowPageData
-    for grp in n_flow_desc.groups:
-        for page_desc in grp.pages:
-            fpd_with_mismatched_page_types = list(
-                    FlowPageData.objects
-                    .filter(
-                        flow_session__course=course,
-                        flow_session__flow_id=flow_id,
-                        group_id=grp.id,
-                        page_id=page_desc.id)
-                    .exclude(page_type=None)
-                    .exclude(page_type=page_desc.type)
-                    [0:1])
-
-            if fpd_with_mismatched_page_types:
-                mismatched_fpd, = fpd_with_mismatched_page_types
+
+    result = {}
+    for flow_id, group_id, page_id, page_type in (
+            FlowPageData.objects
+            .filter(flow_session__course=course)
+            .exclude(page_type=None)
+            .values_list(
+                "flow_session__flow_id", "group_id", "page_id", "page_type")
+            .distinct()):
+        result.setdefault((flow_id, group_id, page_id), set()).add(page_type)
+
+    return result
+
+
+def check_for_page_type_changes(vctx, course, flows_page_types):
+    """
+    :arg flows_page_types: a list of tuples *(location, flow_id, page_types)*,
+        where *page_types* is a list of tuples
+        *(group_id, page_id, page_type)*.
+    """
+
+    stored_page_types = get_stored_page_types(course)
+    if not stored_page_types:
+        return
+
+    for location, flow_id, page_types in flows_page_types:
+        for group_id, page_id, page_type in page_types:
+            mismatched_page_types = (
+                    stored_page_types.get((flow_id, group_id, page_id), set())
+                    - set([page_type]))
+
+            if mismatched_page_types:
                 raise ValidationError(
                         _("%(loc)s, group '%(group)s', page '%(page)s': "
                             "page type ('%(type_new)s') differs from "
                             "type used in database ('%(type_old)s')")
-                        % {"loc": location, "group": grp.id,
-                            "page": page_desc.id,
-                            "type_new": page_desc.type,
-                            "type_old": mismatched_fpd.page_type})
+                        % {"loc": location, "group": group_id,
+                            "page": page_id,
+                            "type_new": page_type,
+                            "type_old": min(mismatched_page_types)})
 
 # }}}
 
 
-def validate_course_content(repo, course_file, events_file,
-        validate_sha, course=None):
-    vctx = ValidationContext(
-            repo=repo,
-            commit_sha=validate_sha,
-            course=course)
+# {{{ incremental validation
+
+VALIDATION_CACHE_VERSION = 1
+
+
+class ValidationUnitResult(object):
+    """The content-only outcome of validating one file of course content,
+    i.e. everything that does not depend on the database.
+
+    .. attribute:: warnings
+
+        A list of tuples *(location, text)*.
+
+    .. attribute:: datespecs
+
+        A list of tuples *(location, datespec)* of all date specifications
+        encountered. These are re-checked against the course's events
+        every time the result is used.
+
+    .. attribute:: dependencies
+
+        A :class:`frozenset` of repository-root-relative paths of the files
+        read during validation, including the validated file itself and
+        anything pulled in through Jinja.
+
+    .. attribute:: grade_identifier
+
+        (flows only)
+
+    .. attribute:: page_types
+
+        (flows only) A list of tuples *(group_id, page_id, page_type)*.
+    """
+
+    def __init__(self, warnings, datespecs, dependencies,
+            grade_identifier=None, page_types=None):
+        self.warnings = warnings
+        self.datespecs = datespecs
+        self.dependencies = dependencies
+        self.grade_identifier = grade_identifier
+        self.page_types = page_types
+
+
+def validate_unit(repo, commit_sha, unit_kind, path):
+    """Validate the file *path* as a unit of kind *unit_kind* (one of
+    ``"course"``, ``"events"``, ``"flow"``, ``"staticpage"``) on a fresh,
+    database-less :class:`ValidationContext`.
+
+    :returns: a :class:`ValidationUnitResult`.
+    """
+
+    uvctx = ValidationContext(repo=repo, commit_sha=commit_sha)
 
-    course_desc = get_yaml_from_repo_safely(repo, course_file,
-            commit_sha=validate_sha)
+    from course.content import record_repo_reads
+    with record_repo_reads() as dependencies:
+        extra_kwargs = UNIT_VALIDATORS[unit_kind](uvctx, path) or {}
 
-    validate_staticpage_desc(vctx, course_file, course_desc)
+    return ValidationUnitResult(
+            warnings=[
+                (w.location, six.text_type(w.text))
+                for w in uvctx.warnings],
+            datespecs=uvctx.datespecs,
+            dependencies=frozenset(dependencies),
+            **extra_kwargs)
 
+
+_code_fingerprint = None
+
+
+# distributions whose code the validators run (to parse YAML, expand macros,
+# render markup, check math expressions, ...)
+VALIDATION_CODE_DISTRIBUTIONS = [
+        "Django", "PyYAML", "Jinja2", "Markdown", "pymbolic", "sympy",
+        "dulwich"]
+
+
+def _get_code_fingerprint():
+    """Validation results are only reused if they were obtained with the
+    same version of the validation code, i.e. of RELATE's own code and of
+    :data:`VALIDATION_CODE_DISTRIBUTIONS`.
+    """
+
+    global _code_fingerprint
+    if _code_fingerprint is None:
+        import os
+        from glob import glob
+        import hashlib
+        import pkg_resources
+
+        course_dir = os.path.dirname(os.path.abspath(__file__))
+        relate_dir = os.path.join(os.path.dirname(course_dir), "relate")
+        checksum = hashlib.sha1()
+        for fn in sorted(
+                glob(os.path.join(course_dir, "*.py"))
+                + glob(os.path.join(course_dir, "page", "*.py"))
+                + glob(os.path.join(relate_dir, "*.py"))):
+            with open(fn, "rb") as inf:
+                checksum.update(inf.read())
+
+        for dist_name in VALIDATION_CODE_DISTRIBUTIONS:
+            try:
+                version = pkg_resources.get_distribution(dist_name).version
+            except pkg_resources.DistributionNotFound:
+                version = "-"
+
+            checksum.update(("%s=%s\0" % (dist_name, version)).encode())
+
+        _code_fingerprint = checksum.hexdigest()
+
+    return _code_fingerprint
+
+
+def _get_validation_cache_key(repo, course_file, events_file):
+    from course.content import get_true_repo_and_path, CACHE_KEY_ROOT
+    true_repo, subdir = get_true_repo_and_path(repo, "")
+
+    import hashlib
+    return "validation:v%d:%s:%s" % (
+            VALIDATION_CACHE_VERSION, CACHE_KEY_ROOT,
+            hashlib.sha1("\0".join([
+                true_repo.controldir(), subdir or "",
+                course_file, events_file,
+                _get_code_fingerprint(),
+                ]).encode("utf-8")).hexdigest())
+
+
+def get_reusable_unit_results(repo, course_file, events_file, validate_sha):
+    """Return a dictionary mapping unit keys to :class:`ValidationUnitResult`
+    instances from the last successful validation of this repository that
+    remain valid for *validate_sha*, as determined by a tree diff between the
+    two commits.
+    """
+
+    if not isinstance(validate_sha, six.binary_type):
+        # not a real repository (e.g. offline validation)
+        return {}
+
+    import django.core.cache as cache
+    def_cache = cache.caches["default"]
+
+    prev_state = def_cache.get(
+            _get_validation_cache_key(repo, course_file, events_file))
+    if prev_state is None:
+        return {}
+
+    prev_sha, prev_units = prev_state
+
+    if prev_sha == validate_sha:
+        return prev_units
+
+    from course.content import get_changed_repo_paths
+    try:
+        changed_paths = get_changed_repo_paths(repo, prev_sha, validate_sha)
+    except KeyError:
+        # previously validated commit is gone
+        return {}
+
+    return dict(
+            (unit_key, result)
+            for unit_key, result in six.iteritems(prev_units)
+            if not (result.dependencies & changed_paths))
+
+
+def save_unit_results(repo, course_file, events_file, validate_sha, units):
+    if not isinstance(validate_sha, six.binary_type):
+        return
+
+    import django.core.cache as cache
+    def_cache = cache.caches["default"]
+
+    def_cache.set(
+            _get_validation_cache_key(repo, course_file, events_file),
+            (validate_sha, units), None)
+
+# }}}
+
+
+def _validate_course_desc_unit(uvctx, course_file):
+    course_desc = get_yaml_from_repo_safely(uvctx.repo, course_file,
+            commit_sha=uvctx.commit_sha)
+
+    validate_staticpage_desc(uvctx, course_file, course_desc)
+
+
+def _validate_events_unit(uvctx, events_file):
     try:
         from course.content import get_yaml_from_repo
-        events_desc = get_yaml_from_repo(repo, events_file,
-                commit_sha=validate_sha, cached=False)
+        events_desc = get_yaml_from_repo(uvctx.repo, events_file,
+                commit_sha=uvctx.commit_sha, cached=False)
     except ObjectDoesNotExist:
         if events_file != "events.yml":
-            vctx.add_warning(
+            uvctx.add_warning(
                     _("Events file"),
                     _("Your course repository does not have an events "
                         "file named '%s'.")
@@ -1197,38 +1388,304 @@ def validate_course_content(repo, course_file, events_file,
             # That's OK--no calendar info.
             pass
     else:
-        validate_calendar_desc_struct(vctx, events_file, events_desc)
+        validate_calendar_desc_struct(uvctx, events_file, events_desc)
 
-    check_attributes_yml(
-            vctx, repo, "", get_repo_blob(repo, "", validate_sha))
 
-    try:
-        flows_tree = get_repo_blob(repo, "media", validate_sha)
-    except ObjectDoesNotExist:
-        # That's great--no media directory.
-        pass
+def _validate_flow_unit(uvctx, location):
+    flow_desc = get_yaml_from_repo_safely(uvctx.repo, location,
+            commit_sha=uvctx.commit_sha)
+
+    validate_flow_desc(uvctx, location, flow_desc)
+
+    flow_grade_identifier = None
+    if hasattr(flow_desc, "rules"):
+        flow_grade_identifier = getattr(
+                flow_desc.rules, "grade_identifier", None)
+
+    from course.content import normalize_flow_desc
+    n_flow_desc = normalize_flow_desc(flow_desc)
+
+    return {
+            "grade_identifier": flow_grade_identifier,
+            "page_types": [
+                (grp.id, page_desc.id, page_desc.type)
+                for grp in n_flow_desc.groups
+                for page_desc in grp.pages],
+            }
+
+
+def _validate_staticpage_unit(uvctx, location):
+    page_desc = get_yaml_from_repo_safely(uvctx.repo, location,
+            commit_sha=uvctx.commit_sha)
+
+    validate_staticpage_desc(uvctx, location, page_desc)
+
+
+UNIT_VALIDATORS = {
+        "course": _validate_course_desc_unit,
+        "events": _validate_events_unit,
+        "flow": _validate_flow_unit,
+        "staticpage": _validate_staticpage_unit,
+        }
+
+
+# {{{ parallel validation
+
+PARALLEL_VALIDATION_MIN_UNITS = 16
+
+# as a number of processes: as many as there are CPUs, if there are at least
+# PARALLEL_VALIDATION_MIN_UNITS units to validate
+VALIDATION_PROCESSES_AUTO = 0
+
+# seconds, for all units validated in worker processes
+PARALLEL_VALIDATION_TIMEOUT = 10*60
+
+
+def _get_validation_process_count(processes, nunits):
+    if processes is None:
+        from django.conf import settings
+        processes = getattr(settings, "RELATE_VALIDATION_PROCESSES", 1)
+
+    if processes == VALIDATION_PROCESSES_AUTO:
+        if nunits < PARALLEL_VALIDATION_MIN_UNITS:
+            return 1
+
+        import multiprocessing
+        processes = multiprocessing.cpu_count()
+
+    return max(1, min(processes, nunits))
+
+
+def _get_repo_spec(repo):
+    """Return a picklable description of *repo* from which
+    :func:`_open_repo_from_spec` can reopen it in another process.
+    """
+
+    from course.content import get_true_repo_and_path
+    true_repo, subdir = get_true_repo_and_path(repo, "")
+
+    if isinstance(true_repo, FileSystemFakeRepo):
+        return ("filesystem", true_repo.root, None)
     else:
-        vctx.add_warning(
-                'media/', _(
-                    "Your course repository has a 'media/' directory. "
-                    "Linking to media files using 'media:' is discouraged. "
-                    "Use the 'repo:' and 'repocur:' linkng schemes instead."))
+        return ("git", true_repo.path, subdir)
+
+
+def _open_repo_from_spec(repo_spec):
+    kind, path, subdir = repo_spec
+
+    if kind == "filesystem":
+        return FileSystemFakeRepo(path)
+
+    from dulwich.repo import Repo
+    repo = Repo(path)
+
+    if subdir:
+        from course.content import SubdirRepoWrapper
+        repo = SubdirRepoWrapper(repo, subdir)
+
+    return repo
+
+
+def _init_validation_worker():
+    import os
+    import django
+    from django.conf import settings
+
+    if not os.environ.get("DJANGO_SETTINGS_MODULE") and not settings.configured:
+        # offline validation
+        settings.configure(DEBUG=True)
 
-    # {{{ flows
+    django.setup()
+
+
+def _validate_unit_in_worker(repo_spec, commit_sha, unit_kind, path):
+    repo = _open_repo_from_spec(repo_spec)
+    if commit_sha is None:
+        commit_sha = repo
 
     try:
-        flows_tree = get_repo_blob(repo, "flows", validate_sha)
-    except ObjectDoesNotExist:
-        # That's OK--no flows yet.
-        pass
-    else:
-        used_grade_identifiers = set()
+        return validate_unit(repo, commit_sha, unit_kind, path)
+    except ValidationError as e:
+        # make sure the message survives the trip back
+        raise ValidationError(six.text_type(e))
+    finally:
+        repo.close()
+
+
+class _ValidationWorkerPool(object):
+    """Validates units in worker processes. Workers are started with
+    a fresh interpreter (rather than forked) so that they do not share
+    database or cache connections with the parent.
+    """
+
+    def __init__(self, repo, commit_sha, processes):
+        import multiprocessing
+        self.pool = multiprocessing.get_context("spawn").Pool(
+                processes, initializer=_init_validation_worker)
+
+        from time import time
+        self.deadline = time() + PARALLEL_VALIDATION_TIMEOUT
+
+        self.repo_spec = _get_repo_spec(repo)
+        if isinstance(commit_sha, six.binary_type):
+            self.commit_sha = commit_sha
+        else:
+            # The file system fake repository is its own 'commit'.
+            self.commit_sha = None
+
+    def submit(self, unit_kind, path):
+        async_result = self.pool.apply_async(
+                _validate_unit_in_worker,
+                (self.repo_spec, self.commit_sha, unit_kind, path))
+
+        def get_result():
+            import multiprocessing
+            from time import time
+
+            try:
+                return async_result.get(max(0, self.deadline - time()))
+            except multiprocessing.TimeoutError:
+                raise RuntimeError(
+                        "timed out validating '%s' in a worker process" % path)
+
+        return get_result
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
+
+    def terminate(self):
+        self.pool.terminate()
+        self.pool.join()
+
+
+def _may_use_worker_processes():
+    if six.PY2:
+        return False
+
+    import multiprocessing
+    # e.g. Celery's worker processes may not have children.
+    return not multiprocessing.current_process().daemon
+
+# }}}
+
+
+def validate_course_content(repo, course_file, events_file,
+        validate_sha, course=None, processes=None):
+    """Validate the course content in *repo* at *validate_sha*.
+
+    Each file (course page, events, flows and static pages) is validated
+    as a separate unit. Results of units that neither the file itself nor
+    any file it pulls in changed since the last successful validation of
+    the same repository are reused. Checks that depend on the database are
+    always carried out.
+
+    Units are validated in *processes* worker processes (by default,
+    :data:`RELATE_VALIDATION_PROCESSES`, which defaults to 1, i.e. no worker
+    processes). :data:`VALIDATION_PROCESSES_AUTO` uses as many processes as
+    there are CPUs if enough units need validating. Warnings and errors are
+    reported in the same order as for sequential validation.
+    """
+
+    vctx = ValidationContext(
+            repo=repo,
+            commit_sha=validate_sha,
+            course=course)
+
+    # {{{ find units
+
+    def list_yml_files(dir_name):
+        try:
+            entries = list_repo_directory(repo, dir_name, validate_sha)
+        except ObjectDoesNotExist:
+            # That's OK--no flows/pages yet.
+            return []
+
+        return [entry_path
+                for entry_path, entry_mode, entry_sha in entries
+                if entry_path.endswith(".yml")]
+
+    flow_entry_paths = list_yml_files("flows")
+    page_entry_paths = list_yml_files("staticpages")
+
+    unit_specs = (
+            [
+                ("course:"+course_file, "course", course_file),
+                ("events:"+events_file, "events", events_file),
+                ]
+            + [
+                ("flows/"+entry_path, "flow", "flows/"+entry_path)
+                for entry_path in flow_entry_paths]
+            + [
+                ("staticpages/"+entry_path, "staticpage",
+                    "staticpages/"+entry_path)
+                for entry_path in page_entry_paths])
+
+    # }}}
+
+    reusable_units = get_reusable_unit_results(
+            repo, course_file, events_file, validate_sha)
+
+    pending_unit_specs = [
+            (unit_key, unit_kind, path)
+            for unit_key, unit_kind, path in unit_specs
+            if unit_key not in reusable_units]
+
+    nprocesses = _get_validation_process_count(
+            processes, len(pending_unit_specs))
+
+    pool = None
+    submitted_units = {}
+    if nprocesses > 1 and _may_use_worker_processes():
+        pool = _ValidationWorkerPool(repo, validate_sha, nprocesses)
+        for unit_key, unit_kind, path in pending_unit_specs:
+            submitted_units[unit_key] = pool.submit(unit_kind, path)
+
+    units = {}
+
+    def process_unit(unit_key, unit_kind, path):
+        try:
+            result = reusable_units[unit_key]
+        except KeyError:
+            if unit_key in submitted_units:
+                result = submitted_units[unit_key]()
+            else:
+                result = validate_unit(repo, validate_sha, unit_kind, path)
+
+        units[unit_key] = result
+
+        for location, text in result.warnings:
+            vctx.add_warning(location, text)
+        if course is not None:
+            for location, datespec in result.datespecs:
+                vctx.encounter_datespec(location, datespec)
 
-        for entry in flows_tree.items():
-            entry_path = entry.path.decode("utf-8")
-            if not entry_path.endswith(".yml"):
-                continue
+        return result
 
+    try:
+        process_unit("course:"+course_file, "course", course_file)
+        process_unit("events:"+events_file, "events", events_file)
+
+        check_attributes_yml(vctx, repo, "", validate_sha)
+
+        try:
+            get_repo_blob(repo, "media", validate_sha)
+        except ObjectDoesNotExist:
+            # That's great--no media directory.
+            pass
+        else:
+            vctx.add_warning(
+                    'media/', _(
+                        "Your course repository has a 'media/' directory. "
+                        "Linking to media files using 'media:' is discouraged. "
+                        "Use the 'repo:' and 'repocur:' linkng schemes instead."))
+
+        # {{{ flows
+
+        used_grade_identifiers = set()
+        flows_page_types = []
+
+        for entry_path in flow_entry_paths:
             from course.constants import FLOW_ID_REGEX
             flow_id = entry_path[:-4]
             match = re.match("^"+FLOW_ID_REGEX+"$", flow_id)
@@ -1242,17 +1699,11 @@ def validate_course_content(repo, course_file, events_file,
                         % entry_path)
 
             location = "flows/%s" % entry_path
-            flow_desc = get_yaml_from_repo_safely(repo, location,
-                    commit_sha=validate_sha)
-
-            validate_flow_desc(vctx, location, flow_desc)
+            flow_result = process_unit(location, "flow", location)
 
             # {{{ check grade_identifier
 
-            flow_grade_identifier = None
-            if hasattr(flow_desc, "rules"):
-                flow_grade_identifier = getattr(
-                        flow_desc.rules, "grade_identifier", None)
+            flow_grade_identifier = flow_result.grade_identifier
 
             if (
                     flow_grade_identifier is not None
@@ -1273,25 +1724,17 @@ def validate_course_content(repo, course_file, events_file,
 
             # }}}
 
-            if course is not None:
-                check_for_page_type_changes(
-                        vctx, location, course, flow_id, flow_desc)
+            flows_page_types.append(
+                    (location, flow_id, flow_result.page_types))
 
-    # }}}
+        if course is not None:
+            check_for_page_type_changes(vctx, course, flows_page_types)
 
-    # {{{ static pages
+        # }}}
 
-    try:
-        pages_tree = get_repo_blob(repo, "staticpages", validate_sha)
-    except ObjectDoesNotExist:
-        # That's OK--no flows yet.
-        pass
-    else:
-        for entry in pages_tree.items():
-            entry_path = entry.path.decode("utf-8")
-            if not entry_path.endswith(".yml"):
-                continue
+        # {{{ static pages
 
+        for entry_path in page_entry_paths:
             from course.constants import STATICPAGE_PATH_REGEX
             page_name = entry_path[:-4]
             match = re.match("^"+STATICPAGE_PATH_REGEX+"$", page_name)
@@ -1306,13 +1749,21 @@ def validate_course_content(repo, course_file, events_file,
                                 ))
                         % entry_path)
 
-        location = "staticpages/%s" % entry_path
-        page_desc = get_yaml_from_repo_safely(repo, location,
-                commit_sha=validate_sha)
+            location = "staticpages/%s" % entry_path
+            process_unit(location, "staticpage", location)
 
-        validate_staticpage_desc(vctx, location, page_desc)
+        # }}}
 
-    # }}}
+    except:
+        if pool is not None:
+            pool.terminate()
+        raise
+
+    else:
+        if pool is not None:
+            pool.close()
+
+    save_unit_results(repo, course_file, events_file, validate_sha, units)
 
     return vctx.warnings
 
@@ -1327,6 +1778,9 @@ class FileSystemFakeRepo(object):
     def controldir(self):
         return self.root
 
+    def close(self):
+        pass
+
     def __getitem__(self, sha):
         return sha
 
@@ -1342,9 +1796,10 @@ class FileSystemFakeRepo(object):
 
 
 class FileSystemFakeRepoTreeEntry(object):
-    def __init__(self, path, mode):
+    def __init__(self, path, mode, sha):
         self.path = path
         self.mode = mode
+        self.sha = sha
 
 
 class FileSystemFakeRepoTree(object):
@@ -1373,7 +1828,8 @@ class FileSystemFakeRepoTree(object):
         return [
                 FileSystemFakeRepoTreeEntry(
                     path=n,
-                    mode=os.stat(os.path.join(self.root, n)).st_mode)
+                    mode=os.stat(os.path.join(self.root, n)).st_mode,
+                    sha=self[n][1])
                 for n in os.listdir(self.root)]
 
 
@@ -1388,12 +1844,13 @@ class FileSystemFakeRepoFile(object):
 
 
 def validate_course_on_filesystem(
-        root, course_file, events_file):
+        root, course_file, events_file, processes=None):
     fake_repo = FileSystemFakeRepo(root.encode("utf-8"))
     warnings = validate_course_content(
             fake_repo,
             course_file, events_file,
-            validate_sha=fake_repo, course=None)
+            validate_sha=fake_repo, course=None,
+            processes=processes)
 
     if warnings:
         print(_("WARNINGS: "))
@@ -24,6 +24,7 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 THE SOFTWARE.
 """
 
+import re
 import six
 
 from django.shortcuts import (  # noqa
@@ -158,6 +159,81 @@ def get_dulwich_client_and_remote_path_from_course(course):
     return client, remote_path
 
 
+# {{{ fetching
+
+GIT_PROGRESS_RE = re.compile(
+        r"^(?P<what>[^:]+):\s+(?:[0-9]+%\s+)?"
+        r"\((?P<current>[0-9]+)/(?P<total>[0-9]+)\)")
+
+
+class GitProgressReporter(object):
+    """Parses the progress messages sent by a git server during a fetch
+    (e.g. ``Receiving objects:  45% (450/1000)``) and passes them on to
+    *report_func(current, total, message)* at most every *min_interval*
+    seconds.
+    """
+
+    def __init__(self, report_func, min_interval=0.5):
+        self.report_func = report_func
+        self.min_interval = min_interval
+        self.last_report_time = None
+        self.buffer = ""
+
+    def __call__(self, data):
+        if isinstance(data, six.binary_type):
+            data = data.decode("utf-8", errors="replace")
+
+        self.buffer += data.replace("\r", "\n")
+        lines = self.buffer.split("\n")
+        self.buffer = lines.pop()
+
+        for line in reversed(lines):
+            match = GIT_PROGRESS_RE.match(line.strip())
+            if match is not None:
+                break
+        else:
+            return
+
+        from time import time
+        now_time = time()
+        if (self.last_report_time is not None
+                and now_time - self.last_report_time < self.min_interval):
+            return
+
+        self.last_report_time = now_time
+        self.report_func(
+                int(match.group("current")), int(match.group("total")),
+                line.strip())
+
+
+def fetch_from_course_remote(course, repo, progress=None, depth=None):
+    """Fetch from the course's *git_source* into *repo*. Objects already
+    present in *repo* are not transferred again.
+
+    :arg depth: If not *None*, ask for a shallow fetch with this depth. If
+        the remote does not support shallow fetches, a full fetch is done
+        instead.
+    :returns: the remote refs.
+    """
+
+    client, remote_path = \
+        get_dulwich_client_and_remote_path_from_course(course)
+
+    if depth is not None:
+        from dulwich.errors import GitProtocolError
+        try:
+            return client.fetch(remote_path, repo, progress=progress, depth=depth)
+        except GitProtocolError:
+            # Most likely, the server lacks the 'shallow' capability.
+            # Objects received so far have been discarded. Try again
+            # without.
+            pass
+
+    return client.fetch(remote_path, repo, progress=progress)
+
+# }}}
+
+
 # {{{ new course setup
 
 class CourseCreationForm(StyledModelForm):
@@ -199,6 +275,114 @@ class CourseCreationForm(StyledModelForm):
         return self.cleaned_data["git_source"]
 
 
+def create_course_from_remote(new_course, creator, progress=None):
+    """Fetch the content of (unsaved) *new_course* from its *git_source*,
+    validate it, and save the course with *creator* as its first
+    instructor.
+
+    The repository is first fetched into a temporary directory next to its
+    final location and only moved into place once it has been validated.
+    An interrupted creation thus never leaves a half-populated course
+    repository behind.
+    """
+
+    from course.content import get_course_repo_path
+    repo_path = get_course_repo_path(new_course)
+
+    import os
+    if os.path.exists(repo_path):
+        raise RuntimeError(
+                _("Repository directory '%s' already exists.") % repo_path)
+
+    from uuid import uuid4
+    tmp_repo_path = os.path.join(
+            os.path.dirname(repo_path),
+            ".%s.tmp-%s" % (os.path.basename(repo_path), uuid4().hex))
+
+    os.makedirs(tmp_repo_path)
+
+    moved = False
+    repo = None
+
+    try:
+        from dulwich.repo import Repo
+        repo = Repo.init(tmp_repo_path)
+
+        from django.conf import settings
+        remote_refs = fetch_from_course_remote(new_course, repo,
+                progress=progress,
+                depth=settings.RELATE_COURSE_FETCH_DEPTH)
+
+        if remote_refs is None or b"HEAD" not in remote_refs:
+            raise RuntimeError(_("No refs found in remote repository"
+                    " (i.e. no master branch, no HEAD). "
+                    "This looks very much like a blank repository. "
+                    "Please create course.yml in the remote "
+                    "repository before creating your course."))
+
+        transfer_remote_refs(repo, remote_refs)
+        new_sha = repo[b"HEAD"] = remote_refs[b"HEAD"]
+        update_commit_graph(repo)
+
+        vrepo = repo
+        if new_course.course_root_path:
+            from course.content import SubdirRepoWrapper
+            vrepo = SubdirRepoWrapper(
+                    vrepo, new_course.course_root_path)
+
+        from course.validation import validate_course_content
+        validate_course_content(
+                vrepo, new_course.course_file,
+                new_course.events_file, new_sha)
+
+        del vrepo
+        repo.close()
+        repo = None
+
+        os.rename(tmp_repo_path, repo_path)
+        moved = True
+
+        with transaction.atomic():
+            new_course.active_git_commit_sha = new_sha.decode()
+            new_course.save()
+
+            # {{{ set up a participation for the course creator
+
+            part = Participation()
+            part.user = creator
+            part.course = new_course
+            part.role = participation_role.instructor
+            part.status = participation_status.active
+            part.save()
+
+            # }}}
+
+    except:
+        # Work around read-only files on Windows.
+        # https://docs.python.org/3.5/library/shutil.html#rmtree-example
+
+        import stat
+        import shutil
+
+        # Make sure files opened for 'repo' above are actually closed.
+        if repo is not None:  # noqa
+            repo.close()  # noqa
+
+        def remove_readonly(func, path, _):  # noqa
+            "Clear the readonly bit and reattempt the removal"
+            os.chmod(path, stat.S_IWRITE)
+            func(path)
+
+        try:
+            shutil.rmtree(repo_path if moved else tmp_repo_path,
+                    onerror=remove_readonly)
+        except OSError:
+            from traceback import print_exc
+            print_exc()
+
+        raise
+
+
 @login_required
 def set_up_new_course(request):
     if not request.user.is_staff:
@@ -210,110 +394,10 @@ def set_up_new_course(request):
         if form.is_valid():
             new_course = form.save(commit=False)
 
-            from course.content import get_course_repo_path
-            repo_path = get_course_repo_path(new_course)
-
-            try:
-                import os
-                os.makedirs(repo_path)
-
-                repo = None
+            from course.tasks import create_course
+            async_res = create_course.delay(new_course, request.user.id)
 
-                try:
-                    with transaction.atomic():
-                        from dulwich.repo import Repo
-                        repo = Repo.init(repo_path)
-
-                        client, remote_path = \
-                            get_dulwich_client_and_remote_path_from_course(
-                                    new_course)
-
-                        remote_refs = client.fetch(remote_path, repo)
-                        if remote_refs is None:
-                            raise RuntimeError(_("No refs found in remote repository"
-                                    " (i.e. no master branch, no HEAD). "
-                                    "This looks very much like a blank repository. "
-                                    "Please create course.yml in the remote "
-                                    "repository before creating your course."))
-
-                        transfer_remote_refs(repo, remote_refs)
-                        new_sha = repo[b"HEAD"] = remote_refs[b"HEAD"]
-
-                        vrepo = repo
-                        if new_course.course_root_path:
-                            from course.content import SubdirRepoWrapper
-                            vrepo = SubdirRepoWrapper(
-                                    vrepo, new_course.course_root_path)
-
-                        from course.validation import validate_course_content
-                        validate_course_content(
-                                vrepo, new_course.course_file,
-                                new_course.events_file, new_sha)
-
-                        del repo
-                        del vrepo
-
-                        new_course.active_git_commit_sha = new_sha.decode()
-                        new_course.save()
-
-                        # {{{ set up a participation for the course creator
-
-                        part = Participation()
-                        part.user = request.user
-                        part.course = new_course
-                        part.role = participation_role.instructor
-                        part.status = participation_status.active
-                        part.save()
-
-                        # }}}
-
-                        messages.add_message(request, messages.INFO,
-                                _("Course content validated, creation "
-                                "succeeded."))
-                except:
-                    # Don't coalesce this handler with the one below. We only want
-                    # to delete the directory if we created it. Trust me.
-
-                    # Work around read-only files on Windows.
-                    # https://docs.python.org/3.5/library/shutil.html#rmtree-example
-
-                    import os
-                    import stat
-                    import shutil
-
-                    # Make sure files opened for 'repo' above are actually closed.
-                    if repo is not None:  # noqa
-                        repo.close()  # noqa
-
-                    def remove_readonly(func, path, _):  # noqa
-                        "Clear the readonly bit and reattempt the removal"
-                        os.chmod(path, stat.S_IWRITE)
-                        func(path)
-
-                    try:
-                        shutil.rmtree(repo_path, onerror=remove_readonly)
-                    except OSError:
-                        messages.add_message(request, messages.WARNING,
-                                ugettext("Failed to delete unused "
-                                "repository directory '%s'.")
-                                % repo_path)
-
-                    raise
-
-            except Exception as e:
-                from traceback import print_exc
-                print_exc()
-
-                messages.add_message(request, messages.ERROR,
-                        string_concat(
-                            _("Course creation failed"),
-                            ": %(err_type)s: %(err_str)s")
-                        % {"err_type": type(e).__name__,
-                            "err_str": str(e)})
-            else:
-                return redirect(
-                        "relate-course_page",
-                        new_course.identifier)
+            return redirect("relate-monitor_task", async_res.id)
 
     else:
         form = CourseCreationForm()
@@ -328,51 +412,264 @@ def set_up_new_course(request):
 
 # {{{ update
 
-def is_parent_commit(repo, potential_parent, child, max_history_check_size=None):
-    queue = [repo[parent] for parent in child.parents]
+# {{{ commit graph
+
+COMMIT_GRAPH_FILE_NAME = "relate-commit-graph"
+COMMIT_GRAPH_VERSION = 2
+
+
+class CommitGraph(object):
+    """An index of the commits in a repository, mapping each commit's SHA
+    to a tuple *(generation, parent_shas, missing_parent_shas)*. Root commits
+    (including commits whose parents are missing because of a shallow fetch)
+    have generation 1, every other commit is one generation above its highest
+    parent. *missing_parent_shas* are the parents that were not in the
+    repository when the commit was added. Once they arrive, the commit and
+    its descendants are added anew.
+    """
+
+    def __init__(self, commits=None):
+        if commits is None:
+            commits = {}
+        self.commits = commits
+
+        self.incomplete = set(
+                sha for sha, entry in six.iteritems(commits)
+                if entry[2])
+
+    def _drop_completed(self, repo):
+        """Remove the commits whose missing parents are now in *repo*, along
+        with their descendants, whose generations depend on them.
+
+        :returns: the SHAs of the removed commits.
+        """
+
+        stale = set(
+                sha for sha in self.incomplete
+                if any(parent in repo for parent in self.commits[sha][2]))
+        if not stale:
+            return stale
+
+        children = {}
+        for sha, entry in six.iteritems(self.commits):
+            for parent in entry[1]:
+                children.setdefault(parent, []).append(sha)
+
+        stack = list(stale)
+        while stack:
+            for child in children.get(stack.pop(), ()):
+                if child not in stale:
+                    stale.add(child)
+                    stack.append(child)
+
+        for sha in stale:
+            del self.commits[sha]
+            self.incomplete.discard(sha)
+
+        return stale
+
+    def update(self, repo, shas):
+        """Add the commits reachable from *shas* to the graph.
+
+        :returns: *True* if the graph changed.
+        """
+
+        from dulwich.objects import Commit
+
+        dropped = self._drop_completed(repo)
+        changed = bool(dropped)
 
-    while queue:
-        entry = queue.pop()
-        if entry == potential_parent:
+        # commits whose parents are not yet in the graph, mapped to
+        # their parents and missing parents
+        pending = {}
+
+        stack = [sha for sha in list(shas) + list(dropped)
+                if sha not in self.commits]
+        while stack:
+            sha = stack[-1]
+            if sha in self.commits:
+                stack.pop()
+                continue
+
+            parents_info = pending.get(sha)
+            if parents_info is None:
+                try:
+                    obj = repo[sha]
+                except KeyError:
+                    obj = None
+                if not isinstance(obj, Commit):
+                    stack.pop()
+                    continue
+
+                parents_info = pending[sha] = (
+                        tuple(parent for parent in obj.parents
+                            if parent in repo),
+                        tuple(parent for parent in obj.parents
+                            if parent not in repo))
+
+            parents, missing_parents = parents_info
+
+            unadded_parents = [
+                    parent for parent in parents if parent not in self.commits]
+            if unadded_parents:
+                stack.extend(unadded_parents)
+                continue
+
+            stack.pop()
+            del pending[sha]
+            self.commits[sha] = (
+                    1 + max([self.commits[parent][0] for parent in parents]
+                        + [0]),
+                    parents,
+                    missing_parents)
+            if missing_parents:
+                self.incomplete.add(sha)
+            changed = True
+
+        return changed
+
+    def is_ancestor(self, ancestor, descendant):
+        """
+        :returns: *True* if the commit *ancestor* is reachable from (or
+            equal to) *descendant*. Both must be in the graph.
+        """
+
+        if ancestor == descendant:
             return True
 
-        if max_history_check_size is not None:
-            max_history_check_size -= 1
+        ancestor_generation = self.commits[ancestor][0]
+
+        # Commits with a generation no higher than the ancestor's cannot
+        # have it as an ancestor, so do not look past them.
+        seen = set()
+        queue = [descendant]
+        while queue:
+            sha = queue.pop()
+            for parent in self.commits[sha][1]:
+                if parent == ancestor:
+                    return True
+                if (parent not in seen
+                        and self.commits[parent][0] > ancestor_generation):
+                    seen.add(parent)
+                    queue.append(parent)
+
+        return False
+
+
+# maps repository control directories to CommitGraph instances
+_commit_graph_cache = {}
+
+
+def _get_commit_graph_path(repo):
+    import os
+    return os.path.join(repo.controldir(), COMMIT_GRAPH_FILE_NAME)
+
+
+def _load_commit_graph(repo):
+    from six.moves import cPickle as pickle
+
+    try:
+        with open(_get_commit_graph_path(repo), "rb") as inf:
+            data = pickle.load(inf)
+    except Exception:
+        # missing, unreadable, or from another Python version
+        return CommitGraph()
+
+    if data.get("version") != COMMIT_GRAPH_VERSION:
+        return CommitGraph()
+
+    return CommitGraph(data["commits"])
+
+
+def _save_commit_graph(repo, graph):
+    import os
+    from six.moves import cPickle as pickle
+
+    graph_path = _get_commit_graph_path(repo)
+    tmp_path = "%s.tmp-%d" % (graph_path, os.getpid())
+    try:
+        with open(tmp_path, "wb") as outf:
+            pickle.dump(
+                    {"version": COMMIT_GRAPH_VERSION, "commits": graph.commits},
+                    outf, protocol=2)
+        os.rename(tmp_path, graph_path)
+    except (IOError, OSError):
+        # The graph is only a cache. It will be rebuilt the next time.
+        pass
 
-            if max_history_check_size == 0:
-                return False
 
-        queue.extend(repo[parent] for parent in entry.parents)
+def update_commit_graph(repo, shas=None):
+    """Return the :class:`CommitGraph` of the dulwich repository *repo*,
+    making sure it contains the commits reachable from *shas* (default:
+    all refs). The graph is kept in memory and stored in the repository's
+    control directory.
+    """
 
-    return False
+    if shas is None:
+        shas = list(repo.get_refs().values())
+
+    controldir = repo.controldir()
+    graph = _commit_graph_cache.get(controldir)
+    if graph is None:
+        graph = _commit_graph_cache[controldir] = _load_commit_graph(repo)
+
+    if graph.update(repo, shas):
+        _save_commit_graph(repo, graph)
+
+    return graph
+
+
+def is_parent_commit(repo, potential_parent, child, max_history_check_size=None):
+    """
+    :returns: *True* if *potential_parent* is a (possibly indirect) parent
+        commit of *child*.
+
+    *max_history_check_size* is ignored. It is accepted for backward
+    compatibility only, since the check is now exact.
+    """
+
+    if potential_parent.id == child.id:
+        return False
+
+    graph = update_commit_graph(repo, [potential_parent.id, child.id])
+    return graph.is_ancestor(potential_parent.id, child.id)
+
+# }}}
 
 
 def run_course_update_command(
-        request, repo, content_repo, pctx, command, new_sha, may_update,
-        prevent_discarding_revisions):
+        add_message, repo, content_repo, course, participation, command,
+        new_sha, may_update, prevent_discarding_revisions,
+        fetch_progress=None):
+    """
+    :arg add_message: a function *add_message(level, text)*, with *level*
+        one of the constants in :mod:`django.contrib.messages`.
+    """
+
     if command.startswith("fetch"):
         if command != "fetch":
             command = command[6:]
 
-        if not pctx.course.git_source:
+        if not course.git_source:
             raise RuntimeError(_("no git source URL specified"))
 
-        client, remote_path = \
-            get_dulwich_client_and_remote_path_from_course(pctx.course)
+        remote_refs = fetch_from_course_remote(course, repo,
+                progress=fetch_progress)
+        update_commit_graph(repo, list(remote_refs.values()))
 
-        remote_refs = client.fetch(remote_path, repo)
-        transfer_remote_refs(repo, remote_refs)
         remote_head = remote_refs[b"HEAD"]
         if (
                 prevent_discarding_revisions
                 and
-                is_parent_commit(repo, repo[remote_head], repo[b"HEAD"],
-                    max_history_check_size=20)):
+                is_parent_commit(repo, repo[remote_head], repo[b"HEAD"])):
             raise RuntimeError(_("fetch would discard commits, refusing"))
 
+        # Only touch refs once the fetch has completed, so that an interrupted
+        # fetch leaves the repository as it was.
+        transfer_remote_refs(repo, remote_refs)
         repo[b"HEAD"] = remote_head
 
-        messages.add_message(request, messages.SUCCESS, _("Fetch successful."))
+        add_message(messages.SUCCESS, _("Fetch successful."))
 
         new_sha = remote_head
 
@@ -380,11 +677,10 @@ def run_course_update_command(
         return
 
     if command == "end_preview":
-        pctx.participation.preview_git_commit_sha = None
-        pctx.participation.save()
+        participation.preview_git_commit_sha = None
+        participation.save()
 
-        messages.add_message(request, messages.INFO,
-                _("Preview ended."))
+        add_message(messages.INFO, _("Preview ended."))
 
         return
 
@@ -393,20 +689,20 @@ def run_course_update_command(
     from course.validation import validate_course_content, ValidationError
     try:
         warnings = validate_course_content(
-                content_repo, pctx.course.course_file, pctx.course.events_file,
-                new_sha, course=pctx.course)
+                content_repo, course.course_file, course.events_file,
+                new_sha, course=course)
     except ValidationError as e:
-        messages.add_message(request, messages.ERROR,
+        add_message(messages.ERROR,
                 _("Course content did not validate successfully. (%s) "
                 "Update not applied.") % str(e))
         return
 
     else:
         if not warnings:
-            messages.add_message(request, messages.SUCCESS,
+            add_message(messages.SUCCESS,
                     _("Course content validated successfully."))
         else:
-            messages.add_message(request, messages.WARNING,
+            add_message(messages.WARNING,
                     string_concat(
                         _("Course content validated OK, with warnings: "),
                         "<ul>%s</ul>")
@@ -418,25 +714,31 @@ def run_course_update_command(
     # }}}
 
     if command == "preview":
-        messages.add_message(request, messages.INFO,
-                _("Preview activated."))
+        add_message(messages.INFO, _("Preview activated."))
 
-        pctx.participation.preview_git_commit_sha = new_sha.decode()
-        pctx.participation.save()
+        participation.preview_git_commit_sha = new_sha.decode()
+        participation.save()
 
     elif command == "update" and may_update:
-        pctx.course.active_git_commit_sha = new_sha.decode()
-        pctx.course.save()
+        course.active_git_commit_sha = new_sha.decode()
+        course.save()
+
+        from course.tasks import warm_up_course_caches
+        async_res = warm_up_course_caches.delay(course.id, new_sha)
 
-        if pctx.participation.preview_git_commit_sha is not None:
-            pctx.participation.preview_git_commit_sha = None
-            pctx.participation.save()
+        from django.core.urlresolvers import reverse
+        add_message(messages.INFO,
+                _("Content caches are being filled in the background "
+                    "(<a href='%s'>progress</a>).")
+                % reverse("relate-monitor_task", args=(async_res.id,)))
 
-            messages.add_message(request, messages.INFO,
-                    _("Preview ended."))
+        if participation.preview_git_commit_sha is not None:
+            participation.preview_git_commit_sha = None
+            participation.save()
 
-        messages.add_message(request, messages.SUCCESS,
-                _("Update applied. "))
+            add_message(messages.INFO, _("Preview ended."))
+
+        add_message(messages.SUCCESS, _("Update applied. "))
 
     else:
         raise RuntimeError(_("invalid command"))
@@ -447,7 +749,9 @@ class GitUpdateForm(StyledForm):
     def __init__(self, may_update, previewing, repo, *args, **kwargs):
         super(GitUpdateForm, self).__init__(*args, **kwargs)
 
-        repo_refs = repo.get_refs()
+        repo_refs = dict(
+                (ref, sha) for ref, sha in six.iteritems(repo.get_refs())
+                if not ref.startswith(KEEP_REF_PREFIX))
         commit_iter = repo.get_walker(list(repo_refs.values()))
 
         def format_commit(commit):
@@ -563,13 +867,28 @@ def update_course(pctx):
 
         if form.is_valid():
             new_sha = form.cleaned_data["new_sha"].encode()
+            prevent_discarding_revisions = form.cleaned_data[
+                    "prevent_discarding_revisions"]
+
+            if command.startswith("fetch"):
+                # Fetching may take a long time. Do it in the background.
+                from course.tasks import update_course_content
+                async_res = update_course_content.delay(
+                        course.id,
+                        participation.id if participation is not None else None,
+                        command, new_sha, may_update,
+                        prevent_discarding_revisions)
+
+                return redirect("relate-monitor_task", async_res.id)
+
+            def add_message(level, text):
+                messages.add_message(request, level, text)
 
             try:
                 run_course_update_command(
-                        request, repo, content_repo, pctx, command, new_sha,
-                        may_update,
-                        prevent_discarding_revisions=form.cleaned_data[
-                            "prevent_discarding_revisions"])
+                        add_message, repo, content_repo, course, participation,
+                        command, new_sha, may_update,
+                        prevent_discarding_revisions=prevent_discarding_revisions)
             except Exception as e:
                 import traceback
                 traceback.print_exc()
@@ -652,4 +971,201 @@ def update_course(pctx):
 
 # }}}
 
+
+# {{{ repository maintenance
+
+KEEP_REF_PREFIX = b"refs/relate/keep/"
+
+
+def get_repo_object_counts(repo):
+    """
+    :returns: a tuple *(loose_object_count, pack_count)* for the dulwich
+        :class:`dulwich.repo.Repo` *repo*.
+    """
+
+    import os
+    objects_dir = repo.object_store.path
+
+    loose_object_count = 0
+    for subdir in os.listdir(objects_dir):
+        if len(subdir) != 2:
+            continue
+        loose_object_count += len(os.listdir(os.path.join(objects_dir, subdir)))
+
+    pack_count = len([
+        name for name in os.listdir(os.path.join(objects_dir, "pack"))
+        if name.endswith(".pack")])
+
+    return loose_object_count, pack_count
+
+
+def time_repo_object_lookups(repo_path, max_objects=200):
+    """Look up (up to *max_objects*) objects reachable from ``HEAD`` in a
+    freshly opened repository, i.e. with no pack indices loaded yet.
+
+    :returns: the average time per lookup in seconds, or *None* if the
+        repository has no ``HEAD``.
+    """
+
+    from dulwich.repo import Repo
+    repo = Repo(repo_path)
+    try:
+        try:
+            head = repo[b"HEAD"]
+        except KeyError:
+            return None
+
+        shas = [head.id, head.tree]
+        for entry in repo.object_store.iter_tree_contents(head.tree):
+            if len(shas) >= max_objects:
+                break
+            shas.append(entry.sha)
+    finally:
+        repo.close()
+
+    from time import time
+    repo = Repo(repo_path)
+    try:
+        start_time = time()
+        for sha in shas:
+            repo.object_store[sha]
+        return (time() - start_time) / len(shas)
+    finally:
+        repo.close()
+
+
+def keep_in_use_commits(repo, course):
+    """Make sure that commits in use by *course* (as the active commit or
+    as a preview) are reachable from a ref, so that they survive
+    repacking and garbage collection even if they have disappeared from
+    the remote.
+    """
+
+    in_use_shas = set(
+            Participation.objects
+            .filter(course=course, preview_git_commit_sha__isnull=False)
+            .values_list("preview_git_commit_sha", flat=True))
+    if course.active_git_commit_sha:
+        in_use_shas.add(course.active_git_commit_sha)
+
+    in_use_shas = set(sha.encode() for sha in in_use_shas if sha)
+
+    for ref in list(repo.get_refs().keys()):
+        if ref.startswith(KEEP_REF_PREFIX):
+            if _remove_prefix(KEEP_REF_PREFIX, ref) not in in_use_shas:
+                del repo[ref]
+
+    for sha in in_use_shas:
+        if sha in repo:
+            repo[KEEP_REF_PREFIX + sha] = sha
+
+
+def _run_git(repo, *args):
+    import subprocess
+    subprocess.check_call(
+            ["git", "--git-dir=%s" % repo.controldir()] + list(args))
+
+
+def maintain_course_repo(course, max_loose_objects, max_packs, force=False,
+        dry_run=False):
+    """Repack or garbage-collect the repository of *course* if it has
+    more than *max_loose_objects* loose objects or more than *max_packs*
+    packs.
+
+    :returns: a dictionary with keys ``action`` (one of ``"none"``,
+        ``"repack"``, ``"gc"``), ``before`` and ``after``. The latter
+        two are dictionaries with keys ``loose_objects``, ``packs`` and
+        ``lookup_time``.
+    """
+
+    from course.content import get_course_repo_path
+    repo_path = get_course_repo_path(course)
+
+    def get_stats():
+        from dulwich.repo import Repo
+        repo = Repo(repo_path)
+        try:
+            loose_objects, packs = get_repo_object_counts(repo)
+        finally:
+            repo.close()
+
+        return {
+                "loose_objects": loose_objects,
+                "packs": packs,
+                "lookup_time": time_repo_object_lookups(repo_path),
+                }
+
+    before = get_stats()
+
+    if force or before["loose_objects"] > max_loose_objects:
+        # also removes loose objects that are no longer reachable
+        action = "gc"
+    elif before["packs"] > max_packs:
+        action = "repack"
+    else:
+        action = "none"
+
+    if dry_run or action == "none":
+        return {"action": action, "before": before, "after": before}
+
+    from dulwich.repo import Repo
+    repo = Repo(repo_path)
+    try:
+        keep_in_use_commits(repo, course)
+
+        if action == "gc":
+            _run_git(repo, "gc", "--quiet")
+        else:
+            _run_git(repo, "repack", "-a", "-d", "-q")
+    finally:
+        repo.close()
+
+    return {"action": action, "before": before, "after": get_stats()}
+
+
+def maintain_and_record_course_repo(course, max_loose_objects, max_packs,
+        force=False, dry_run=False):
+    """Run :func:`maintain_course_repo` and, unless *dry_run*, store the
+    outcome as a :class:`course.models.CourseRepositoryMaintenance`.
+    Exceptions are caught, so that one broken repository does not keep the
+    others from being maintained.
+
+    :returns: a tuple *(result, error)*, where *result* is the return value
+        of :func:`maintain_course_repo` (or *None* on failure) and *error*
+        is a description of the failure (or *None*).
+    """
+
+    from course.models import CourseRepositoryMaintenance
+
+    try:
+        result = maintain_course_repo(course,
+                max_loose_objects=max_loose_objects,
+                max_packs=max_packs,
+                force=force,
+                dry_run=dry_run)
+    except Exception as e:
+        result = None
+        error = "%s: %s" % (type(e).__name__, str(e))
+    else:
+        error = None
+
+    if not dry_run:
+        record = CourseRepositoryMaintenance(course=course, error=error)
+        if result is not None:
+            before = result["before"]
+            after = result["after"]
+
+            record.action = result["action"]
+            record.loose_objects_before = before["loose_objects"]
+            record.loose_objects_after = after["loose_objects"]
+            record.packs_before = before["packs"]
+            record.packs_after = after["packs"]
+            record.lookup_time_before = before["lookup_time"]
+            record.lookup_time_after = after["lookup_time"]
+        record.save()
+
+    return result, error
+
+# }}}
+
 # vim: foldmethod=marker
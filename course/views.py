@@ -70,7 +70,9 @@ from course.models import (
         FlowRuleException)
 
 from course.content import get_course_repo
-from course.utils import course_view, render_course_page
+from course.utils import (
+        course_view, render_course_page,
+        get_request_course, get_request_course_commit_sha)
 
 
 NONE_SESSION_TAG = "<<<NONE>>>"  # noqa
@@ -78,13 +80,49 @@ NONE_SESSION_TAG = "<<<NONE>>>"  # noqa
 
 # {{{ home
 
+def get_listed_courses():
+    """Return a list of all listed courses, cached until a course is saved
+    or deleted (if the cache is shared between processes).
+    """
+
+    from course.caching import (
+            CACHE_MISS, get_cached_content, set_cached_content,
+            get_cache_generation, COURSES_GENERATION_NAME)
+
+    generation = get_cache_generation(COURSES_GENERATION_NAME)
+    if generation is None:
+        return list(Course.objects.filter(listed=True))
+
+    key_parts = (generation,)
+    result = get_cached_content("course_catalog", key_parts)
+    if result is CACHE_MISS:
+        result = list(Course.objects.filter(listed=True))
+        set_cached_content("course_catalog", key_parts, result)
+
+    return result
+
+
 def home(request):
     now_datetime = get_now_or_fake_time(request)
 
+    courses = get_listed_courses()
+
+    # roles only matter for hidden courses
+    course_id_to_role = {}
+    if (request.user.is_authenticated()
+            and any(course.hidden for course in courses)):
+        course_id_to_role = dict(
+                Participation.objects
+                .filter(
+                    user=request.user,
+                    status=participation_status.active)
+                .values_list("course_id", "role"))
+
     current_courses = []
     past_courses = []
-    for course in Course.objects.filter(listed=True):
-        role, participation = get_role_and_participation(request, course)
+    for course in courses:
+        role = course_id_to_role.get(
+                course.id, participation_role.unenrolled)
 
         show = True
         if course.hidden:
@@ -92,9 +130,6 @@ def home(request):
                     participation_role.instructor]:
                 show = False
 
-        if not course.listed:
-            show = False
-
         if show:
             if (course.end_date is None
                     or now_datetime.date() <= course.end_date):
@@ -144,7 +179,8 @@ def course_page(pctx):
     chunks = get_processed_page_chunks(
             pctx.course, pctx.repo, pctx.course_commit_sha, page_desc,
             pctx.role, get_now_or_fake_time(pctx.request),
-            facilities=pctx.request.relate_facilities)
+            facilities=pctx.request.relate_facilities,
+            page_path=pctx.course.course_file)
 
     show_enroll_button = (
             pctx.course.accepts_enrollment
@@ -196,16 +232,18 @@ def course_page(pctx):
 @course_view
 def static_page(pctx, page_path):
     from course.content import get_staticpage_desc, get_processed_page_chunks
+    page_file = "staticpages/"+page_path+".yml"
     try:
         page_desc = get_staticpage_desc(pctx.repo, pctx.course,
-                pctx.course_commit_sha, "staticpages/"+page_path+".yml")
+                pctx.course_commit_sha, page_file)
     except ObjectDoesNotExist:
         raise http.Http404()
 
     chunks = get_processed_page_chunks(
             pctx.course, pctx.repo, pctx.course_commit_sha, page_desc,
             pctx.role, get_now_or_fake_time(pctx.request),
-            facilities=pctx.request.relate_facilities)
+            facilities=pctx.request.relate_facilities,
+            page_path=page_file)
 
     return render_course_page(pctx, "course/static-page.html", {
         "chunks": chunks,
@@ -224,7 +262,7 @@ def media_etag_func(request, course_identifier, commit_sha, media_path):
 @cache_control(max_age=3600*24*31)  # cache for a month
 @http_dec.condition(etag_func=media_etag_func)
 def get_media(request, course_identifier, commit_sha, media_path):
-    course = get_object_or_404(Course, identifier=course_identifier)
+    course = get_request_course(request, course_identifier)
 
     role, participation = get_role_and_participation(request, course)
 
@@ -241,7 +279,7 @@ def repo_file_etag_func(request, course_identifier, commit_sha, path):
 def get_repo_file(request, course_identifier, commit_sha, path):
     commit_sha = commit_sha.encode()
 
-    course = get_object_or_404(Course, identifier=course_identifier)
+    course = get_request_course(request, course_identifier)
 
     role, participation = get_role_and_participation(request, course)
 
@@ -250,27 +288,25 @@ def get_repo_file(request, course_identifier, commit_sha, path):
 
 
 def current_repo_file_etag_func(request, course_identifier, path):
-    course = get_object_or_404(Course, identifier=course_identifier)
+    course = get_request_course(request, course_identifier)
     role, participation = get_role_and_participation(
             request, course)
 
     from course.views import check_course_state
     check_course_state(course, role)
 
-    from course.content import get_course_commit_sha
-    commit_sha = get_course_commit_sha(course, participation)
+    commit_sha = get_request_course_commit_sha(request, course, participation)
 
     return ":".join([course_identifier, commit_sha.decode(), path])
 
 
 @http_dec.condition(etag_func=current_repo_file_etag_func)
 def get_current_repo_file(request, course_identifier, path):
-    course = get_object_or_404(Course, identifier=course_identifier)
+    course = get_request_course(request, course_identifier)
     role, participation = get_role_and_participation(
             request, course)
 
-    from course.content import get_course_commit_sha
-    commit_sha = get_course_commit_sha(course, participation)
+    commit_sha = get_request_course_commit_sha(request, course, participation)
 
     return get_repo_file_backend(
             request, course, role, participation, commit_sha, path)
@@ -558,6 +594,14 @@ def manage_instant_flow_requests(pctx):
                             cancelled=False)
                         .order_by("start_time")
                         .update(cancelled=True))
+
+                # update() does not send post_save
+                from course.caching import (
+                        bump_cache_generation_on_commit,
+                        get_course_instant_flow_requests_generation_name)
+                bump_cache_generation_on_commit(
+                        get_course_instant_flow_requests_generation_name(
+                            pctx.course.id))
             else:
                 raise SuspiciousOperation(_("invalid operation"))
 
@@ -1199,14 +1243,19 @@ def monitor_task(request, task_id):
         if total > 0:
             progress_percent = 100 * (current / total)
 
-        progress_statement = (
-                _("%(current)d out of %(total)d items processed.")
-                % {"current": current, "total": total})
+        if "message" in meta:
+            progress_statement = meta["message"]
+        else:
+            progress_statement = (
+                    _("%(current)d out of %(total)d items processed.")
+                    % {"current": current, "total": total})
 
+    next_url = None
     if async_res.state == "SUCCESS":
-        if (isinstance(async_res.result, dict)
-                and "message" in async_res.result):
-            progress_statement = async_res.result["message"]
+        if isinstance(async_res.result, dict):
+            if "message" in async_res.result:
+                progress_statement = async_res.result["message"]
+            next_url = async_res.result.get("next_url")
 
     traceback = None
     if request.user.is_staff and async_res.state == "FAILURE":
@@ -1216,6 +1265,7 @@ def monitor_task(request, task_id):
         "state": async_res.state,
         "progress_percent": progress_percent,
         "progress_statement": progress_statement,
+        "next_url": next_url,
         "traceback": traceback,
         })
 
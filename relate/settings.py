@@ -64,6 +64,7 @@ MIDDLEWARE_CLASSES = (
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.auth.middleware.SessionAuthenticationMiddleware",
+    "course.utils.RequestLookupCacheMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
     "course.auth.ImpersonateMiddleware",
@@ -222,8 +223,38 @@ RELATE_FACILITIES = {}
 
 RELATE_TICKET_MINUTES_VALID_AFTER_USE = 0
 
+# largest repository file to be cached
 RELATE_CACHE_MAX_BYTES = 32768
 
+# size of the per-process content cache (0 to disable)
+RELATE_LOCAL_CACHE_MAX_BYTES = 16*1024*1024
+
+# largest cached content item to be placed in the shared ('default') cache
+RELATE_SHARED_CACHE_MAX_ITEM_BYTES = 512*1024
+
+# Worker processes used to validate course content. 1 validates in the
+# serving process, 0 uses all CPUs for large courses.
+RELATE_VALIDATION_PROCESSES = 1
+
+# None: fetch full history when creating a course
+RELATE_COURSE_FETCH_DEPTH = None
+
+# Course repositories with more loose objects or packs than this are
+# garbage-collected or repacked by the maintain_course_repos command and
+# the corresponding periodic task.
+RELATE_REPO_MAX_LOOSE_OBJECTS = 2000
+RELATE_REPO_MAX_PACKS = 20
+
+# If nonzero, flow page visits without an answer are buffered in each
+# process (up to this many) and saved in batches every
+# RELATE_PAGE_VISIT_FLUSH_INTERVAL seconds. 0 saves each visit right away.
+RELATE_PAGE_VISIT_BUFFER_SIZE = 0
+RELATE_PAGE_VISIT_FLUSH_INTERVAL = 2
+
+# The page visits and grades of courses that ended more than this many days
+# ago are moved to compressed archives by the archive_page_visits command.
+RELATE_PAGE_VISIT_ARCHIVE_RETENTION_DAYS = 2*365
+
 RELATE_ADMIN_EMAIL_LOCALE = "en_US"
 
 RELATE_EDITABLE_INST_ID_BEFORE_VERIFICATION = True
@@ -243,6 +274,15 @@ CELERY_TASK_SERIALIZER = 'pickle'
 CELERY_RESULT_SERIALIZER = 'pickle'
 CELERY_TRACK_STARTED = True
 
+if "CELERYBEAT_SCHEDULE" not in globals():
+    from datetime import timedelta
+    CELERYBEAT_SCHEDULE = {
+            "maintain-course-repositories": {
+                "task": "course.tasks.maintain_course_repositories",
+                "schedule": timedelta(days=1),
+                },
+            }
+
 if "CELERY_RESULT_BACKEND" not in globals():
     if ("CACHES" in globals()
             and "LocMem" not in CACHES["default"]["BACKEND"]  # noqa
@@ -184,6 +184,13 @@ urlpatterns = [
         "/$",
         course.grades.view_grades_by_opportunity,
         name="relate-view_grades_by_opportunity"),
+    url(r"^course"
+        "/" + COURSE_ID_REGEX +
+        "/grading/by-opportunity"
+        "/(?P<opp_id>[0-9]+)"
+        "/rows/$",
+        course.grades.view_grades_by_opportunity_rows,
+        name="relate-view_grades_by_opportunity_rows"),
     url(r"^course"
         "/" + COURSE_ID_REGEX +
         "/grading/single-grade"
@@ -301,6 +308,11 @@ urlpatterns = [
         "/calendar/$",
         course.calendar.view_calendar,
         name="relate-view_calendar"),
+    url(r"^course"
+        "/" + COURSE_ID_REGEX +
+        r"/calendar/events\.(?P<feed_format>json|ics)$",
+        course.calendar.get_calendar_feed,
+        name="relate-get_calendar_feed"),
 
     # }}}
 
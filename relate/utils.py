@@ -161,14 +161,86 @@ def format_datetime_local(datetime, format='DATETIME_FORMAT'):
 # {{{ dict_to_struct
 
 class Struct(object):
-    def __init__(self, entries):
-        for name, val in six.iteritems(entries):
-            self.__dict__[name] = val
+    """An immutable record with attribute access, as created from a YAML
+    mapping by :func:`dict_to_struct`.
 
-        self._field_names = list(six.iterkeys(entries))
+    Field values are stored in a tuple held by the instance. For each
+    distinct set of field names, a subclass is created (once per process)
+    that maps the field names to positions in that tuple, so instances
+    carry no per-instance ``__dict__``. Pickles only contain the field names
+    and the values.
+
+    Instances cannot be modified. Use :meth:`_replace` to obtain a modified
+    copy.
+    """
+
+    __slots__ = ("_values",)
+
+    _field_names = ()
+
+    def __new__(cls, entries):
+        field_names = tuple(entries)
+        return _make_struct(
+                field_names, tuple(entries[name] for name in field_names))
+
+    def __setattr__(self, name, value):
+        raise AttributeError(
+                "Struct is immutable, use _replace() to modify a copy")
+
+    __delattr__ = __setattr__
 
     def __repr__(self):
-        return repr(self.__dict__)
+        return repr(struct_to_dict(self))
+
+    def __reduce__(self):
+        return (_make_struct, (self._field_names, self._values))
+
+    def _replace(self, **changes):
+        """Return a copy of *self* with the fields in *changes* set (or
+        added).
+        """
+
+        entries = dict(zip(self._field_names, self._values))
+        field_names = self._field_names + tuple(
+                name for name in changes if name not in entries)
+        entries.update(changes)
+
+        return _make_struct(
+                field_names, tuple(entries[name] for name in field_names))
+
+
+# maps tuples of field names to subclasses of Struct
+_struct_classes = {}
+
+
+def _make_field_getter(i):
+    def get_field(self):
+        return self._values[i]
+
+    return get_field
+
+
+def _get_struct_class(field_names):
+    try:
+        return _struct_classes[field_names]
+    except KeyError:
+        pass
+
+    class_dict = {"__slots__": (), "_field_names": field_names}
+    for i, name in enumerate(field_names):
+        if (isinstance(name, six.string_types)
+                and not name.startswith("__")
+                and name not in ["_values", "_field_names"]):
+            class_dict[str(name)] = property(_make_field_getter(i))
+
+    cls = _struct_classes[field_names] = type("Struct", (Struct,), class_dict)
+    return cls
+
+
+def _make_struct(field_names, values):
+    result = object.__new__(_get_struct_class(field_names))
+    object.__setattr__(result, "_values", tuple(values))
+    return result
 
 
 def dict_to_struct(data):
@@ -183,8 +255,8 @@ def dict_to_struct(data):
 def struct_to_dict(data):
     return dict(
             (name, val)
-            for name, val in six.iteritems(data.__dict__)
-            if not name.startswith("_"))
+            for name, val in zip(data._field_names, data._values)
+            if not (isinstance(name, six.string_types) and name.startswith("_")))
 
 # }}}
 
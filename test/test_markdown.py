@@ -0,0 +1,54 @@
+from __future__ import division
+
+__copyright__ = "Copyright (C) 2017 Andreas Kloeckner"
+
+__license__ = """
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+"""
+
+from django.test import SimpleTestCase
+
+from course.content import render_markdown
+
+
+def reverse_func(*args, **kwargs):
+    raise AssertionError("unexpected reverse")
+
+
+class MarkdownRendererPoolTest(SimpleTestCase):
+    """Checks that the pooled markdown renderers do not carry state from one
+    rendered text to the next.
+    """
+
+    def render(self, text):
+        return render_markdown(None, None, text, reverse_func)
+
+    def test_abbreviations_do_not_leak(self):
+        html = self.render("*[HTML]: Hyper Text\n\nSome HTML here.")
+        self.assertIn('<abbr title="Hyper Text">', html)
+
+        html = self.render("More HTML here.")
+        self.assertNotIn("<abbr", html)
+
+    def test_footnotes_do_not_leak(self):
+        html = self.render("Text[^1]\n\n[^1]: A footnote.")
+        self.assertIn("A footnote.", html)
+
+        html = self.render("Other text.")
+        self.assertNotIn("footnote", html)
@@ -0,0 +1,116 @@
+from __future__ import division
+
+__copyright__ = "Copyright (C) 2017 Andreas Kloeckner"
+
+__license__ = """
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+"""
+
+from django.test import TestCase, override_settings
+from django.utils.timezone import now
+
+from accounts.models import User
+from course.models import (
+        Course, Participation, FlowSession, FlowPageData, FlowPageVisit)
+from course.constants import participation_role, participation_status
+from course import page_visits
+
+
+class ManualPageVisitBuffer(page_visits.PageVisitBuffer):
+    """A buffer that is only flushed when the test says so."""
+
+    def _run(self):
+        pass
+
+
+@override_settings(RELATE_PAGE_VISIT_BUFFER_SIZE=2)
+class PageVisitBufferTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):  # noqa
+        cls.user = User.objects.create(
+                username="teststudent",
+                email="student@example.com")
+        cls.course = Course.objects.create(
+                identifier="test-course",
+                name="Test Course",
+                number="TEST101",
+                time_period="Fall 2017",
+                git_source="",
+                from_email="inform@example.com",
+                notify_email="inform@example.com",
+                active_git_commit_sha="0"*40)
+        cls.participation = Participation.objects.create(
+                user=cls.user,
+                course=cls.course,
+                role=participation_role.student,
+                status=participation_status.active)
+        cls.session = FlowSession.objects.create(
+                course=cls.course,
+                participation=cls.participation,
+                user=cls.user,
+                active_git_commit_sha="0"*40,
+                flow_id="quiz",
+                in_progress=True,
+                page_count=1)
+        cls.page_data = FlowPageData.objects.create(
+                flow_session=cls.session,
+                ordinal=0,
+                group_id="main",
+                page_id="page0")
+
+    def setUp(self):
+        self.buffer = ManualPageVisitBuffer(max_size=2, flush_interval=3600)
+
+        self.prev_buffer = page_visits._buffer
+        page_visits._buffer = self.buffer
+
+    def tearDown(self):
+        page_visits._buffer = self.prev_buffer
+
+    def log_visit(self):
+        page_visits.log_page_visit(FlowPageVisit(
+                flow_session=self.session,
+                page_data=self.page_data,
+                visit_time=now()))
+
+    def get_visit_count(self):
+        return FlowPageVisit.objects.filter(flow_session=self.session).count()
+
+    def test_buffering_and_flush(self):
+        self.log_visit()
+        self.log_visit()
+        self.assertEqual(self.get_visit_count(), 0)
+
+        page_visits.flush_page_visits()
+        self.assertEqual(self.get_visit_count(), 2)
+        self.assertEqual(self.buffer.visits, [])
+
+    def test_full_buffer_saves_right_away(self):
+        for i in range(3):
+            self.log_visit()
+        self.assertEqual(self.get_visit_count(), 1)
+
+        page_visits.flush_page_visits()
+        self.assertEqual(self.get_visit_count(), 3)
+
+    @override_settings(RELATE_PAGE_VISIT_BUFFER_SIZE=0)
+    def test_unbuffered(self):
+        self.log_visit()
+        self.assertEqual(self.get_visit_count(), 1)
+        self.assertEqual(self.buffer.visits, [])
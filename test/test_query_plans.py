@@ -0,0 +1,275 @@
+from __future__ import division
+
+__copyright__ = "Copyright (C) 2017 Andreas Kloeckner"
+
+__license__ = """
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+"""
+
+import re
+from datetime import timedelta
+from unittest import skipUnless
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils.timezone import now
+
+from accounts.models import User
+from course.models import (
+        Course, Participation, GradingOpportunity, GradeChange,
+        FlowSession, FlowPageData, FlowPageVisit, FlowPageVisitGrade)
+from course.constants import (
+        participation_role, participation_status, grade_state_change_types)
+
+
+PAGE_COUNT = 4
+SESSION_COUNT = 3
+
+# matches index use in SQLite's EXPLAIN QUERY PLAN output
+SQLITE_INDEX_RE = re.compile(r"USING (?:COVERING )?INDEX (\w+)")
+
+
+class HotQueryPlanTest(TestCase):
+    """Checks the number of queries and the use of indexes by the queries
+    behind the flow page, grading and gradebook views, so that changes
+    making them slower are noticed.
+    """
+
+    @classmethod
+    def setUpTestData(cls):  # noqa
+        cls.user = User.objects.create(
+                username="teststudent",
+                email="student@example.com")
+        cls.course = Course.objects.create(
+                identifier="test-course",
+                name="Test Course",
+                number="TEST101",
+                time_period="Fall 2017",
+                git_source="",
+                from_email="inform@example.com",
+                notify_email="inform@example.com",
+                active_git_commit_sha="0"*40)
+        cls.participation = Participation.objects.create(
+                user=cls.user,
+                course=cls.course,
+                role=participation_role.student,
+                status=participation_status.active)
+        cls.opportunity = GradingOpportunity.objects.create(
+                course=cls.course,
+                identifier="la_quiz",
+                name="Quiz",
+                flow_id="quiz",
+                aggregation_strategy="use_latest")
+
+        start_time = now() - timedelta(days=1)
+
+        cls.sessions = []
+        for i in range(SESSION_COUNT):
+            session = FlowSession.objects.create(
+                    course=cls.course,
+                    participation=cls.participation,
+                    user=cls.user,
+                    active_git_commit_sha="0"*40,
+                    flow_id="quiz",
+                    start_time=start_time,
+                    in_progress=False,
+                    page_count=PAGE_COUNT)
+            cls.sessions.append(session)
+
+            for ordinal in range(PAGE_COUNT):
+                page_data = FlowPageData.objects.create(
+                        flow_session=session,
+                        ordinal=ordinal,
+                        group_id="main",
+                        page_id="page%d" % ordinal)
+
+                visit_time = start_time + timedelta(minutes=ordinal)
+                FlowPageVisit.objects.create(
+                        flow_session=session,
+                        page_data=page_data,
+                        visit_time=visit_time)
+                answer_visit = FlowPageVisit.objects.create(
+                        flow_session=session,
+                        page_data=page_data,
+                        visit_time=visit_time + timedelta(seconds=30),
+                        answer={"answer": "42"},
+                        is_submitted_answer=True)
+                FlowPageVisitGrade.objects.create(
+                        visit=answer_visit,
+                        grade_time=visit_time + timedelta(seconds=31),
+                        max_points=1,
+                        correctness=1)
+
+            GradeChange.objects.create(
+                    opportunity=cls.opportunity,
+                    participation=cls.participation,
+                    state=grade_state_change_types.graded,
+                    attempt_id="flow-session-%d" % session.id,
+                    points=PAGE_COUNT,
+                    max_points=PAGE_COUNT,
+                    flow_session=session)
+
+    # {{{ helpers
+
+    def assertNumQueriesAtMost(self, max_count, f, *args, **kwargs):  # noqa
+        with CaptureQueriesContext(connection) as ctx:
+            result = f(*args, **kwargs)
+
+        self.assertLessEqual(len(ctx.captured_queries), max_count,
+                "%d queries, expected at most %d:\n%s" % (
+                    len(ctx.captured_queries), max_count,
+                    "\n".join(q["sql"] for q in ctx.captured_queries)))
+
+        return result
+
+    def get_index_columns(self, queryset):
+        """Return a list of column tuples of the indexes SQLite uses to
+        evaluate *queryset* on its model's table.
+        """
+
+        sql, params = queryset.query.sql_with_params()
+        table = queryset.model._meta.db_table
+
+        with connection.cursor() as cursor:
+            cursor.execute("EXPLAIN QUERY PLAN " + sql, params)
+            plan = "\n".join(
+                    " ".join(str(col) for col in row)
+                    for row in cursor.fetchall())
+
+            constraints = connection.introspection.get_constraints(
+                    cursor, table)
+
+        return plan, [
+                tuple(constraints[index_name]["columns"])
+                for index_name in SQLITE_INDEX_RE.findall(plan)
+                if index_name in constraints]
+
+    def assertUsesIndex(self, queryset, *alternatives):  # noqa
+        """
+        :arg alternatives: tuples of column names, one of which must be
+            a prefix of the columns of an index used for *queryset*.
+        """
+
+        plan, used_index_columns = self.get_index_columns(queryset)
+
+        self.assertTrue(
+                any(index_columns[:len(columns)] == tuple(columns)
+                    for index_columns in used_index_columns
+                    for columns in alternatives),
+                "expected an index on %s of %s, query plan:\n%s" % (
+                    " or ".join(
+                        "(%s)" % ", ".join(columns) for columns in alternatives),
+                    queryset.model._meta.db_table, plan))
+
+    # }}}
+
+    # {{{ flow sessions
+
+    @skipUnless(connection.vendor == "sqlite", "query plans are SQLite's")
+    def test_participant_flow_sessions_index(self):
+        self.assertUsesIndex(
+                FlowSession.objects.filter(
+                    course=self.course,
+                    flow_id="quiz",
+                    participation=self.participation,
+                    in_progress=False),
+                ("course_id", "flow_id", "participation_id", "in_progress"))
+
+    # }}}
+
+    # {{{ page visits
+
+    def test_assemble_answer_visits_query_count(self):
+        from course.flow import assemble_answer_visits
+
+        answer_visits = self.assertNumQueriesAtMost(
+                1, assemble_answer_visits, self.sessions[0])
+        self.assertEqual(len(answer_visits), PAGE_COUNT)
+        self.assertTrue(all(visit is not None for visit in answer_visits))
+
+    def test_assemble_page_grades_query_count(self):
+        from course.flow import assemble_page_grades
+
+        def get_page_grades():
+            return [list(grades)
+                    for grades in assemble_page_grades(self.sessions)]
+
+        page_grades = self.assertNumQueriesAtMost(2, get_page_grades)
+        self.assertEqual(len(page_grades), SESSION_COUNT)
+        self.assertTrue(all(
+            grade is not None
+            for grades in page_grades
+            for grade in grades))
+
+    @skipUnless(connection.vendor == "sqlite", "query plans are SQLite's")
+    def test_session_answer_visits_index(self):
+        from course.flow import get_flow_session_graded_answers_qset
+
+        self.assertUsesIndex(
+                get_flow_session_graded_answers_qset(self.sessions[0])
+                .order_by("visit_time"),
+                ("flow_session_id", "visit_time"))
+
+    @skipUnless(connection.vendor == "sqlite", "query plans are SQLite's")
+    def test_page_answer_visits_index(self):
+        from course.flow import get_prev_answer_visits_qset
+
+        page_data = FlowPageData.objects.get(
+                flow_session=self.sessions[0], ordinal=1)
+        self.assertUsesIndex(
+                get_prev_answer_visits_qset(page_data),
+                ("page_data_id", "visit_time"),
+                ("flow_session_id", "visit_time"))
+
+    @skipUnless(connection.vendor == "sqlite", "query plans are SQLite's")
+    def test_visit_grades_index(self):
+        visit = FlowPageVisit.objects.filter(
+                flow_session=self.sessions[0],
+                answer__isnull=False)[0]
+        self.assertUsesIndex(
+                visit.grades.order_by("-grade_time"),
+                ("visit_id", "grade_time"))
+
+    # }}}
+
+    # {{{ grade changes
+
+    @skipUnless(connection.vendor == "sqlite", "query plans are SQLite's")
+    def test_grade_history_index(self):
+        self.assertUsesIndex(
+                GradeChange.objects
+                .filter(
+                    opportunity=self.opportunity,
+                    participation=self.participation)
+                .order_by("grade_time"),
+                ("opportunity_id", "participation_id"))
+
+    @skipUnless(connection.vendor == "sqlite", "query plans are SQLite's")
+    def test_attempt_grade_history_index(self):
+        self.assertUsesIndex(
+                GradeChange.objects
+                .filter(
+                    opportunity=self.opportunity,
+                    participation=self.participation,
+                    attempt_id="flow-session-%d" % self.sessions[0].id)
+                .order_by("-grade_time"),
+                ("opportunity_id", "participation_id", "attempt_id"))
+
+    # }}}